@@ -0,0 +1,50 @@
+import glob
+import json
+import os
+import sys
+
+NUM_SLOWEST = 10  # Traces printed with their per-hop breakdown
+
+def load_spans(trace_dir):
+    """Every exported span under trace_dir, grouped by trace ID."""
+    traces = {}
+    for path in glob.glob(os.path.join(trace_dir, "node_*.jsonl")):
+        with open(path) as trace_file:
+            for line in trace_file:
+                span = json.loads(line)
+                traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+def self_time(span):
+    return span["handler_ms"] - span["downstream_ms"]
+
+def report(trace_dir):
+    traces = load_spans(trace_dir)
+    if not traces:
+        print(f"No spans found in {trace_dir}")
+        return
+    # The ingress span is the one that started first; its queue + handler time is what the client saw
+    ingress = {trace_id: min(spans, key=lambda span: span["time"]) for trace_id, spans in traces.items()}
+    slowest = sorted(traces, key=lambda trace_id: -(ingress[trace_id]["queue_ms"] + ingress[trace_id]["handler_ms"]))
+
+    print(f"{len(traces)} traces, {sum(len(spans) for spans in traces.values())} spans")
+    print(f"\nSlowest {NUM_SLOWEST} traces (q = queueing, self = handler minus downstream wait, ms):")
+    for trace_id in slowest[:NUM_SLOWEST]:
+        spans = sorted(traces[trace_id], key=lambda span: span["time"])
+        hops = "  ->  ".join(f"{span['node']} q={span['queue_ms']:.2f} self={self_time(span):.2f}" for span in spans)
+        total = ingress[trace_id]["queue_ms"] + ingress[trace_id]["handler_ms"]
+        print(f"{trace_id} {spans[0]['endpoint']:>16} {total:8.2f} ms: {hops}")
+
+    print("\nMean time per node and endpoint (ms):")
+    totals = {}
+    for spans in traces.values():
+        for span in spans:
+            entry = totals.setdefault((span["node"], span["endpoint"]), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += span["queue_ms"]
+            entry[2] += self_time(span)
+    for (node, endpoint), (count, queue_ms, self_ms) in sorted(totals.items()):
+        print(f"{node} {endpoint:>16}: {count:6d} spans, queueing {queue_ms / count:7.3f}, self {self_ms / count:7.3f}")
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else "../Out/Traces")
@@ -0,0 +1,60 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Request
+from pydantic import BaseModel
+from membership import membership_view, join, leave, prepare, commit, abort, ingest_handoff
+
+router = APIRouter()
+
+class JoinRequest(BaseModel):
+    seed: Optional[str] = None  # Member to learn the current membership from
+
+class MembershipChangeRequest(BaseModel):
+    epoch: int
+    members: List[str]
+
+class MembershipAbortRequest(MembershipChangeRequest):
+    stage: Literal["return", "restore"]
+
+async def ndjson_lines(request):
+    """Split a streamed request body into lines as the chunks arrive."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line:
+                yield line
+    if buffer:
+        yield buffer
+
+@router.get("/membership")
+async def membership_endpoint():
+    return membership_view()
+
+@router.post("/join")
+async def join_endpoint(request: JoinRequest):
+    """Add this node to the cluster; the topics it will own are streamed to it."""
+    return await join(request.seed)
+
+@router.post("/leave")
+async def leave_endpoint():
+    """Drain this node: its topics are streamed to their new owners."""
+    return await leave()
+
+@router.post("/membership/prepare")
+async def prepare_endpoint(request: MembershipChangeRequest):
+    return await prepare(request.epoch, request.members)
+
+@router.post("/membership/commit")
+async def commit_endpoint(request: MembershipChangeRequest):
+    return await commit(request.epoch, request.members)
+
+@router.post("/membership/abort")
+async def abort_endpoint(request: MembershipAbortRequest):
+    return await abort(request.epoch, request.members, request.stage)
+
+@router.post("/handoff")
+async def handoff_endpoint(request: Request):
+    """Receive topics from their previous owner as a streamed NDJSON body."""
+    stats = await ingest_handoff(ndjson_lines(request))
+    return {"status": "Success", **stats}
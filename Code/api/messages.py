@@ -1,8 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from dht import publish_message, pull_messages, forward_request
-from utils import hash_topic
-from config import HYPERCUBE_DIMENSIONS, peer_id
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from dht import (
+    publish_message,
+    pull_messages,
+    publish_batch,
+    pull_batch,
+    stream_messages,
+    forward_request,
+    forward_batch,
+    forward_stream,
+    forward_read,
+)
+from proxy import route, routed_request, passthrough
+from utils import resolve_owner
+from config import STREAM_SLOW_POLICY
+from node import current_node
+from metrics import timed
 
 router = APIRouter()
 
@@ -12,24 +28,65 @@ class PublishMessageRequest(BaseModel):
 
 class PullMessagesRequest(BaseModel):
     topic: str
+    from_offset: int = Field(0, ge=0)  # Offset of the first message to return
+    limit: Optional[int] = Field(None, ge=1)  # Defaults to the node's PULL_LIMIT
+    wait_ms: int = Field(0, ge=0)  # Long poll: wait this long for a message if none is available (pull_messages only)
+
+class PublishBatchRequest(BaseModel):
+    items: List[PublishMessageRequest]
+
+class PullBatchRequest(BaseModel):
+    items: List[PullMessagesRequest]
 
 @router.post("/publish_message")
-async def publish_message_endpoint(request: PublishMessageRequest):
-    topic = request.topic
-    message = request.message
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await publish_message(topic, message)
-    else:
-        response = await forward_request(target_node, "publish_message", {"topic": topic, "message": message})
-        return response
+@timed("publish_message")
+async def publish_message_endpoint(request: Request):
+    # Parsed only on the node the client sent it to and on the owner (proxy.py)
+    return await route(request, "publish_message", PublishMessageRequest,
+                       lambda parsed: publish_message(parsed.topic, parsed.message), forward_request)
+
+async def pull_response(request):
+    """Serve a pull here as the JSON bytes storage builds, skipping response serialization."""
+    body = await pull_messages(request.topic, request.from_offset, request.limit, request.wait_ms, encoded=True)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/pull_messages")
-async def pull_messages_endpoint(request: PullMessagesRequest):
-    topic = request.topic
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await pull_messages(topic)
+@timed("pull_messages")
+async def pull_messages_endpoint(request: Request):
+    routed = await routed_request(request, PullMessagesRequest)
+    # Served by the owner or one of its replicas; the body passes through unparsed,
+    # and a long poll holds the forwarded request open
+    return passthrough(await forward_read(routed.topic, "pull_messages", routed.body,
+                                          lambda: routed.serve(pull_response), routed.wait_ms))
+
+@router.post("/publish_batch")
+@timed("publish_batch")
+async def publish_batch_endpoint(request: PublishBatchRequest):
+    results = await forward_batch("publish_batch", [item.model_dump() for item in request.items], publish_batch)
+    return {"status": "Success", "results": results}
+
+@router.post("/pull_batch")
+@timed("pull_batch")
+async def pull_batch_endpoint(request: PullBatchRequest):
+    results = await forward_batch("pull_batch", [item.model_dump() for item in request.items], pull_batch)
+    return {"status": "Success", "results": results}
+
+@router.get("/stream")
+@timed("stream")
+async def stream_endpoint(topic: str, from_offset: int = Query(0, ge=0),
+                          policy: Literal["drop", "disconnect", "block"] = STREAM_SLOW_POLICY):
+    """Server-Sent Events stream of a topic's messages, starting at `from_offset`.
+
+    Each event's id is the message offset, so a client reconnects with
+    from_offset = last id + 1. Non-owners relay the owner's stream unchanged.
+    """
+    target_node = resolve_owner(topic)
+    if target_node == current_node().peer_id:
+        return StreamingResponse(stream_messages(topic, from_offset, policy), media_type="text/event-stream")
     else:
-        response = await forward_request(target_node, "pull_messages", {"topic": topic})
-        return response
+        response = await forward_stream(target_node, "stream",
+                                        {"topic": topic, "from_offset": from_offset, "policy": policy})
+        if isinstance(response, dict):
+            raise HTTPException(status_code=502, detail=response["message"])
+        return StreamingResponse(response.aiter_raw(), media_type="text/event-stream",
+                                 background=BackgroundTask(response.aclose))
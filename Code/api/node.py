@@ -0,0 +1,134 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from client_pool import connection_stats
+from streams import stream_stats
+from replication import replication_stats
+from logger import log_stats
+from coalescing import coalescing_stats
+from topic_cache import topic_cache_stats
+from directory import directory_versions, merge_entries, newer_entries, learn_created, relay_created, directory_stats
+from failure_detector import merge_view, heartbeat_view, peer_status
+from metrics import core_metrics, render_metric
+from node import current_node
+from config import ROUTING_MODE, MAX_CONNECTIONS_PER_PEER
+
+router = APIRouter()
+
+class HeartbeatRequest(BaseModel):
+    source: str
+    view: Dict[str, List[float]]  # node -> [incarnation, counter]
+
+class DirectoryRequest(BaseModel):
+    source: str
+    versions: Dict[str, List[float]]  # node -> version of its filter the sender has
+    entries: Dict[str, List[Any]]  # node -> filter entry (see directory.py) the receiver may lack
+
+class TopicCreatedRequest(BaseModel):
+    owner: str
+    topic: str
+    epoch: int
+    version: List[float]  # First version of the owner's filter that includes the topic
+    dimension: int  # The announcement crossed this dimension to get here
+
+@router.get("/node_stats")
+async def node_stats_endpoint():
+    connections = connection_stats()
+    return {
+        "node": current_node().peer_id,
+        "routing_mode": ROUTING_MODE,
+        "open_connections": sum(connections.values()),
+        "connected_peers": len(connections),
+        **stream_stats(),
+        "replication": replication_stats(),
+        "logging": log_stats(),
+        "read_coalescing": coalescing_stats(),
+        "topic_cache": topic_cache_stats(),
+        "directory": directory_stats(),
+    }
+
+@router.get("/storage_stats")
+async def storage_stats_endpoint():
+    """Per-topic message and byte accounting, to see where memory goes."""
+    node = current_node()
+    return {"node": node.peer_id, **node.message_storage.stats()}
+
+@router.post("/heartbeat")
+async def heartbeat_endpoint(request: HeartbeatRequest):
+    """Gossip exchange between neighbors: merge the sender's heartbeats and return ours."""
+    merge_view(request.view)
+    return {"node": current_node().peer_id, "view": heartbeat_view()}
+
+@router.post("/directory")
+async def directory_endpoint(request: DirectoryRequest):
+    """Directory gossip between neighbors: merge the sender's filters and return the ones it lacks."""
+    merge_entries(request.entries)
+    current_node().directory_known[request.source] = request.versions
+    return {"node": current_node().peer_id, "versions": directory_versions(), "entries": newer_entries(request.versions)}
+
+@router.post("/directory/created")
+async def directory_created_endpoint(request: TopicCreatedRequest):
+    """A topic's owner announces a create; pass it on down the spanning tree (see directory.py)."""
+    learn_created(request.owner, request.topic, request.epoch, request.version)
+    relay_created(current_node(), request.model_dump(exclude={"dimension"}), request.dimension + 1)
+    return {"node": current_node().peer_id}
+
+@router.get("/peer_status")
+async def peer_status_endpoint():
+    """This node's up/suspect/down view of every other node."""
+    return {"node": current_node().peer_id, "peers": peer_status()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition of this node's request, routing, pool, storage and loop metrics."""
+    node = current_node()
+    connections = connection_stats()
+    storage = node.message_storage.stats()
+    lines = core_metrics()
+    lines += render_metric("dht_pool_connections", "gauge", "Open pooled connections per peer.",
+                           [({"peer": address}, count) for address, count in connections.items()])
+    lines += render_metric("dht_pool_max_connections", "gauge", "Connection pool size per peer.",
+                           [({}, MAX_CONNECTIONS_PER_PEER)])
+    lines += render_metric("dht_forwards_in_flight", "gauge", "Forwarded requests awaiting a response per target.",
+                           [({"target": node_id}, count) for node_id, count in node.in_flight.items()])
+    lines += render_metric("dht_read_forwards_total", "counter", "Reads forwarded, by endpoint.",
+                           [({"endpoint": endpoint}, counts["forwarded"])
+                            for endpoint, counts in coalescing_stats().items()])
+    lines += render_metric("dht_read_coalesced_total", "counter",
+                           "Reads that shared a forward already in flight instead of sending their own, by endpoint.",
+                           [({"endpoint": endpoint}, counts["coalesced"])
+                            for endpoint, counts in coalescing_stats().items()])
+    topic_cache = topic_cache_stats()
+    lines += render_metric("dht_topic_cache_lookups_total", "counter",
+                           "Topic cache lookups for query_topic, by result (hit, negative_hit or miss).",
+                           [({"result": result}, topic_cache[key]) for result, key in
+                            (("hit", "hits"), ("negative_hit", "negative_hits"), ("miss", "misses"))])
+    lines += render_metric("dht_topic_cache_entries", "gauge", "Cached query_topic answers.",
+                           [({}, topic_cache["entries"])])
+    lines += render_metric("dht_topic_invalidations_total", "counter",
+                           "Topic changes here that invalidated cached answers elsewhere.",
+                           [({}, topic_cache["invalidations"])])
+    lines += render_metric("dht_topic_invalidations_sent_total", "counter",
+                           "Cache invalidations sent to watching nodes (fan-out summed over invalidations).",
+                           [({}, topic_cache["invalidations_sent"])])
+    lines += render_metric("dht_topic_invalidation_failures_total", "counter",
+                           "Invalidation requests that did not reach their node.",
+                           [({}, topic_cache["invalidation_failures"])])
+    directory = directory_stats()
+    lines += render_metric("dht_directory_bytes", "gauge", "Memory held by the topic directory's Bloom filters.",
+                           [({"filters": "all"}, directory["bytes"]), ({"filters": "own"}, directory["own_bytes"])])
+    lines += render_metric("dht_directory_lookups_total", "counter",
+                           "query_topic lookups checked against the owner's filter, by result.",
+                           [({"result": "definite_miss"}, directory["definite_misses"]),
+                            ({"result": "maybe"}, directory["checks"] - directory["definite_misses"])])
+    lines += render_metric("dht_directory_false_positives_total", "counter",
+                           "Lookups the filter let through that the owner answered with not found.",
+                           [({}, directory["false_positives"])])
+    lines += render_metric("dht_topics", "gauge", "Topics held on this node, replicas included.",
+                           [({}, len(node.local_dht))])
+    lines += render_metric("dht_message_bytes", "gauge", "Message payload bytes held on this node.",
+                           [({}, storage["total_bytes"])])
+    lines += render_metric("dht_active_streams", "gauge", "Open stream subscriptions.",
+                           [({}, stream_stats()["active_streams"])])
+    return "\n".join(lines) + "\n"
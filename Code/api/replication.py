@@ -0,0 +1,26 @@
+from typing import List, Optional
+from fastapi import APIRouter
+from pydantic import BaseModel
+from dht import apply_replication
+from metrics import timed
+
+router = APIRouter()
+
+class ReplicationOp(BaseModel):
+    op: str  # "create", "sync", "append", "reset" or "delete"
+    topic: str
+    offset: Optional[int] = None
+    message: Optional[str] = None
+    high_watermark: Optional[int] = None
+    retention: Optional[dict] = None
+
+class ReplicateRequest(BaseModel):
+    source: str  # Owner node that shipped the ops
+    ops: List[ReplicationOp]
+
+@router.post("/replicate")
+@timed("replicate")
+async def replicate_endpoint(request: ReplicateRequest):
+    """Apply ops from a topic owner to the replicas held on this node."""
+    behind = await apply_replication([op.model_dump() for op in request.ops])
+    return {"status": "Success", "behind": behind}
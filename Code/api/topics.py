@@ -1,56 +1,93 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from dht import create_topic, delete_topic, subscribe, query_topic, forward_request
-from utils import hash_topic
-from config import HYPERCUBE_DIMENSIONS, peer_id
+from typing import List, Optional
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, Field
+from dht import create_topic, delete_topic, subscribe, query_topic, forward_request, forward_read, choose_read_node
+from proxy import route, routed_request, passthrough
+from node import current_node
+from storage import RetentionPolicy
+from metrics import timed
+from topic_cache import NOT_FOUND, cached_topic, cache_topic, drop_cached_topics
+from directory import may_exist, forwarded_create, count_false_positive
+from config import TOPIC_CACHE_SIZE
 
 router = APIRouter()
 
 class CreateTopicRequest(BaseModel):
     topic: str
+    # Per-topic retention overrides; the node defaults apply when omitted (0 disables a limit)
+    max_messages: Optional[int] = Field(None, ge=0)
+    max_bytes: Optional[int] = Field(None, ge=0)
+    ttl_seconds: Optional[float] = Field(None, ge=0)
+
+class DeleteTopicRequest(BaseModel):
+    topic: str
 
 class SubscribeRequest(BaseModel):
     topic: str
 
 class QueryTopicRequest(BaseModel):
     topic: str
+    cache_node: Optional[str] = None  # Set by the ingress node that caches the answer
+
+class InvalidateTopicsRequest(BaseModel):
+    topics: List[str]
+
+async def serve_create_topic(request):
+    retention = RetentionPolicy(request.max_messages, request.max_bytes, request.ttl_seconds)
+    return await create_topic(request.topic, retention=retention)
+
+async def forward_create_topic(target_node, endpoint, body, topic):
+    # The owner's announcement may arrive after its answer; if the create fails,
+    # the extra entry only costs a forwarded query
+    forwarded_create(target_node, topic)
+    return await forward_request(target_node, endpoint, body, topic=topic)
+
+# The topic endpoints take the raw request: proxy.route parses it only if this node
+# is the first to receive it or owns the topic
 
 @router.post("/create_topic")
-async def create_topic_endpoint(request: CreateTopicRequest):
-    topic = request.topic
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await create_topic(topic)
-    else:
-        response = await forward_request(target_node, "create_topic", {"topic": topic})
-        return response
+@timed("create_topic")
+async def create_topic_endpoint(request: Request):
+    return await route(request, "create_topic", CreateTopicRequest, serve_create_topic, forward_create_topic)
 
 @router.post("/delete_topic")
-async def delete_topic_endpoint(request: CreateTopicRequest):
-    topic = request.topic
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await delete_topic(topic)
-    else:
-        response = await forward_request(target_node, "delete_topic", {"topic": topic})
-        return response
+@timed("delete_topic")
+async def delete_topic_endpoint(request: Request):
+    return await route(request, "delete_topic", DeleteTopicRequest, lambda parsed: delete_topic(parsed.topic),
+                       forward_request)
 
 @router.post("/subscribe")
-async def subscribe_topic_endpoint(request: SubscribeRequest):
-    topic = request.topic
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await subscribe(topic)
-    else:
-        response = await forward_request(target_node, "subscribe", {"topic": topic})
-        return response
+@timed("subscribe")
+async def subscribe_topic_endpoint(request: Request):
+    return await route(request, "subscribe", SubscribeRequest, lambda parsed: subscribe(parsed.topic), forward_request)
 
 @router.post("/query_topic")
-async def query_topic_endpoint(request: QueryTopicRequest):
-    topic = request.topic
-    target_node = format(hash_topic(topic), f'0{HYPERCUBE_DIMENSIONS}b')
-    if target_node == peer_id:
-        return await query_topic(topic)
-    else:
-        response = await forward_request(target_node, "query_topic", {"topic": topic})
+@timed("query_topic")
+async def query_topic_endpoint(request: Request):
+    routed = await routed_request(request, QueryTopicRequest)
+    topic = routed.topic
+    node = current_node()
+    if routed.parsed is not None and routed.parsed.cache_node is None and choose_read_node(topic) != node.peer_id:
+        # A client asked this node, which has no copy: try the topic cache, then the directory
+        response = cached_topic(topic) if TOPIC_CACHE_SIZE else None
+        if response is not None:
+            return response
+        exists = may_exist(topic)
+        if exists is False:
+            return {"status": "Error", "message": NOT_FOUND, "hops": 0}
+        data = {"topic": topic, "cache_node": node.peer_id} if TOPIC_CACHE_SIZE else {"topic": topic}
+        response = await forward_read(topic, "query_topic", data, lambda: query_topic(topic))
+        if exists and response.get("message") == NOT_FOUND:
+            count_false_positive()
+        if TOPIC_CACHE_SIZE:
+            cache_topic(topic, response)
         return response
+    # Served by the owner or one of its replicas
+    return passthrough(await forward_read(topic, "query_topic", routed.body, lambda: routed.serve(
+        lambda parsed: query_topic(topic, parsed.cache_node))))
+
+@router.post("/invalidate_topics")
+async def invalidate_topics_endpoint(request: InvalidateTopicsRequest):
+    """Drop cached query_topic answers; sent by the node that gave them when the topics change."""
+    drop_cached_topics(request.topics)
+    return {"status": "Success", "node": current_node().peer_id}
@@ -0,0 +1,89 @@
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import Response
+from api import topics, messages, node, replication, membership
+from client_pool import open_clients, close_clients
+from dht import owned_topics
+from streams import close_streams
+from replication import start_replication, stop_replication
+from failure_detector import start_failure_detector, stop_failure_detector
+from directory import start_directory, stop_directory
+from metrics import start_loop_lag_monitor, stop_loop_lag_monitor
+from tracing import TraceMiddleware
+from framed import start_framed_server, stop_framed
+from config import NODE_ADDRESSES, ROUTING_MODE, FORWARD_TRANSPORT
+from node import current_node
+from utils import get_neighbors
+
+async def _batch(endpoint, batch_model, item_model, request):
+    items = json.loads(await request.body())["items"]
+    return await endpoint(batch_model.model_construct(items=[item_model.model_construct(**item) for item in items]))
+
+async def _json_body(result):
+    """A JSON Response (a pull from pull_response, or a body passed through) goes into the frame as its bytes."""
+    result = await result
+    return result.body if isinstance(result, Response) else result
+
+# Endpoints forward_request can reach over the framed transport, called with the
+# FramedRequest read off the frame. Batch items were validated by the node that first
+# received the batch, so their models are built without validation.
+FRAMED_HANDLERS = {
+    "create_topic": lambda request: _json_body(topics.create_topic_endpoint(request)),
+    "delete_topic": lambda request: _json_body(topics.delete_topic_endpoint(request)),
+    "subscribe": lambda request: _json_body(topics.subscribe_topic_endpoint(request)),
+    "query_topic": lambda request: _json_body(topics.query_topic_endpoint(request)),
+    "publish_message": lambda request: _json_body(messages.publish_message_endpoint(request)),
+    "pull_messages": lambda request: _json_body(messages.pull_messages_endpoint(request)),
+    "publish_batch": lambda request: _batch(messages.publish_batch_endpoint, messages.PublishBatchRequest,
+                                            messages.PublishMessageRequest, request),
+    "pull_batch": lambda request: _batch(messages.pull_batch_endpoint, messages.PullBatchRequest,
+                                         messages.PullMessagesRequest, request),
+}
+
+async def start_node(open_pools=True, failure_detection=True, directory=True):
+    """Start the current node's background work: pools, replication, heartbeats, directory gossip, loop-lag probe."""
+    peer = current_node()
+    if open_pools:
+        # Open the shared connection pools once, reuse them for every forwarded request.
+        # Hypercube routing only ever talks to the log2(N) neighbors.
+        if ROUTING_MODE == "hypercube":
+            open_clients(NODE_ADDRESSES[neighbor] for neighbor in get_neighbors(peer.peer_id))
+        else:
+            open_clients(NODE_ADDRESSES.values())
+    if FORWARD_TRANSPORT == "framed":
+        await start_framed_server(FRAMED_HANDLERS)  # Forwarded requests from peers
+    # Copy this node's topics to its replicas (none unless DHT_REPLICATION_FACTOR > 1)
+    start_replication(peer.message_storage, owned_topics)
+    if failure_detection:
+        start_failure_detector()  # Heartbeats with the hypercube neighbors
+    if directory:
+        start_directory()  # Topic filters gossiped with the hypercube neighbors
+    start_loop_lag_monitor()
+
+async def stop_node():
+    await stop_loop_lag_monitor()
+    await stop_failure_detector()
+    await stop_directory()
+    await stop_replication()
+    close_streams()  # End open subscriber streams
+    await close_clients()
+    await stop_framed()
+    await current_node().message_storage.close()  # Commit any buffered writes before exiting
+
+@asynccontextmanager
+async def lifespan(app):
+    await start_node()
+    yield
+    await stop_node()
+
+# Define the FastAPI app; which node it serves is up to current_node() (see node.py)
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TraceMiddleware)  # Trace IDs and per-hop timings for every request
+
+# Include routers
+app.include_router(topics.router)
+app.include_router(messages.router)
+app.include_router(node.router)
+app.include_router(replication.router)
+app.include_router(membership.router)
@@ -0,0 +1,110 @@
+import logging
+import httpx
+from config import (
+    FORWARD_TIMEOUT,
+    FORWARD_CONNECT_TIMEOUT,
+    MAX_CONNECTIONS_PER_PEER,
+    MAX_KEEPALIVE_PER_PEER,
+    KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    STREAM_KEEPALIVE_SECONDS,
+)
+from node import current_node
+
+# Each node keeps one long-lived client (and therefore one connection pool) per peer
+# address in node.clients. Proxied streams and long polls hold a connection open while
+# they wait, so they get their own pools (node.stream_clients) with no cap on open
+# connections instead of starving regular forwarding. Those pools still keep idle
+# connections alive, so each long poll does not open a new one.
+
+# Builds the transport for a peer address; None means real connections. The simulator
+# swaps in in-process transports (see simulator.py).
+_transport_factory = None
+
+def set_transport_factory(factory):
+    """Route every client created from now on through `factory(node_address)`."""
+    global _transport_factory
+    _transport_factory = factory
+
+def _transport(node_address):
+    return _transport_factory(node_address) if _transport_factory is not None else None
+
+def _http2_supported():
+    """HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it."""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logging.warning("DHT_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1.")
+        return False
+    return True
+
+def _new_client(node_address, http2):
+    return httpx.AsyncClient(
+        base_url=node_address,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS_PER_PEER,
+            max_keepalive_connections=MAX_KEEPALIVE_PER_PEER,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(FORWARD_TIMEOUT, connect=FORWARD_CONNECT_TIMEOUT),
+        transport=_transport(node_address),
+    )
+
+def open_clients(node_addresses):
+    """Create the pooled clients for the given peer addresses. Called once at app startup."""
+    http2 = _http2_supported()
+    clients = current_node().clients
+    for node_address in node_addresses:
+        if node_address not in clients:
+            clients[node_address] = _new_client(node_address, http2)
+
+def get_client(node_address):
+    """Return the pooled client for a peer, creating it on first use."""
+    clients = current_node().clients
+    client = clients.get(node_address)
+    if client is None:
+        client = clients[node_address] = _new_client(node_address, _http2_supported())
+    return client
+
+def get_stream_client(node_address):
+    """Return the client used for long-lived requests (streams, long polls) to a peer.
+
+    An upstream that sends nothing (not even a keepalive) for three keepalive
+    intervals is treated as gone.
+    """
+    stream_clients = current_node().stream_clients
+    client = stream_clients.get(node_address)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=node_address,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=MAX_KEEPALIVE_PER_PEER,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(FORWARD_TIMEOUT, connect=FORWARD_CONNECT_TIMEOUT, read=3 * STREAM_KEEPALIVE_SECONDS),
+            transport=_transport(node_address),
+        )
+        stream_clients[node_address] = client
+    return client
+
+def connection_stats():
+    """Count the open connections held in each peer pool."""
+    stats = {}
+    for node_address, client in current_node().clients.items():
+        # httpx does not expose pool state publicly; read it from the transport's httpcore pool
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", [])
+        open_connections = sum(1 for connection in connections if not connection.is_closed())
+        if open_connections:
+            stats[node_address] = open_connections
+    return stats
+
+async def close_clients():
+    """Close every pooled connection. Called once at app shutdown."""
+    node = current_node()
+    clients = list(node.clients.values()) + list(node.stream_clients.values())
+    node.clients.clear()
+    node.stream_clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,38 @@
+import asyncio
+from node import current_node
+
+# Single-flight for forwarded reads: while a read is on its way to a copy of the topic,
+# identical reads (same endpoint, topic and cursor) arriving at this node wait for its
+# response instead of forwarding again. The forward runs in a task of its own, so a
+# client that goes away does not cancel it for the others.
+
+def read_key(endpoint, data):
+    """Reads share a flight when the endpoint and every request field match, cursor included.
+
+    A body passed through as bytes (proxy.py) is compared as it is.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return (endpoint, bytes(data))
+    return (endpoint, *data.values())
+
+async def single_flight(key, endpoint, forward):
+    """Await `forward()` (a coroutine function), or the identical call already in flight.
+
+    Every caller gets the same response object, so it must not be modified.
+    """
+    node = current_node()
+    counts = node.coalesce_counts.get(endpoint)
+    if counts is None:
+        counts = node.coalesce_counts[endpoint] = {"forwarded": 0, "coalesced": 0}
+    flight = node.read_flights.get(key)
+    if flight is None:
+        counts["forwarded"] += 1
+        flight = node.read_flights[key] = asyncio.create_task(forward())
+        flight.add_done_callback(lambda _: node.read_flights.pop(key, None))
+    else:
+        counts["coalesced"] += 1
+    return await asyncio.shield(flight)
+
+def coalescing_stats():
+    """Per endpoint: reads forwarded, and reads that shared one of those forwards."""
+    return current_node().coalesce_counts
@@ -1,46 +1,146 @@
+import os
 import sys
 
-# Constants for hypercube configuration
-NUM_NODES = 8  # Assume 3D hypercube with 8 nodes
-HYPERCUBE_DIMENSIONS = 3  # Dimensions of hypercube
-import sys
+# Constants for hypercube configuration (set DHT_DIMENSIONS to run 2^d nodes, e.g. 4 to 10)
+HYPERCUBE_DIMENSIONS = int(os.environ.get("DHT_DIMENSIONS", "3"))  # Dimensions of hypercube
+NUM_NODES = 2 ** HYPERCUBE_DIMENSIONS  # One node per hypercube vertex
 
-# Constants for hypercube configuration
-NUM_NODES = 8  # Assume 3D hypercube with 8 nodes
-HYPERCUBE_DIMENSIONS = 3  # Dimensions of hypercube
+# Nodes listen on consecutive ports starting at BASE_PORT, in node ID order
+NODE_HOST = os.environ.get("DHT_HOST", "127.0.0.1")
+BASE_PORT = int(os.environ.get("DHT_BASE_PORT", "5000"))
 
-# Initialize peer settings
-peer_id = sys.argv[2]  # Binary string ID of the peer node
-port = int(sys.argv[1])  # Port number for this peer node
+def build_node_ids(dimensions):
+    """Binary string IDs of every vertex in a hypercube of the given dimension."""
+    return [format(index, f"0{dimensions}b") for index in range(2 ** dimensions)]
 
-# Node addresses configuration for redirection
-NODE_ADDRESSES = {
-    "000": "http://127.0.0.1:5000",
-    "001": "http://127.0.0.1:5001",
-    "010": "http://127.0.0.1:5002",
-    "011": "http://127.0.0.1:5003",
-    "100": "http://127.0.0.1:5004",
-    "101": "http://127.0.0.1:5005",
-    "110": "http://127.0.0.1:5006",
-    "111": "http://127.0.0.1:5007",
-}
-
-# Note: Adjust these URLs and ports if nodes are distributed across different servers or IPs.
-
-# Initialize peer settings
-peer_id = sys.argv[2]  # Binary string ID of the peer node
-port = int(sys.argv[1])  # Port number for this peer node
+def build_node_addresses(dimensions, host=NODE_HOST, base_port=BASE_PORT):
+    """Address table for a hypercube of the given dimension."""
+    return {node_id: f"http://{host}:{base_port + index}"
+            for index, node_id in enumerate(build_node_ids(dimensions))}
 
 # Node addresses configuration for redirection
-NODE_ADDRESSES = {
-    "000": "http://127.0.0.1:5000",
-    "001": "http://127.0.0.1:5001",
-    "010": "http://127.0.0.1:5002",
-    "011": "http://127.0.0.1:5003",
-    "100": "http://127.0.0.1:5004",
-    "101": "http://127.0.0.1:5005",
-    "110": "http://127.0.0.1:5006",
-    "111": "http://127.0.0.1:5007",
-}
-
-# Note: Adjust these URLs and ports if nodes are distributed across different servers or IPs.
+NODE_IDS = build_node_ids(HYPERCUBE_DIMENSIONS)
+NODE_ADDRESSES = build_node_addresses(HYPERCUBE_DIMENSIONS)
+
+# Nodes that own topics at startup; the others wait for POST /join (see membership.py)
+MEMBERS = [node_id.strip() for node_id in os.environ.get("DHT_MEMBERS", ",".join(NODE_IDS)).split(",") if node_id.strip()]
+
+# Note: Adjust DHT_HOST and DHT_BASE_PORT if nodes are distributed across different servers or IPs.
+
+# Initialize peer settings: the node this process runs (see node.py; scripts that only
+# talk to the cluster may import this with their own arguments)
+_node_args = len(sys.argv) > 2 and sys.argv[1].isdigit()  # main.py <port> <peer_id>
+peer_id = sys.argv[2] if _node_args else NODE_IDS[0]  # Binary string ID of the peer node
+port = int(sys.argv[1]) if _node_args else BASE_PORT  # Port number for this peer node
+
+# Inter-node forwarding settings (override with environment variables)
+FORWARD_TIMEOUT = float(os.environ.get("DHT_FORWARD_TIMEOUT", "5.0"))  # Seconds per forwarded request
+FORWARD_CONNECT_TIMEOUT = float(os.environ.get("DHT_FORWARD_CONNECT_TIMEOUT", "1.0"))  # Seconds to open a connection
+MAX_CONNECTIONS_PER_PEER = int(os.environ.get("DHT_MAX_CONNECTIONS_PER_PEER", "32"))  # Pool size for each peer
+MAX_KEEPALIVE_PER_PEER = int(os.environ.get("DHT_MAX_KEEPALIVE_PER_PEER", "16"))  # Idle connections kept open per peer
+KEEPALIVE_EXPIRY = float(os.environ.get("DHT_KEEPALIVE_EXPIRY", "30.0"))  # Seconds before an idle connection is closed
+HTTP2_ENABLED = os.environ.get("DHT_HTTP2", "0") == "1"  # Requires the optional `h2` package
+
+# Transport for forwarded requests: "http" (JSON through the public API) or "framed"
+# (length-prefixed frames multiplexed over one persistent TCP connection per peer)
+FORWARD_TRANSPORT = os.environ.get("DHT_FORWARD_TRANSPORT", "http")
+FRAMED_PORT_OFFSET = int(os.environ.get("DHT_FRAMED_PORT_OFFSET", "1000"))  # Framed listener: HTTP port + offset
+FRAMED_MAX_FRAME_BYTES = int(os.environ.get("DHT_FRAMED_MAX_FRAME_BYTES", str(64 * 1024 * 1024)))  # Largest frame accepted
+FRAMED_ADDRESSES = {node_id: (NODE_HOST, BASE_PORT + index + FRAMED_PORT_OFFSET) for index, node_id in enumerate(NODE_IDS)}
+
+# Routing mode: "direct" sends each request straight to the owner (full mesh),
+# "hypercube" forwards one bit-fix at a time through hypercube neighbors (e-cube routing)
+ROUTING_MODE = os.environ.get("DHT_ROUTING_MODE", "direct")
+
+# Topic placement: "ring" (consistent hashing with virtual nodes) or "modulo" (hash % NUM_NODES)
+PLACEMENT_STRATEGY = os.environ.get("DHT_PLACEMENT", "ring")
+VIRTUAL_NODES = int(os.environ.get("DHT_VIRTUAL_NODES", "128"))  # Ring points per node at weight 1.0
+
+def parse_weighted_list(spec):
+    """Parses "key:weight" lists such as "publish_message:0.5,pull_messages:0.4" into {key: float}."""
+    weights = {}
+    for entry in filter(None, spec.split(",")):
+        key, weight = entry.split(":")
+        weights[key.strip()] = float(weight)
+    return weights
+
+def parse_node_weights(spec):
+    """Parses "000:2,001:0.5" into {"000": 2.0, "001": 0.5}; unlisted nodes weigh 1.0."""
+    return parse_weighted_list(spec)
+
+NODE_WEIGHTS = parse_node_weights(os.environ.get("DHT_NODE_WEIGHTS", ""))  # Relative capacity per node
+
+OWNER_CACHE_SIZE = int(os.environ.get("DHT_OWNER_CACHE_SIZE", "65536"))  # Topics kept in the owner LRU cache
+# Ingress cache of forwarded query_topic answers (0 disables it); "not found" answers expire sooner
+TOPIC_CACHE_SIZE = int(os.environ.get("DHT_TOPIC_CACHE_SIZE", "65536"))
+TOPIC_CACHE_TTL_MS = float(os.environ.get("DHT_TOPIC_CACHE_TTL_MS", "30000"))
+TOPIC_CACHE_NEGATIVE_TTL_MS = float(os.environ.get("DHT_TOPIC_CACHE_NEGATIVE_TTL_MS", "2000"))
+# Topic directory: each node's Bloom filter of its topics, gossiped to hypercube neighbors
+DIRECTORY_INTERVAL_MS = float(os.environ.get("DHT_DIRECTORY_INTERVAL_MS", "1000"))  # Time between gossip rounds (0: off)
+DIRECTORY_FP_RATE = float(os.environ.get("DHT_DIRECTORY_FP_RATE", "0.01"))  # Target false-positive rate
+DIRECTORY_MIN_CAPACITY = int(os.environ.get("DHT_DIRECTORY_MIN_CAPACITY", "1024"))  # Topics a filter is sized for at least
+
+# Replication: each topic is copied to the owner's first REPLICATION_FACTOR - 1 hypercube neighbors
+REPLICATION_FACTOR = int(os.environ.get("DHT_REPLICATION_FACTOR", "1"))  # Copies of each topic, owner included
+# "async" acknowledges a publish once the owner has it; "quorum" waits for a majority of the copies
+REPLICATION_MODE = os.environ.get("DHT_REPLICATION_MODE", "async")
+REPLICATION_BATCH = int(os.environ.get("DHT_REPLICATION_BATCH", "256"))  # Ops shipped to a replica per request
+REPLICATION_QUEUE_SIZE = int(os.environ.get("DHT_REPLICATION_QUEUE_SIZE", "100000"))  # Ops queued per replica before a resync
+REPLICATION_RETRY_MS = float(os.environ.get("DHT_REPLICATION_RETRY_MS", "100"))  # First retry delay for an unreachable replica
+# Where reads (pull_messages, query_topic) go: "owner", the "closest" replica, or the "least_loaded" of the closest
+READ_PREFERENCE = os.environ.get("DHT_READ_PREFERENCE", "closest")
+# Identical reads forwarded at the same time (endpoint, topic and cursor) share one forward
+READ_COALESCING = os.environ.get("DHT_READ_COALESCING", "1") == "1"
+
+PULL_LIMIT = int(os.environ.get("DHT_PULL_LIMIT", "1000"))  # Messages returned per pull when no limit is given
+PULL_MAX_WAIT_MS = int(os.environ.get("DHT_PULL_MAX_WAIT_MS", "30000"))  # Longest a long-poll pull may wait
+
+# Message storage: "memory" keeps messages in RAM, "arena" keeps them in RAM pre-encoded in one buffer
+# per segment, "disk" keeps durable segment logs per topic
+STORAGE_BACKEND = os.environ.get("DHT_STORAGE", "memory")
+# Root of each node's topic logs; {peer_id} is filled in per node
+STORAGE_DIR_PATTERN = os.environ.get("DHT_STORAGE_DIR", "../Out/Data/node_{peer_id}")
+STORAGE_DIR = STORAGE_DIR_PATTERN.format(peer_id=peer_id)  # This process's node
+SEGMENT_BYTES = int(os.environ.get("DHT_SEGMENT_BYTES", str(64 * 1024 * 1024)))  # Roll to a new segment past this size
+INDEX_INTERVAL = int(os.environ.get("DHT_INDEX_INTERVAL", "64"))  # Records between sparse index entries
+FSYNC_INTERVAL_MS = float(os.environ.get("DHT_FSYNC_INTERVAL_MS", "2"))  # Group-commit window for fsync batching
+
+# Retention (0 disables a limit); per-topic values can be given when the topic is created
+RETENTION_MAX_MESSAGES = int(os.environ.get("DHT_RETENTION_MAX_MESSAGES", "0"))  # Messages kept per topic
+RETENTION_MAX_BYTES = int(os.environ.get("DHT_RETENTION_MAX_BYTES", "0"))  # Payload bytes kept per topic
+MESSAGE_TTL_SECONDS = float(os.environ.get("DHT_MESSAGE_TTL_SECONDS", "0"))  # Age at which a message expires
+MEMORY_BUDGET_BYTES = int(os.environ.get("DHT_MEMORY_BUDGET_BYTES", "0"))  # Node-wide cap on in-memory payload bytes
+MEMORY_SEGMENT_MESSAGES = int(os.environ.get("DHT_MEMORY_SEGMENT_MESSAGES", "1024"))  # Messages per in-memory segment
+
+# Streaming subscriptions (GET /stream): each open stream has a bounded queue of pending frames
+STREAM_QUEUE_SIZE = int(os.environ.get("DHT_STREAM_QUEUE_SIZE", "1000"))  # Frames buffered per subscriber
+# What a publisher does when a subscriber's queue is full: "drop" the frame (the stream
+# catches up from storage), "disconnect" the subscriber, or "block" until there is room
+STREAM_SLOW_POLICY = os.environ.get("DHT_STREAM_SLOW_POLICY", "drop")
+STREAM_BLOCK_TIMEOUT_MS = float(os.environ.get("DHT_STREAM_BLOCK_TIMEOUT_MS", "1000"))  # Longest a publisher blocks
+STREAM_KEEPALIVE_SECONDS = float(os.environ.get("DHT_STREAM_KEEPALIVE_SECONDS", "15"))  # Idle time before a keepalive
+
+# Membership changes: topics move between owners in streamed NDJSON requests
+HANDOFF_BATCH_TOPICS = int(os.environ.get("DHT_HANDOFF_BATCH_TOPICS", "100"))  # Topics per handoff request
+HANDOFF_TIMEOUT = float(os.environ.get("DHT_HANDOFF_TIMEOUT", "300"))  # Seconds allowed for one node's handoff
+
+# Failure detection: nodes gossip heartbeat counters with their hypercube neighbors
+HEARTBEAT_INTERVAL_MS = float(os.environ.get("DHT_HEARTBEAT_INTERVAL_MS", "500"))  # Time between heartbeat rounds (0: off)
+# Gossip needs up to HYPERCUBE_DIMENSIONS rounds to cross the cube, so the thresholds grow with it
+SUSPECT_AFTER_MS = float(os.environ.get("DHT_SUSPECT_AFTER_MS", str(HEARTBEAT_INTERVAL_MS * (HYPERCUBE_DIMENSIONS + 2))))
+DOWN_AFTER_MS = float(os.environ.get("DHT_DOWN_AFTER_MS", str(2 * HEARTBEAT_INTERVAL_MS * (HYPERCUBE_DIMENSIONS + 2))))
+
+# Logging: records are queued on the request path and written by a background thread
+LOG_LEVEL = os.environ.get("DHT_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.environ.get("DHT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Log file size before it rotates
+LOG_BACKUP_COUNT = int(os.environ.get("DHT_LOG_BACKUP_COUNT", "5"))  # Rotated log files kept
+LOG_QUEUE_SIZE = int(os.environ.get("DHT_LOG_QUEUE_SIZE", "10000"))  # Records waiting for the writer before new ones are dropped
+LOG_FIELD_CHARS = int(os.environ.get("DHT_LOG_FIELD_CHARS", "200"))  # Longest rendering of one logged field
+# Fraction of records kept, by endpoint or level name, e.g. "pull_messages:0.01,INFO:0.5" (endpoint wins)
+LOG_SAMPLE_RATES = parse_weighted_list(os.environ.get("DHT_LOG_SAMPLE_RATES", ""))
+
+# Metrics: how often the event-loop lag probe wakes up
+LOOP_LAG_INTERVAL_MS = float(os.environ.get("DHT_LOOP_LAG_INTERVAL_MS", "100"))
+
+# Tracing: finished request spans are written as JSON lines to <DHT_TRACE_DIR>/node_<peer_id>.jsonl
+TRACE_DIR = os.environ.get("DHT_TRACE_DIR", "")  # Empty disables the export; trace headers still flow
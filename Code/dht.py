@@ -1,73 +1,508 @@
+import asyncio
+import json
 import logging
-import sys
+import time
 import httpx
-from config import NODE_ADDRESSES
+from config import (
+    NODE_ADDRESSES,
+    ROUTING_MODE,
+    PULL_LIMIT,
+    PULL_MAX_WAIT_MS,
+    FORWARD_TIMEOUT,
+    FORWARD_CONNECT_TIMEOUT,
+    STREAM_SLOW_POLICY,
+    STREAM_KEEPALIVE_SECONDS,
+    READ_PREFERENCE,
+    FORWARD_TRANSPORT,
+    READ_COALESCING,
+)
+from storage import RetentionPolicy
+from client_pool import get_client, get_stream_client
+from framed import FramedConnectError, FramedRequestError, framed_request
+from coalescing import read_key, single_flight
+from proxy import route_headers
+from topic_cache import NOT_FOUND, watch_topic, invalidate_topic
+from directory import topic_added, topic_removed, announce_created
+from streams import (
+    KEEPALIVE_FRAME,
+    add_subscriber,
+    remove_subscriber,
+    subscriber_count,
+    fan_out,
+    encode_frame,
+    close_topic_streams,
+)
+from replication import replicate
+from logger import log_fields
+from metrics import mark_forwarded
+from tracing import trace_headers, record_downstream
+from failure_detector import UP, status, is_down, mark_down
+from node import current_node
+from utils import resolve_owner, replica_nodes, hop_distance
 
-# Local DHT storage for this peer
-local_dht = {}  # Each peer has its own subset of topics
-message_storage = {}  # Store messages for each topic
-subscriptions = {}  # Store subscriptions for each topic
+# Topics, message logs and the other per-node state live on the current Node (see node.py)
 
-peer_id = sys.argv[2]  # Binary string ID of the peer node
+def owned_topics():
+    """Topics this node owns, as opposed to replicas it holds for other owners."""
+    node = current_node()
+    return [topic for topic in node.local_dht if resolve_owner(topic) == node.peer_id]
 
-async def create_topic(topic, data=None):
-    local_dht[topic] = data
-    logging.info(f"Created topic '{topic}' at node {peer_id}")
-    return {"status": "Success", "message": f"Topic '{topic}' created at node {peer_id}"}
+async def wait_for_handoff(topic):
+    """Hold a write while its topic is being handed off; returns True if the topic moved away."""
+    node = current_node()
+    fence = node.handoff_fences.get(topic)
+    if fence is None:
+        return False
+    await fence.wait()
+    return resolve_owner(topic) != node.peer_id
+
+async def create_topic(topic, data=None, retention=None):
+    node = current_node()
+    node.local_dht[topic] = data
+    node.message_storage.create(topic, retention)
+    invalidate_topic(topic)  # Drop cached "not found" answers
+    topic_added(topic)
+    announce_created(topic)  # In the background, so other nodes' directories stop denying it
+    await replicate({"op": "create", "topic": topic, "retention": node.message_storage.retention(topic).to_dict()})
+    logging.info("Created topic", extra=log_fields("create_topic", topic=topic))
+    return {"status": "Success", "message": f"Topic '{topic}' created at node {node.peer_id}"}
 
 async def delete_topic(topic):
-    if topic in local_dht:
-        del local_dht[topic]
-        if topic in message_storage:
-            del message_storage[topic]
-        logging.info(f"Deleted topic '{topic}' at node {peer_id}")
+    node = current_node()
+    if node.handoff_fences and await wait_for_handoff(topic):
+        return await forward_request(resolve_owner(topic), "delete_topic", {"topic": topic}, topic=topic)
+    if topic in node.local_dht:
+        del node.local_dht[topic]
+        node.message_storage.delete(topic)
+        invalidate_topic(topic)
+        topic_removed()
+        close_topic_streams(topic)
+        await notify_pull_waiters(topic, closing=True)
+        await replicate({"op": "delete", "topic": topic})
+        logging.info("Deleted topic", extra=log_fields("delete_topic", topic=topic))
         return {"status": "Success", "message": f"Topic '{topic}' deleted."}
     else:
-        logging.warning(f"Attempted to delete non-existent topic '{topic}' at node {peer_id}")
+        logging.warning("Topic to delete not found", extra=log_fields("delete_topic", topic=topic))
         return {"status": "Error", "message": "Topic not found."}
 
 async def publish_message(topic, message):
-    if topic not in message_storage:
-        message_storage[topic] = []
-    message_storage[topic].append(message)
-    logging.info(f"Published message to topic '{topic}' at node {peer_id}")
-    return {"status": "Success", "message": f"Message published to topic '{topic}'"}
-
-async def pull_messages(topic):
-    messages = message_storage.get(topic, [])
-    logging.info(f"Pulled messages for topic '{topic}' at node {peer_id}: {messages}")
-    return {"status": "Success", "messages": messages}
-
-async def query_topic(topic):
-    if topic in local_dht:
-        logging.info(f"Queried topic '{topic}' found at node {peer_id}")
-        return {"status": "Success", "node": peer_id}
+    node = current_node()
+    if node.handoff_fences and await wait_for_handoff(topic):
+        # The topic moved to its new owner while this write waited; pass it on
+        return await forward_request(resolve_owner(topic), "publish_message", {"topic": topic, "message": message},
+                                     topic=topic)
+    offset = await node.message_storage.append(topic, message)
+    await fan_out(topic, offset, message)  # Push to open streams once the message is stored
+    await notify_pull_waiters(topic)
+    if not await replicate({"op": "append", "topic": topic, "offset": offset, "message": message}):
+        logging.warning("Replication quorum not reached",
+                        extra=log_fields("publish_message", topic=topic, offset=offset))
+        return {"status": "Error", "message": "Replication quorum not reached.", "offset": offset}
+    logging.info("Published message", extra=log_fields("publish_message", topic=topic, offset=offset))
+    return {"status": "Success", "message": f"Message published to topic '{topic}'", "offset": offset}
+
+async def apply_replication(ops):
+    """Apply ops shipped by the owner of the topics; this node holds replicas of them.
+
+    Returns {topic: high_watermark} for topics this replica is missing messages on;
+    the rest of that topic's ops are skipped until the owner has caught it up.
+    """
+    node = current_node()
+    local_dht = node.local_dht
+    message_storage = node.message_storage
+    behind = {}
+    touched = set()
+    for op in ops:
+        topic = op["topic"]
+        if topic in behind:
+            continue
+        kind = op["op"]
+        if kind in ("create", "sync"):
+            if topic not in local_dht:
+                local_dht[topic] = None
+                invalidate_topic(topic)
+                topic_added(topic)
+            retention = op.get("retention")
+            message_storage.create(topic, RetentionPolicy(**retention) if retention else None)
+            high_watermark = message_storage.read(topic, 0, 0)[2]
+            if kind == "sync" and high_watermark < op["high_watermark"]:
+                behind[topic] = high_watermark
+        elif kind == "append":
+            if message_storage.ingest(topic, op["offset"], op["message"]):
+                touched.add(topic)
+            else:
+                behind[topic] = message_storage.read(topic, 0, 0)[2]
+        elif kind == "reset":
+            message_storage.reset(topic, op["offset"])
+        elif kind == "delete":
+            local_dht.pop(topic, None)
+            message_storage.delete(topic)
+            invalidate_topic(topic)
+            topic_removed()
+            await notify_pull_waiters(topic, closing=True)
+    await message_storage.commit()  # Acknowledge only what is durable
+    for topic in touched:
+        await notify_pull_waiters(topic)
+    return behind
+
+def choose_read_node(topic):
+    """Pick the copy of a topic that serves a read, following READ_PREFERENCE.
+
+    A node holding a copy serves it itself. Otherwise "closest" takes the replica the
+    fewest hops away (always one hop in direct routing) and "least_loaded" breaks ties
+    by the requests this node has in flight to each. Every hop in hypercube routing gets
+    strictly closer to some replica, so re-choosing at each hop still terminates.
+    Replicas the failure detector reports down are skipped while any other copy is left.
+    """
+    replicas = replica_nodes(resolve_owner(topic))
+    replicas = [node_id for node_id in replicas if not is_down(node_id)] or replicas[:1]
+    if READ_PREFERENCE == "owner" or len(replicas) == 1:
+        return replicas[0]
+    node = current_node()
+    if node.peer_id in replicas:
+        return node.peer_id
+    if ROUTING_MODE == "hypercube":
+        distance = lambda node_id: hop_distance(node.peer_id, node_id)
     else:
-        logging.warning(f"Queried topic '{topic}' not found at node {peer_id}")
-        return {"status": "Error", "message": "Topic not found."}
+        distance = lambda node_id: 1
+    if READ_PREFERENCE == "least_loaded":
+        return min(replicas, key=lambda node_id: (distance(node_id), node.in_flight.get(node_id, 0)))
+    return min(replicas, key=distance)
+
+async def notify_pull_waiters(topic, closing=False):
+    """Wake the long polls parked on a topic; a dict lookup when there are none.
+
+    With `closing` (topic deleted) the waiters return at once instead of waiting on.
+    """
+    pull_waiters = current_node().pull_waiters
+    waiter = pull_waiters.pop(topic, None) if closing else pull_waiters.get(topic)
+    if waiter is not None:
+        condition = waiter[0]
+        async with condition:
+            condition.notify_all()
+
+async def wait_for_messages(topic, from_offset, wait_ms):
+    """Park until a message at or after `from_offset` exists, or `wait_ms` passes."""
+    node = current_node()
+    pull_waiters = node.pull_waiters
+    message_storage = node.message_storage
+    waiter = pull_waiters.get(topic)
+    if waiter is None:
+        waiter = pull_waiters[topic] = [asyncio.Condition(), 0]
+    condition = waiter[0]
+    waiter[1] += 1
+    try:
+        async with condition:
+            await asyncio.wait_for(
+                condition.wait_for(lambda: pull_waiters.get(topic) is not waiter
+                                   or message_storage.read(topic, from_offset, 0)[2] > from_offset),
+                wait_ms / 1000)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        waiter[1] -= 1
+        if not waiter[1] and pull_waiters.get(topic) is waiter:
+            del pull_waiters[topic]
+
+async def pull_messages(topic, from_offset=0, limit=None, wait_ms=0, encoded=False):
+    """Returns up to `limit` messages starting at `from_offset`.
+
+    `next_offset` is the cursor for the following pull and `high_watermark` is the
+    offset the next published message will get. `dropped` counts the messages
+    before the cursor that retention removed before they could be pulled.
+    With `wait_ms`, a pull that would come back empty waits up to that long
+    (capped at PULL_MAX_WAIT_MS) for the next message instead.
+    With `encoded`, the response comes back as JSON bytes, the messages copied in as
+    storage encoded them (pre-encoded with DHT_STORAGE=arena).
+    """
+    message_storage = current_node().message_storage
+    limit = PULL_LIMIT if limit is None else limit
+    if wait_ms and message_storage.read(topic, from_offset, 0)[2] <= from_offset:
+        await wait_for_messages(topic, from_offset, min(wait_ms, PULL_MAX_WAIT_MS))
+    if encoded:
+        messages, count, start_offset, high_watermark = message_storage.read_encoded(topic, from_offset, limit)
+    else:
+        messages, start_offset, high_watermark = message_storage.read(topic, from_offset, limit)
+        count = len(messages)
+    dropped = max(start_offset - from_offset, 0)
+    from_offset = min(from_offset + dropped, high_watermark)  # A cursor past the end waits at the high watermark
+    logging.info("Pulled messages", extra=log_fields("pull_messages", topic=topic, from_offset=from_offset,
+                                                     count=count, messages=messages))
+    if encoded:
+        return b"".join([b'{"status":"Success","messages":', messages,
+                         f',"next_offset":{from_offset + count},"high_watermark":{high_watermark},'
+                         f'"dropped":{dropped}}}'.encode()])
+    return {
+        "status": "Success",
+        "messages": messages,
+        "next_offset": from_offset + count,
+        "high_watermark": high_watermark,
+        "dropped": dropped,
+    }
+
+def read_frames(topic, from_offset, end_offset=None):
+    """Encode up to PULL_LIMIT stored messages from `from_offset` (up to `end_offset`) as one chunk.
+
+    Returns (chunk, next_offset, high_watermark); the cursor skips messages that
+    retention already dropped.
+    """
+    limit = PULL_LIMIT if end_offset is None else min(PULL_LIMIT, end_offset - from_offset)
+    messages, start_offset, high_watermark = current_node().message_storage.read(topic, from_offset, limit)
+    offset = max(from_offset, start_offset)
+    chunk = b"".join(encode_frame(offset + index, message) for index, message in enumerate(messages))
+    return chunk, offset + len(messages), high_watermark
+
+async def stream_messages(topic, from_offset=0, policy=STREAM_SLOW_POLICY):
+    """Yield Server-Sent Events for a topic: the stored backlog from `from_offset`, then live messages.
+
+    The subscriber is registered before the backlog is read, so nothing published in
+    between is missed; live frames below the cursor are skipped, and frames the queue
+    dropped are read back from storage before the stream continues.
+    """
+    subscriber = add_subscriber(topic, policy=policy)
+    logging.info("Opened stream", extra=log_fields("stream", topic=topic, from_offset=from_offset))
+    try:
+        chunk, next_offset, high_watermark = read_frames(topic, from_offset)
+        while chunk:
+            yield chunk
+            chunk, next_offset, high_watermark = read_frames(topic, next_offset)
+        next_offset = min(next_offset, high_watermark)  # A cursor past the end waits at the high watermark
+        while True:
+            if subscriber.lagging and subscriber.queue.empty():
+                subscriber.lagging = False
+                chunk, next_offset, _ = read_frames(topic, next_offset)
+                if chunk:
+                    yield chunk
+                continue
+            try:
+                entry = await asyncio.wait_for(subscriber.queue.get(), STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE_FRAME
+                continue
+            if entry is None:
+                return  # Closed: topic deleted, slow consumer disconnected, or node shutting down
+            offset, frame = entry
+            if offset < next_offset:
+                continue
+            while next_offset < offset:
+                chunk, next_offset, _ = read_frames(topic, next_offset, offset)
+                if not chunk:
+                    break
+                yield chunk
+            yield frame
+            next_offset = offset + 1
+    finally:
+        remove_subscriber(subscriber)
+        logging.info("Closed stream", extra=log_fields("stream", topic=topic))
+
+async def query_topic(topic, cache_node=None):
+    """Look a topic up on this node; `cache_node` is the ingress that will cache the answer."""
+    node = current_node()
+    if cache_node is not None:
+        watch_topic(topic, cache_node)  # Found or not, tell it when that changes
+    if topic in node.local_dht:
+        logging.info("Queried topic", extra=log_fields("query_topic", topic=topic))
+        return {"status": "Success", "node": node.peer_id, "owner": resolve_owner(topic)}
+    else:
+        logging.warning("Queried topic not found", extra=log_fields("query_topic", topic=topic))
+        return {"status": "Error", "message": NOT_FOUND}
 
 async def subscribe(topic):
     """Subscribes to a topic."""
+    node = current_node()
+    subscriptions = node.subscriptions
     if topic not in subscriptions:
         subscriptions[topic] = []
-    if peer_id not in subscriptions[topic]:
-        subscriptions[topic].append(peer_id)  # Add this peer to the subscription list
-    logging.info(f"Node {peer_id} subscribed to topic '{topic}'")
-    return {"status": "Success", "message": f"Subscribed to topic '{topic}'"}
-
-async def forward_request(target_node, endpoint, data):
-    """Forward a request to the specified node address."""
-    node_address = NODE_ADDRESSES.get(target_node)
-    if not node_address:
-        logging.error(f"Node address for {target_node} not found.")
+    if node.peer_id not in subscriptions[topic]:
+        subscriptions[topic].append(node.peer_id)  # Add this peer to the subscription list
+    logging.info("Subscribed", extra=log_fields("subscribe", topic=topic))
+    # Messages are pushed over GET /stream; report where to open it
+    return {"status": "Success", "message": f"Subscribed to topic '{topic}'",
+            "stream": f"/stream?topic={topic}", "active_streams": subscriber_count(topic)}
+
+def route_candidates(target_node):
+    """Nodes to send a request for the target through, best first; nodes known to be down are left out.
+
+    In hypercube routing every neighbor that fixes one of the differing bits is on a
+    shortest path, so a down hop is routed around through another one; if none is a
+    member, the request goes straight to the target. Suspect hops go last.
+    """
+    if ROUTING_MODE == "hypercube":
+        node = current_node()
+        hops = [hop for hop in node.route_hops(target_node)
+                if hop in node.members or hop == target_node] or [target_node]
+    else:
+        hops = [target_node]
+    return sorted((hop for hop in hops if not is_down(hop)), key=lambda hop: status(hop) != UP)
+
+async def forward_read(topic, endpoint, data, handle_local, wait_ms=0):
+    """Serve a read here if this node holds the copy choose_read_node picks, otherwise forward it.
+
+    `handle_local` serves the read on this node. `data` is the request's JSON body, as
+    bytes to pass it through unparsed (see forward_request). With READ_COALESCING,
+    identical reads forwarded at the same time share one forward (coalescing.py).
+    """
+    if choose_read_node(topic) == current_node().peer_id:
+        return await handle_local()
+    if not READ_COALESCING:
+        return await read_from_copies(topic, endpoint, data, handle_local, wait_ms)
+    mark_forwarded()  # The forward itself runs in the flight's task
+    return await single_flight(read_key(endpoint, data), endpoint,
+                               lambda: read_from_copies(topic, endpoint, data, handle_local, wait_ms))
+
+async def read_from_copies(topic, endpoint, data, handle_local, wait_ms):
+    """Send a read to the copy choose_read_node picks, moving on to the next copy if that one is down."""
+    peer_id = current_node().peer_id
+    for _ in range(len(replica_nodes(resolve_owner(topic)))):
+        target_node = choose_read_node(topic)
+        if target_node == peer_id:
+            return await handle_local()
+        response = await forward_request(target_node, endpoint, data, wait_ms, topic)
+        if not (isinstance(response, dict) and response.get("status") == "Error" and is_down(target_node)):
+            return response
+    return response
+
+async def forward_request(target_node, endpoint, data, wait_ms=0, topic=None):
+    """Forward a request towards the target node.
+
+    `data` is the request body: a dict, or bytes already holding the JSON body, which
+    are sent as they are and make the response come back as its raw JSON bytes (see
+    proxy.py); errors are returned as dicts either way. With the `topic`, the next hop
+    routes on the headers alone.
+
+    In hypercube routing mode the request goes to the neighbor one bit closer to the
+    target, which repeats the owner check and forwards again until the owner is reached.
+    A request that may wait at the owner (`wait_ms`) goes over the long-lived pool with
+    its timeout extended by the wait.
+
+    With DHT_FORWARD_TRANSPORT=framed the request goes over the peer's framed
+    connection (framed.py) instead of HTTP. A target the failure detector reports
+    down fails at once instead of waiting out the timeout. A refused connection marks
+    the hop down and, since nothing was sent, the request moves on to the next route
+    candidate.
+    """
+    mark_forwarded()
+    destination = target_node
+    if destination not in NODE_ADDRESSES:
+        logging.error("Node address not found", extra=log_fields(endpoint, target=destination))
         return {"status": "Error", "message": "Target node not found."}
+    candidates = route_candidates(destination)
+    if not candidates:
+        logging.warning("Not forwarding: node is down", extra=log_fields(endpoint, target=destination))
+        return {"status": "Error", "message": f"Target node {destination} is down."}
 
-    url = f"{node_address}/{endpoint}"
+    raw = isinstance(data, (bytes, bytearray))
+    body = data if raw else json.dumps(data, separators=(",", ":")).encode()
+    # X-Hop-Count marks the request as forwarded even without a trace span (see proxy.py)
+    headers = {"X-Hop-Count": "1", **(trace_headers() or {}), "Content-Type": "application/json"}
+    if topic is not None:
+        headers.update(route_headers(topic, wait_ms))
+    in_flight = current_node().in_flight
+    in_flight[destination] = in_flight.get(destination, 0) + 1
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data)
-            response.raise_for_status()
-            return response.json()
+        for target_node in candidates:
+            node_address = NODE_ADDRESSES[target_node]
+            started = time.perf_counter()
+            try:
+                if FORWARD_TRANSPORT == "framed":
+                    wait_seconds = min(wait_ms, PULL_MAX_WAIT_MS) / 1000
+                    content = await framed_request(target_node, endpoint, headers, body, FORWARD_TIMEOUT + wait_seconds)
+                    record_downstream(started)
+                else:
+                    if wait_ms:
+                        wait_seconds = min(wait_ms, PULL_MAX_WAIT_MS) / 1000
+                        response = await get_stream_client(node_address).post(
+                            f"/{endpoint}", content=body, headers=headers,
+                            timeout=httpx.Timeout(FORWARD_TIMEOUT + wait_seconds, connect=FORWARD_CONNECT_TIMEOUT))
+                    else:
+                        response = await get_client(node_address).post(f"/{endpoint}", content=body, headers=headers)
+                    record_downstream(started, response)
+                    response.raise_for_status()
+                    content = response.content
+            except (httpx.ConnectError, FramedConnectError) as e:
+                record_downstream(started)
+                logging.warning("Could not connect", extra=log_fields(endpoint, address=node_address, error=e))
+                mark_down(target_node)
+                continue
+            return content if raw else json.loads(content)
+        return {"status": "Error", "message": f"No route to node {destination}."}
     except httpx.HTTPStatusError as e:
-        logging.error(f"Failed to forward request to {node_address}: {e}")
+        logging.error("Failed to forward request", extra=log_fields(endpoint, address=node_address, error=e))
         return {"status": "Error", "message": "Failed to forward request to target node."}
+    except (httpx.RequestError, FramedRequestError) as e:
+        # The request may have reached the node, so it is not retried elsewhere
+        record_downstream(started)
+        logging.error("Failed to forward request", extra=log_fields(endpoint, address=node_address, error=e))
+        return {"status": "Error", "message": "Failed to forward request to target node."}
+    finally:
+        in_flight[destination] -= 1
+
+async def forward_stream(target_node, endpoint, params):
+    """Open a stream towards the target node and return the upstream response.
+
+    The caller relays the raw bytes downstream, so frames are never decoded or
+    re-encoded on the way. Returns an error dict if the stream could not be opened.
+    """
+    mark_forwarded()
+    if target_node not in NODE_ADDRESSES:
+        logging.error("Node address not found", extra=log_fields(endpoint, target=target_node))
+        return {"status": "Error", "message": "Target node not found."}
+    candidates = route_candidates(target_node)
+    if not candidates:
+        return {"status": "Error", "message": f"Target node {target_node} is down."}
+    node_address = NODE_ADDRESSES[candidates[0]]
+
+    client = get_stream_client(node_address)
+    try:
+        response = await client.send(client.build_request("GET", f"/{endpoint}", params=params, headers=trace_headers()), stream=True)
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.ConnectError):
+            mark_down(candidates[0])
+        logging.error("Failed to open stream", extra=log_fields(endpoint, address=node_address, error=e))
+        return {"status": "Error", "message": "Failed to open stream from target node."}
+    if response.status_code != 200:
+        await response.aclose()
+        logging.error("Failed to open stream", extra=log_fields(endpoint, address=node_address,
+                                                               status=response.status_code))
+        return {"status": "Error", "message": "Failed to open stream from target node."}
+    return response
+
+async def forward_batch(endpoint, items, handle_local):
+    """Split a batch by topic owner and merge the per-item results in request order.
+
+    Items owned by this node go to `handle_local`; every other owner gets one
+    sub-batch, and all sub-batches run concurrently. A failed sub-batch marks each
+    of its items with the error instead of failing the whole batch.
+    """
+    node = current_node()
+    groups = {}
+    for index, owner in enumerate(node.resolver.resolve_many([item["topic"] for item in items])):
+        groups.setdefault(owner, []).append(index)
+    results = [None] * len(items)
+    if len(groups) > 1 or node.peer_id not in groups:
+        mark_forwarded()  # Sub-batches run as separate tasks, which cannot mark this request
+
+    async def run_group(owner, indices):
+        sub_batch = [items[index] for index in indices]
+        if owner == node.peer_id:
+            group_results = await handle_local(sub_batch)
+        else:
+            response = await forward_request(owner, endpoint, {"items": sub_batch})
+            group_results = response.get("results") if isinstance(response, dict) else None
+            if group_results is None or len(group_results) != len(sub_batch):
+                error = {"status": "Error", "message": response.get("message", "Failed to forward batch.")}
+                group_results = [error] * len(sub_batch)
+        for index, result in zip(indices, group_results):
+            results[index] = result
+
+    await asyncio.gather(*(run_group(owner, indices) for owner, indices in groups.items()))
+    return results
+
+async def publish_batch(items):
+    """Publish local items; tasks start in order, so per-topic order is kept while
+    disk appends still share one group commit."""
+    return await asyncio.gather(*(publish_message(item["topic"], item["message"]) for item in items))
+
+async def pull_batch(items):
+    return await asyncio.gather(*(pull_messages(item["topic"], item.get("from_offset", 0), item.get("limit"))
+                                  for item in items))
@@ -0,0 +1,289 @@
+import asyncio
+import base64
+import logging
+import math
+from hashlib import blake2b
+import httpx
+from config import NODE_ADDRESSES, DIRECTORY_INTERVAL_MS, DIRECTORY_FP_RATE, DIRECTORY_MIN_CAPACITY
+from client_pool import get_client
+from failure_detector import is_down
+from node import current_node
+from utils import get_neighbors, resolve_owner
+
+# Topic directory: every node keeps a Bloom filter of the topics it holds and gossips
+# it to its hypercube neighbors, which pass it on, so every node ends up with every
+# node's filter in node.directory (node ID -> DirectoryEntry). An ingress node checks
+# a topic against its owner's filter: a miss there means the topic does not exist and
+# query_topic answers without forwarding. A hit may be a false positive and forwards.
+#
+# Entries are versioned (incarnation, round) like heartbeats and carry the membership
+# epoch they were built in; filters from another epoch are never used, since placement
+# and so ownership may have changed.
+#
+# Gossip alone would leave a new topic out of the other nodes' copies for a few rounds,
+# so a definite miss could deny a topic that was just created. The owner therefore
+# announces each create over the cube's spanning tree: it sends the announcement to
+# its neighbors, and a node that got it across dimension i passes it on across the
+# dimensions after i, so it reaches every node once over neighbor connections within
+# a few hops. The create does not wait for it. The ingress that forwarded the create
+# adds the topic at once; other nodes can still deny it until the announcement
+# arrives, or until the owner's next filter does if a node on the way was down.
+# A node keeps the topics announced to it until a version of the owner's filter
+# that includes them arrives.
+# While a membership change is pending, nodes do not rebuild their filters, so topics
+# handed off still match, and a node with the change pending answers no misses.
+
+class BloomFilter:
+    """Fixed-size Bloom filter; k bit positions per key by double hashing one 16-byte BLAKE2b digest.
+
+    The digest is personalised so its bits are independent of ring_hash, which
+    decides which topics land on a node.
+    """
+
+    __slots__ = ("bits", "size", "hashes", "count")
+
+    def __init__(self, size, hashes, bits=None, count=0):
+        self.size = size  # Bits
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8) if bits is None else bits
+        self.count = count  # Keys added
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate=DIRECTORY_FP_RATE):
+        """The smallest filter holding `capacity` keys at the given false-positive rate."""
+        size = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        return cls(size, max(1, round(size / capacity * math.log(2))))
+
+    def positions(self, key):
+        digest = blake2b(key.encode(), digest_size=16, person=b"dht-directory").digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+    def capacity(self):
+        """Keys the filter holds at the false-positive rate it was sized for."""
+        return int(self.size * math.log(2) / self.hashes)
+
+    def nbytes(self):
+        return len(self.bits)
+
+class DirectoryEntry:
+    """One node's filter as gossiped: version, membership epoch, filter, and its wire form."""
+
+    __slots__ = ("version", "epoch", "filter", "wire")
+
+    def __init__(self, version, epoch, bloom, wire=None):
+        self.version = version
+        self.epoch = epoch
+        self.filter = bloom
+        self.wire = wire or [list(version), epoch, bloom.size, bloom.hashes, bloom.count,
+                             base64.b64encode(bloom.bits).decode()]
+
+    @classmethod
+    def from_wire(cls, wire):
+        version, epoch, size, hashes, count, bits = wire
+        return cls(tuple(version), epoch, BloomFilter(size, hashes, bytearray(base64.b64decode(bits)), count), wire)
+
+def build_filter(topics):
+    """A filter of `topics` with room for as many again before the false-positive rate degrades."""
+    bloom = BloomFilter.for_capacity(max(DIRECTORY_MIN_CAPACITY, 2 * len(topics)))
+    for topic in topics:
+        bloom.add(topic)
+    return bloom
+
+def topic_added(topic):
+    """A topic now lives on this node; Bloom filters can add in place."""
+    node = current_node()
+    if node.directory_filter is not None:
+        node.directory_filter.add(topic)
+        node.directory_changed = True
+
+def topic_removed():
+    """A topic left this node; Bloom filters cannot remove, so the next round rebuilds."""
+    current_node().directory_rebuild = True
+
+def announce_created(topic):
+    """Start spreading this node's create of `topic` to every node; the create does not wait for it."""
+    node = current_node()
+    if node.directory_filter is None:
+        return  # No gossip, so no copies of this node's filter to correct
+    # topic_added put it in the filter, so the next version published includes it
+    relay_created(node, {"owner": node.peer_id, "topic": topic, "epoch": node.membership["epoch"],
+                         "version": [node.incarnation, node.directory_round + 1]}, 0)
+
+def relay_created(node, payload, first_dimension):
+    """Pass an announcement on to the neighbors across `first_dimension` and the dimensions after it."""
+    for dimension, neighbor in enumerate(get_neighbors(node.peer_id)):
+        if dimension < first_dimension or is_down(neighbor):
+            continue  # A down node's part of the tree learns the topic from the owner's next filter
+        task = asyncio.create_task(_send_announcement(neighbor, {**payload, "dimension": dimension}))
+        node.directory_announcements.add(task)  # Referenced until it finishes
+        task.add_done_callback(lambda task: _announcement_done(node, task))
+
+def _announcement_done(node, task):
+    node.directory_announcements.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Topic announcement failed: {task.exception()!r}")
+
+async def _send_announcement(neighbor, payload):
+    try:
+        response = await get_client(NODE_ADDRESSES[neighbor]).post("/directory/created", json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logging.warning(f"Announcing topic {payload['topic']} to {neighbor} failed: {e!r}")
+
+def forwarded_create(owner, topic):
+    """This node just forwarded a create to `owner`: add the topic to our copy of its filter at once."""
+    entry = current_node().directory.get(owner)
+    if entry is not None:
+        entry.filter.add(topic)
+
+def learn_created(owner, topic, epoch, version):
+    """`owner` created `topic`: add it to our copies of the owner's filter and of the one we check it against.
+
+    The two differ while a handoff override sends the topic's creates to its new owner.
+    The topic is kept in node.directory_announced until a version that includes it arrives.
+    """
+    node = current_node()
+    for node_id in {owner, resolve_owner(topic)} - {node.peer_id}:
+        included_from = tuple(version) if node_id == owner else None  # None: that node's filter never will
+        node.directory_announced.setdefault(node_id, {})[topic] = (epoch, included_from)
+        entry = node.directory.get(node_id)
+        if entry is not None:
+            entry.filter.add(topic)
+
+def _keep_announced(node, node_id, entry):
+    """Add the announced topics a new entry of `node_id` may lack to it; forget the ones it includes."""
+    announced = node.directory_announced.get(node_id)
+    if not announced:
+        return
+    for topic, (epoch, included_from) in list(announced.items()):
+        if epoch < entry.epoch or (included_from is not None and included_from <= entry.version):
+            del announced[topic]
+        else:
+            entry.filter.add(topic)  # Only our copy: the wire form passed on stays the owner's
+
+def may_exist(topic):
+    """Check a topic against its owner's filter: False means it does not exist, True that it may.
+
+    None when there is no filter of the owner from the current membership epoch.
+    """
+    node = current_node()
+    if node.membership["pending"] is not None:
+        return None  # Topics are moving between owners
+    entry = node.directory.get(resolve_owner(topic))
+    if entry is None or entry.epoch != node.membership["epoch"]:
+        return None
+    counts = node.directory_counts
+    counts["checks"] += 1
+    if topic in entry.filter:
+        return True
+    counts["definite_misses"] += 1
+    return False
+
+def count_false_positive():
+    """The owner's filter allowed a topic the owner then did not find."""
+    current_node().directory_counts["false_positives"] += 1
+
+def publish_own_filter(node):
+    """Start a new version of this node's entry if its topics changed since the last round.
+
+    The filter is not rebuilt while a membership change is pending, so topics handed off keep matching.
+    """
+    rebuild = node.directory_rebuild or node.directory_filter.count > node.directory_filter.capacity()
+    if rebuild and node.membership["pending"] is None:
+        # Deleted topics would match forever, and past its capacity the filter fills up
+        node.directory_filter = build_filter(list(node.local_dht))
+        node.directory_rebuild = False
+        node.directory_changed = True
+    own = node.directory.get(node.peer_id)
+    if node.directory_changed or own is None or own.epoch != node.membership["epoch"]:
+        node.directory_round += 1
+        node.directory[node.peer_id] = DirectoryEntry((node.incarnation, node.directory_round),
+                                                      node.membership["epoch"], node.directory_filter)
+        node.directory_changed = False
+
+def directory_versions():
+    return {node_id: list(entry.version) for node_id, entry in current_node().directory.items()}
+
+def newer_entries(versions):
+    """Wire form of the entries newer than the given versions (node ID -> version)."""
+    return {node_id: entry.wire for node_id, entry in current_node().directory.items()
+            if tuple(versions.get(node_id, ())) < entry.version}
+
+def merge_entries(entries):
+    node = current_node()
+    directory = node.directory
+    for node_id, wire in entries.items():
+        if node_id == node.peer_id:
+            continue  # This node's own entry is always the newest
+        entry = directory.get(node_id)
+        if entry is None or tuple(wire[0]) > entry.version:
+            entry = directory[node_id] = DirectoryEntry.from_wire(wire)
+            _keep_announced(node, node_id, entry)
+
+async def _exchange(node, neighbor):
+    """Push the entries the neighbor lacks and pull the ones this node lacks."""
+    known = node.directory_known.get(neighbor, {})
+    try:
+        response = await get_client(NODE_ADDRESSES[neighbor]).post(
+            "/directory", json={"source": node.peer_id, "versions": directory_versions(),
+                                "entries": newer_entries(known)})
+        response.raise_for_status()
+        result = response.json()
+    except httpx.HTTPError as e:
+        logging.debug(f"Directory exchange with {neighbor} failed: {e!r}")
+        return
+    merge_entries(result["entries"])
+    node.directory_known[neighbor] = result["versions"]
+
+async def _directory_loop(node):
+    while True:
+        publish_own_filter(node)
+        await asyncio.gather(*(_exchange(node, neighbor) for neighbor in get_neighbors(node.peer_id)
+                               if neighbor in node.members))
+        await asyncio.sleep(DIRECTORY_INTERVAL_MS / 1000)
+
+def start_directory():
+    """Build this node's filter and start the gossip rounds.
+
+    Called once at app startup; DHT_DIRECTORY_INTERVAL_MS=0 turns them off.
+    """
+    if DIRECTORY_INTERVAL_MS <= 0:
+        return
+    node = current_node()
+    node.directory_filter = build_filter(list(node.local_dht))
+    node.directory_task = asyncio.create_task(_directory_loop(node))
+
+async def stop_directory():
+    node = current_node()
+    if node.directory_task is not None:
+        node.directory_task.cancel()
+        await asyncio.gather(node.directory_task, return_exceptions=True)
+        node.directory_task = None
+    announcements = list(node.directory_announcements)
+    for task in announcements:
+        task.cancel()
+    await asyncio.gather(*announcements, return_exceptions=True)
+
+def directory_stats():
+    node = current_node()
+    own = node.directory_filter
+    return {
+        "filters": len(node.directory),
+        "bytes": sum(entry.filter.nbytes() for entry in node.directory.values()),
+        "own_topics": own.count if own is not None else 0,
+        "own_bytes": own.nbytes() if own is not None else 0,
+        **node.directory_counts,
+    }
@@ -0,0 +1,95 @@
+import asyncio
+import httpx
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+import matplotlib.pyplot as plt
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT
+
+# Define the plotting directory
+PLOTTING_DIR = "../Out/Images"
+if not os.path.exists(PLOTTING_DIR):
+    os.makedirs(PLOTTING_DIR)
+
+BATCH_SIZES = [1, 10, 50, 100, 250, 500, 1000]  # Messages per /publish_batch request
+NUM_MESSAGES = 20000  # Messages published per batch size
+NUM_TOPICS = 100  # Topics the messages are spread over
+CONCURRENCY = 16  # Batch requests in flight at once
+MESSAGE = "Hello, Distributed World!"
+
+async def measure_batch_size(client, batch_size):
+    """Publish NUM_MESSAGES in batches through random ingress nodes; return messages/sec."""
+    peer_urls = list(NODE_ADDRESSES.values())
+    num_batches = max(NUM_MESSAGES // batch_size, 1)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    failures = 0
+
+    async def send_batch():
+        nonlocal failures
+        items = [{"topic": f"batch_test_{random.randrange(NUM_TOPICS)}", "message": MESSAGE}
+                 for _ in range(batch_size)]
+        async with semaphore:
+            response = await client.post(f"{random.choice(peer_urls)}/publish_batch", json={"items": items})
+        failures += sum(1 for result in response.json()["results"] if result["status"] != "Success")
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(send_batch() for _ in range(num_batches)))
+    elapsed_time = time.perf_counter() - start_time
+    return num_batches * batch_size / elapsed_time, failures
+
+async def main():
+    throughputs = []
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=CONCURRENCY), timeout=60) as client:
+        for batch_size in BATCH_SIZES:
+            throughput, failures = await measure_batch_size(client, batch_size)
+            throughputs.append(throughput)
+            print(f"Batch size {batch_size:>4}: {throughput:.0f} messages/sec ({failures} failed items)")
+    plot_results(throughputs)
+
+def plot_results(throughputs):
+    plt.figure(figsize=(10, 6))
+    plt.plot(BATCH_SIZES, throughputs, marker='o', label='Throughput')
+    plt.xscale('log')
+    plt.title('Publish Throughput vs Batch Size')
+    plt.xlabel('Messages per Batch')
+    plt.ylabel('Throughput (messages/second)')
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(f"{PLOTTING_DIR}/throughput_vs_batch_size.png")
+    plt.close()
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Saving results and exiting...")
+    sys.exit(0)
+
+# Kill peer processes
+def kill_peer_processes():
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+# Run the benchmark
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    print("Starting peer nodes...")
+    subprocess.Popen(["bash", "run.sh"])  # Start peer nodes in the background
+    time.sleep(5)  # Wait for nodes to initialize
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    print("Stopping peer nodes...")
+    kill_peer_processes()
+    print("Peer nodes stopped.")
@@ -6,7 +6,7 @@ import random
 import signal
 import logging
 import sys
-from config import NODE_ADDRESSES
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT
 from dht import create_topic, forward_request, query_topic
 
 # Initialize logging
@@ -58,9 +58,9 @@ def signal_handler(sig, frame):
 def kill_peer_processes():
     current_os = platform.system()
     if current_os == "Linux":
-        subprocess.run("lsof -t -i :5000-5007 | xargs kill", shell=True)
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
     elif current_os == "Windows":
-        for port in range(5000, 5008):
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
             subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
     else:
         print("Unsupported OS for killing processes.")
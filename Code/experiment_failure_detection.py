@@ -0,0 +1,122 @@
+import asyncio
+import os
+import random
+import time
+import subprocess
+import signal
+import platform
+import sys
+import httpx
+from config import NODE_ADDRESSES, NODE_IDS, NUM_NODES, BASE_PORT
+from utils import get_neighbors
+
+NUM_TOPICS = 100  # Topics spread over every node
+NUM_WORKERS = 16  # Clients publishing and pulling against the surviving nodes
+PHASE_SECONDS = 10  # Length of the healthy and detected windows
+MESSAGE = "Hello, Distributed World!"
+VICTIM = NODE_IDS[-1]  # Node killed mid-run
+# Two copies per topic so reads have somewhere to go; hypercube routing so hops can route around the victim
+CLUSTER_ENV = {"DHT_REPLICATION_FACTOR": "2", "DHT_ROUTING_MODE": "hypercube"}
+
+TOPICS = [f"failure_test_{i}" for i in range(NUM_TOPICS)]
+
+async def load(client, window, stop):
+    """Publish and pull random topics through the surviving nodes until stopped."""
+    peer_urls = [NODE_ADDRESSES[node_id] for node_id in NODE_IDS if node_id != VICTIM]
+
+    async def worker():
+        while not stop.is_set():
+            operation = "publish_message" if random.random() < 0.5 else "pull_messages"
+            payload = {"topic": random.choice(TOPICS)}
+            payload.update({"message": MESSAGE} if operation == "publish_message" else {"limit": 1})
+            start_time = time.perf_counter()
+            try:
+                response = (await client.post(f"{random.choice(peer_urls)}/{operation}", json=payload)).json()
+                ok = response.get("status") == "Success"
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            current = window["current"]
+            current[operation]["latencies"].append(time.perf_counter() - start_time)
+            current[operation]["errors"] += 0 if ok else 1
+
+    await asyncio.gather(*(worker() for _ in range(NUM_WORKERS)))
+
+def new_window():
+    return {operation: {"latencies": [], "errors": 0} for operation in ("publish_message", "pull_messages")}
+
+async def wait_until_down(client):
+    """Poll the victim's neighbors until they all report it down; returns the elapsed seconds."""
+    start_time = time.perf_counter()
+    while True:
+        views = await asyncio.gather(*(client.get(f"{NODE_ADDRESSES[neighbor]}/peer_status")
+                                       for neighbor in get_neighbors(VICTIM)))
+        if all(view.json()["peers"][VICTIM]["status"] == "down" for view in views):
+            return time.perf_counter() - start_time
+        await asyncio.sleep(0.05)
+
+async def run_experiment():
+    windows = {}
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=NUM_WORKERS + 8)) as client:
+        for topic in TOPICS:
+            await client.post(f"{NODE_ADDRESSES[NODE_IDS[0]]}/create_topic", json={"topic": topic})
+        window = {"current": new_window()}
+        stop = asyncio.Event()
+        workers = asyncio.create_task(load(client, window, stop))
+
+        await asyncio.sleep(PHASE_SECONDS)
+        windows["healthy"] = window["current"]
+        window["current"] = new_window()
+        print(f"Killing node {VICTIM}...")
+        subprocess.run(f"lsof -t -s TCP:LISTEN -i TCP:{BASE_PORT + NODE_IDS.index(VICTIM)} | xargs kill", shell=True)
+        detection_seconds = await wait_until_down(client)
+        windows["detecting"] = window["current"]
+        window["current"] = new_window()
+        await asyncio.sleep(PHASE_SECONDS)
+        windows["detected"] = window["current"]
+
+        stop.set()
+        await workers
+    return detection_seconds, windows
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Exiting...")
+    sys.exit(0)
+
+# Kill peer processes
+def kill_peer_processes():
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+async def main():
+    detection_seconds, windows = await run_experiment()
+    print(f"Neighbors saw node {VICTIM} down after {detection_seconds:.2f} s")
+    for name, window in windows.items():
+        for operation, stats in window.items():
+            latencies = sorted(stats["latencies"]) or [0]
+            error_rate = stats["errors"] / len(stats["latencies"]) if stats["latencies"] else 0.0
+            print(f"{name:>10} {operation:>16}: {len(stats['latencies']):6d} requests, "
+                  f"p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms, error rate {error_rate:.2%}")
+
+# Run the experiment
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    print("Starting peer nodes...")
+    subprocess.Popen(["bash", "run.sh"], env=dict(os.environ, **CLUSTER_ENV))  # Start peer nodes in the background
+    time.sleep(5)  # Wait for nodes to initialize
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    print("Stopping peer nodes...")
+    kill_peer_processes()
+    print("Peer nodes stopped.")
@@ -0,0 +1,136 @@
+import asyncio
+import httpx
+import os
+import platform
+import random
+import signal
+import string
+import subprocess
+import sys
+import time
+import numpy as np
+from config import NODE_ADDRESSES, NODE_IDS, NUM_NODES, BASE_PORT, MEMBERS
+from node import placement_for
+
+TRANSPORTS = ["http", "framed"]
+NUM_TOPICS = 50  # Topics published to and pulled from
+HOP_SAMPLES = 500  # Serial forwarded requests timed per transport
+THROUGHPUT_SECONDS = 10  # Length of the concurrent publish run
+CONCURRENCY = 64  # Publishes in flight at once during the throughput run
+STARTUP_TIMEOUT = 120  # Seconds to wait for every node to come up
+
+def generate_topic_name():
+    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    return f"framed_test_{random_string}"
+
+async def wait_for_nodes(client):
+    """Poll every node until it answers instead of sleeping a fixed time."""
+    deadline = time.time() + STARTUP_TIMEOUT
+    pending = list(NODE_ADDRESSES.values())
+    while pending and time.time() < deadline:
+        still_pending = []
+        for peer_url in pending:
+            try:
+                await client.get(f"{peer_url}/node_stats")
+            except httpx.HTTPError:
+                still_pending.append(peer_url)
+        pending = still_pending
+        if pending:
+            await asyncio.sleep(0.5)
+    if pending:
+        raise RuntimeError(f"{len(pending)} nodes did not start")
+
+def forwarding_entry(topic):
+    """A node that does not own `topic`, so every request to it is forwarded exactly once."""
+    owner = placement_for(MEMBERS).owner(topic)
+    return NODE_ADDRESSES[random.choice([node_id for node_id in NODE_IDS if node_id != owner])]
+
+def ingress_downstream_ms(response):
+    """The entry node's wait on the forwarded request, from "000 q=0.1 h=4.2 d=3.9;..."."""
+    entry_hop = response.headers["X-Trace-Timing"].split(";")[0]
+    return float(entry_hop.rsplit("d=", 1)[1])
+
+async def measure_hop_latency(client, topics):
+    """Time serial publishes and pulls sent to a non-owner node; returns the forwarded hop times."""
+    hop_ms = []
+    for index in range(HOP_SAMPLES):
+        topic = random.choice(topics)
+        endpoint, payload = [
+            ("publish_message", {"topic": topic, "message": "Hello, Framed!"}),
+            ("pull_messages", {"topic": topic}),
+        ][index % 2]
+        response = await client.post(f"{forwarding_entry(topic)}/{endpoint}", json=payload,
+                                     headers={"X-Trace-Breakdown": "1"})
+        hop_ms.append(ingress_downstream_ms(response))
+    return hop_ms
+
+async def measure_throughput(client, topics):
+    """Publish to non-owner nodes from CONCURRENCY workers; returns messages/sec."""
+    published = 0
+    deadline = time.perf_counter() + THROUGHPUT_SECONDS
+
+    async def worker():
+        nonlocal published
+        while time.perf_counter() < deadline:
+            topic = random.choice(topics)
+            response = await client.post(f"{forwarding_entry(topic)}/publish_message",
+                                         json={"topic": topic, "message": "Hello, Framed!"})
+            published += response.json().get("status") == "Success"
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return published / (time.perf_counter() - start_time)
+
+async def benchmark_transport():
+    topics = [generate_topic_name() for _ in range(NUM_TOPICS)]
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=CONCURRENCY), timeout=30) as client:
+        await wait_for_nodes(client)
+        for topic in topics:
+            await client.post(f"{forwarding_entry(topic)}/create_topic", json={"topic": topic})
+        hop_ms = await measure_hop_latency(client, topics)
+        messages_per_second = await measure_throughput(client, topics)
+    return {
+        "mean_hop_ms": np.mean(hop_ms),
+        "p50_hop_ms": np.percentile(hop_ms, 50),
+        "p99_hop_ms": np.percentile(hop_ms, 99),
+        "messages_per_second": messages_per_second,
+    }
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Saving results and exiting...")
+    sys.exit(0)
+
+# Kill peer processes (the framed listeners belong to the same processes)
+def kill_peer_processes():
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+# Run the benchmark once per transport
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    results = {}
+    for transport in TRANSPORTS:
+        print(f"Starting peer nodes with the {transport} transport...")
+        subprocess.Popen(["bash", "run.sh"], env={**os.environ, "DHT_FORWARD_TRANSPORT": transport,
+                                                  "DHT_ROUTING_MODE": "direct"})
+
+        try:
+            results[transport] = asyncio.run(benchmark_transport())
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+        print("Stopping peer nodes...")
+        kill_peer_processes()
+        time.sleep(1)  # Let the HTTP and framed ports free up before the next run
+
+    for transport, result in results.items():
+        print(f"{transport:>7}: forwarded hop mean {result['mean_hop_ms']:.2f} ms, "
+              f"p50 {result['p50_hop_ms']:.2f} ms, p99 {result['p99_hop_ms']:.2f} ms, "
+              f"{result['messages_per_second']:.0f} messages/sec")
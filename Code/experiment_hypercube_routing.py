@@ -0,0 +1,106 @@
+import asyncio
+import httpx
+import os
+import platform
+import random
+import signal
+import string
+import subprocess
+import sys
+import time
+import numpy as np
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT
+
+ROUTING_MODES = ["direct", "hypercube"]
+NUM_TOPICS = 200  # Topics exercised per routing mode
+CONCURRENCY = 32  # Requests in flight at once, so pools open more than one connection
+
+def generate_topic_name():
+    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    return f"routing_test_{random_string}"
+
+async def run_workload(client, num_topics):
+    """Create, publish to and pull every topic from a random ingress node; return latencies and hops."""
+    latencies = []
+    hops = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def exercise_topic(topic_name):
+        async with semaphore:
+            peer_url = random.choice(list(NODE_ADDRESSES.values()))
+            for endpoint, payload in [
+                ("create_topic", {"topic": topic_name}),
+                ("publish_message", {"topic": topic_name, "message": "Hello, Hypercube!"}),
+                ("pull_messages", {"topic": topic_name}),
+            ]:
+                start_time = time.perf_counter()
+                response = await client.post(f"{peer_url}/{endpoint}", json=payload)
+                latencies.append(time.perf_counter() - start_time)
+                hops.append(response.json().get("hops", 0))
+
+    await asyncio.gather(*(exercise_topic(generate_topic_name()) for _ in range(num_topics)))
+    return latencies, hops
+
+async def collect_connection_counts(client):
+    """Sum the open peer connections reported by every node."""
+    total_connections = 0
+    max_peers = 0
+    for peer_url in NODE_ADDRESSES.values():
+        stats = (await client.get(f"{peer_url}/node_stats")).json()
+        total_connections += stats["open_connections"]
+        max_peers = max(max_peers, stats["connected_peers"])
+    return total_connections, max_peers
+
+async def benchmark_mode():
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=CONCURRENCY)) as client:
+        latencies, hops = await run_workload(client, NUM_TOPICS)
+        total_connections, max_peers = await collect_connection_counts(client)
+    return {
+        "mean_latency_ms": np.mean(latencies) * 1000,
+        "p99_latency_ms": np.percentile(latencies, 99) * 1000,
+        "mean_hops": np.mean(hops),
+        "max_hops": max(hops),
+        "open_connections": total_connections,
+        "max_peers_per_node": max_peers,
+    }
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Saving results and exiting...")
+    sys.exit(0)
+
+# Kill peer processes
+def kill_peer_processes():
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+# Run the benchmark once per routing mode
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    results = {}
+    for mode in ROUTING_MODES:
+        print(f"Starting peer nodes with {mode} routing...")
+        subprocess.Popen(["bash", "run.sh"], env={**os.environ, "DHT_ROUTING_MODE": mode})
+        time.sleep(5)  # Wait for nodes to initialize
+
+        try:
+            results[mode] = asyncio.run(benchmark_mode())
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+        print("Stopping peer nodes...")
+        kill_peer_processes()
+        time.sleep(1)  # Let the ports free up before the next mode
+
+    for mode, result in results.items():
+        print(f"{mode:>10}: mean latency {result['mean_latency_ms']:.2f} ms, "
+              f"p99 latency {result['p99_latency_ms']:.2f} ms, "
+              f"mean hops {result['mean_hops']:.2f} (max {result['max_hops']}), "
+              f"open connections {result['open_connections']} "
+              f"(max {result['max_peers_per_node']} peers per node)")
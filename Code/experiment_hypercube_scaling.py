@@ -0,0 +1,106 @@
+import asyncio
+import httpx
+import os
+import platform
+import random
+import signal
+import string
+import subprocess
+import sys
+import time
+import numpy as np
+from config import BASE_PORT, build_node_addresses
+
+DIMENSIONS = [3, 4, 5, 6]  # Cube sizes to measure (8 to 64 nodes)
+NUM_REQUESTS = 2000  # Requests issued per cube size
+CONCURRENCY = 64  # Requests in flight at once
+STARTUP_TIMEOUT = 120  # Seconds to wait for every node to come up
+
+def generate_topic_name():
+    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
+    return f"scaling_test_{random_string}"
+
+async def wait_for_nodes(client, node_addresses):
+    """Poll every node until it answers instead of sleeping a fixed time."""
+    deadline = time.time() + STARTUP_TIMEOUT
+    pending = list(node_addresses.values())
+    while pending and time.time() < deadline:
+        still_pending = []
+        for peer_url in pending:
+            try:
+                await client.get(f"{peer_url}/node_stats")
+            except httpx.HTTPError:
+                still_pending.append(peer_url)
+        pending = still_pending
+        if pending:
+            await asyncio.sleep(0.5)
+    if pending:
+        raise RuntimeError(f"{len(pending)} nodes did not start")
+
+async def measure_cube(dimensions):
+    node_addresses = build_node_addresses(dimensions)
+    peer_urls = list(node_addresses.values())
+    latencies = []
+    hops = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send_request(client, topic_name):
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await client.post(f"{random.choice(peer_urls)}/publish_message",
+                                         json={"topic": topic_name, "message": "Hello, Hypercube!"})
+            latencies.append(time.perf_counter() - start_time)
+            hops.append(response.json().get("hops", 0))
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=CONCURRENCY)) as client:
+        await wait_for_nodes(client, node_addresses)
+        start_time = time.perf_counter()
+        await asyncio.gather(*(send_request(client, generate_topic_name()) for _ in range(NUM_REQUESTS)))
+        elapsed_time = time.perf_counter() - start_time
+
+    return {
+        "nodes": len(node_addresses),
+        "throughput": NUM_REQUESTS / elapsed_time,
+        "mean_latency_ms": np.mean(latencies) * 1000,
+        "p99_latency_ms": np.percentile(latencies, 99) * 1000,
+        "mean_hops": np.mean(hops),
+        "expected_hops": dimensions / 2,  # Mean Hamming distance between a random ingress and owner
+    }
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Saving results and exiting...")
+    sys.exit(0)
+
+# Kill peer processes
+def kill_peer_processes(num_nodes):
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + num_nodes - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + num_nodes):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+# Run the experiment once per cube size
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    results = {}
+    for dimensions in DIMENSIONS:
+        print(f"Starting {2 ** dimensions} peer nodes...")
+        subprocess.Popen(["bash", "run.sh", str(dimensions)], env={**os.environ, "DHT_ROUTING_MODE": "hypercube"})
+
+        try:
+            results[dimensions] = asyncio.run(measure_cube(dimensions))
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+        print("Stopping peer nodes...")
+        kill_peer_processes(2 ** dimensions)
+        time.sleep(1)  # Let the ports free up before the next cube size
+
+    for dimensions, result in results.items():
+        print(f"d={dimensions} ({result['nodes']} nodes): throughput {result['throughput']:.1f} req/s, "
+              f"mean latency {result['mean_latency_ms']:.2f} ms, p99 latency {result['p99_latency_ms']:.2f} ms, "
+              f"mean hops {result['mean_hops']:.2f} (expected {result['expected_hops']:.2f})")
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import tempfile
+import time
+import dht
+from config import STORAGE_BACKEND
+from logger import setup_logger, log_stats
+from node import current_node
+from storage import create_storage
+
+NUM_MESSAGES = 100000  # Messages in the benchmarked topic
+PULL_SIZES = [1000, 100000]  # Messages returned per pull: the default limit and the whole topic
+NUM_PULLS = 200  # Pulls timed per mode and size
+TOPIC = "logging_test"
+
+async def old_pull(topic, limit):
+    """The previous pull log line: the whole message list formatted on the request path."""
+    response = await dht.pull_messages(topic, 0, limit)
+    logging.info(f"Pulled messages for topic '{topic}' at node {current_node().peer_id}: {response['messages']}")
+    return response
+
+async def time_pulls(pull, limit):
+    latencies = []
+    for _ in range(NUM_PULLS):
+        start_time = time.perf_counter()
+        await pull(TOPIC, limit)
+        latencies.append(time.perf_counter() - start_time)
+    return sorted(latencies)
+
+def reset_logging():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.NOTSET)
+
+async def main():
+    # Pulls are served in this process, from storage of its own rather than a running node's data directory
+    current_node().message_storage = create_storage(STORAGE_BACKEND, tempfile.mkdtemp())
+    for offset in range(NUM_MESSAGES):
+        await current_node().message_storage.append(TOPIC, f"Message {offset}: Hello, Distributed World!")
+    log_dir = tempfile.mkdtemp()
+    new_pull = lambda topic, limit: dht.pull_messages(topic, 0, limit)
+
+    def logging_off():
+        logging.disable(logging.CRITICAL)
+
+    def sync_file():
+        logging.basicConfig(filename=f"{log_dir}/sync.log", level=logging.INFO, force=True)
+
+    def queued(rate):
+        def configure():
+            setup_logger("bench", log_dir)
+            for handler in logging.getLogger().handlers:
+                for log_filter in handler.filters:
+                    log_filter.rates = {"pull_messages": rate}
+        return configure
+
+    modes = [
+        ("logging off", logging_off, new_pull),
+        ("old: sync file, full list", sync_file, old_pull),
+        ("queued, capped fields", queued(1.0), new_pull),
+        ("queued, 1% sampled", queued(0.01), new_pull),
+    ]
+    print(f"Pull latency on a topic with {NUM_MESSAGES} messages, {NUM_PULLS} pulls per mode:")
+    for limit in PULL_SIZES:
+        for name, configure, pull in modes:
+            reset_logging()
+            configure()
+            latencies = await time_pulls(pull, limit)
+            print(f"{limit:>7} msgs/pull  {name:>26}: p50 {latencies[len(latencies) // 2] * 1000:8.3f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.3f} ms")
+    reset_logging()
+    print(f"Records sampled out / dropped by the queue: {log_stats()}")
+
+# Run the benchmark
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT
+
+NUM_CONSUMERS = 100  # Consumers pulling the same quiet topic
+DURATION = 10  # Seconds per mode
+PUBLISH_INTERVAL = 1.0  # Seconds between published messages
+WAIT_MS = 5000  # Long-poll wait per pull
+TOPIC = "long_poll_test"
+
+async def run_mode(client, wait_ms):
+    """Run NUM_CONSUMERS pull loops for DURATION seconds; count requests and delivery latency."""
+    peer_urls = list(NODE_ADDRESSES.values())
+    publish_times = {}
+    stats = {"requests": 0, "empty": 0, "errors": 0, "latencies": []}
+    high_watermark = (await client.post(f"{peer_urls[0]}/pull_messages",
+                                        json={"topic": TOPIC, "limit": 1})).json()["high_watermark"]
+    deadline = time.perf_counter() + DURATION
+
+    async def consumer():
+        url = f"{random.choice(peer_urls)}/pull_messages"  # Most consumers reach the owner through a forwarding node
+        offset = high_watermark
+        while time.perf_counter() < deadline:
+            try:
+                response = (await client.post(url, json={"topic": TOPIC, "from_offset": offset, "wait_ms": wait_ms})).json()
+            except httpx.HTTPError:
+                stats["errors"] += 1
+                continue
+            stats["requests"] += 1
+            if not response["messages"]:
+                stats["empty"] += 1
+            now = time.perf_counter()
+            for index in range(len(response["messages"])):
+                stats["latencies"].append(now - publish_times.get(offset + index, now))
+            offset = response["next_offset"]
+
+    async def publisher():
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(PUBLISH_INTERVAL)
+            published_at = time.perf_counter()
+            response = (await client.post(f"{peer_urls[0]}/publish_message",
+                                          json={"topic": TOPIC, "message": "tick"})).json()
+            publish_times[response["offset"]] = published_at
+
+    await asyncio.gather(publisher(), *(consumer() for _ in range(NUM_CONSUMERS)))
+    return stats
+
+async def main():
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=NUM_CONSUMERS + 1),
+                                 timeout=WAIT_MS / 1000 + 30) as client:
+        await client.post(f"{list(NODE_ADDRESSES.values())[0]}/create_topic", json={"topic": TOPIC})
+        print(f"{NUM_CONSUMERS} consumers, one message every {PUBLISH_INTERVAL}s, {DURATION}s per mode:")
+        for name, wait_ms in (("busy poll", 0), (f"long poll {WAIT_MS}ms", WAIT_MS)):
+            stats = await run_mode(client, wait_ms)
+            latencies = sorted(stats["latencies"]) or [0]
+            print(f"{name:>18}: {stats['requests'] / DURATION:8.0f} pulls/sec, "
+                  f"{stats['empty'] / DURATION:8.0f} empty/sec, "
+                  f"delivery p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, {stats['errors']} errors")
+
+# Signal handling for clean shutdown
+def signal_handler(sig, frame):
+    print("Interrupted! Exiting...")
+    sys.exit(0)
+
+# Kill peer processes
+def kill_peer_processes():
+    current_os = platform.system()
+    if current_os == "Linux":
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
+    elif current_os == "Windows":
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
+            subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
+    else:
+        print("Unsupported OS for killing processes.")
+
+# Run the experiment
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    print("Starting peer nodes...")
+    subprocess.Popen(["bash", "run.sh"])  # Start peer nodes in the background
+    time.sleep(5)  # Wait for nodes to initialize
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+    print("Stopping peer nodes...")
+    kill_peer_processes()
+    print("Peer nodes stopped.")
@@ -1,4 +1,5 @@
 import asyncio
+import os
 import random
 import logging
 import time
@@ -6,53 +7,117 @@ import subprocess
 import signal
 import platform
 import sys
-from config import NODE_ADDRESSES
-from dht import create_topic, delete_topic, query_topic, forward_request
+import httpx
+from config import NODE_ADDRESSES, NODE_IDS, NUM_NODES, BASE_PORT
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING)  # One line per request drowns out the churn log
 
-async def simulate_churn(num_rounds=10):
-    """
-    Simulate node joins and leaves and check data availability.
+NUM_TOPICS = 200  # Topics created before churn starts
+MESSAGES_PER_TOPIC = 50  # Messages published to each topic before churn starts
+MESSAGE = "Hello, Distributed World!"
+NUM_WORKERS = 8  # Background clients publishing and pulling during churn
+SPARE_NODES = NODE_IDS[-2:]  # Started outside the cluster, so they have something to join
+HELD_NODE = NODE_IDS[2]  # Member that rejects the failed join's prepare
+# Churn schedule: (operation, node); every node process keeps running and serving as an ingress.
+# "fail_join" is a join whose prepare fails on HELD_NODE, so the change is aborted everywhere
+CHURN_SCHEDULE = [("fail_join", SPARE_NODES[0]), ("join", SPARE_NODES[0]), ("join", SPARE_NODES[1]),
+                  ("leave", NODE_IDS[0]), ("leave", NODE_IDS[1]), ("join", NODE_IDS[0]), ("join", NODE_IDS[1])]
+
+TOPICS = [f"churn_test_{i}" for i in range(NUM_TOPICS)]
+
+async def preload(client):
+    """Create the topics and fill them through /publish_batch; returns acknowledged messages per topic."""
+    peer_urls = list(NODE_ADDRESSES.values())
+    for topic in TOPICS:
+        await client.post(f"{random.choice(peer_urls)}/create_topic", json={"topic": topic})
+    items = [{"topic": topic, "message": MESSAGE} for topic in TOPICS for _ in range(MESSAGES_PER_TOPIC)]
+    for start in range(0, len(items), 500):
+        await client.post(f"{random.choice(peer_urls)}/publish_batch", json={"items": items[start:start + 500]})
+    return {topic: MESSAGES_PER_TOPIC for topic in TOPICS}
+
+async def background_load(client, acknowledged, window, stop):
+    """Publish and pull random topics until stopped, counting outcomes per churn window."""
+    peer_urls = list(NODE_ADDRESSES.values())
+
+    async def worker():
+        while not stop.is_set():
+            topic = random.choice(TOPICS)
+            url = random.choice(peer_urls)
+            try:
+                if random.random() < 0.5:
+                    response = (await client.post(f"{url}/publish_message", json={"topic": topic, "message": MESSAGE})).json()
+                    if response.get("status") == "Success":
+                        acknowledged[topic] += 1
+                else:
+                    response = (await client.post(f"{url}/pull_messages", json={"topic": topic, "limit": 1})).json()
+                ok = response.get("status") == "Success"
+            except (httpx.HTTPError, ValueError):
+                ok = False
+            window["requests"] += 1
+            window["errors"] += 0 if ok else 1
+
+    await asyncio.gather(*(worker() for _ in range(NUM_WORKERS)))
+
+async def failed_join(client, node_id):
+    """Join `node_id` while HELD_NODE has another change pending, then release HELD_NODE.
+
+    HELD_NODE rejects the join's prepare after the other nodes have handed topics to
+    `node_id`, so the join must hand them back and leave no node with a pending change.
     """
-    results = {"data_available": 0, "data_unavailable": 0}
-    topic_name = "churn_test_topic"
-
-    # Step 1: Select a random node to create the topic
-    creator_node_id = random.choice(list(NODE_ADDRESSES.keys()))
-    logging.info(f"Creating topic '{topic_name}' at node {creator_node_id}")
-    create_response = await forward_request(creator_node_id, "create_topic", {"topic": topic_name})
-
-    if create_response["status"] != "Success":
-        logging.error("Failed to create topic on the selected node.")
-        return results
-
-    # Step 2: Simulate churn
-    for round_num in range(1, num_rounds + 1):
-        # Randomly select a node to "join" or "leave" the network
-        node_id = random.choice(list(NODE_ADDRESSES.keys()))
-        operation = random.choice(["join", "leave"])
-
-        if operation == "join":
-            logging.info(f"Simulating node {node_id} joining the network (no-op for existing node).")
-            # Normally, you'd add new nodes to the DHT, but we'll skip as this is a simulation
-        else:
-            logging.info(f"Simulating node {node_id} leaving the network (no-op for existing node).")
-            # Normally, you'd remove nodes from the DHT, but we'll skip as this is a simulation
-
-        # Query the topic after each join/leave to test availability
-        query_response = await forward_request(node_id, "query_topic", {"topic": topic_name})
-
-        # Check if data was available
-        if query_response["status"] == "Success":
-            results["data_available"] += 1
-            logging.info(f"Data for topic '{topic_name}' found by node {node_id} after churn.")
-        else:
-            results["data_unavailable"] += 1
-            logging.warning(f"Data for topic '{topic_name}' unavailable to node {node_id} after churn.")
-
-    return results
+    view = (await client.get(f"{NODE_ADDRESSES[HELD_NODE]}/membership")).json()
+    held = {"epoch": view["epoch"] + 1, "members": view["members"]}  # Moves no topics
+    await client.post(f"{NODE_ADDRESSES[HELD_NODE]}/membership/prepare", json=held)
+    start_time = time.perf_counter()
+    response = (await client.post(f"{NODE_ADDRESSES[node_id]}/join", json={}, timeout=600)).json()
+    seconds = time.perf_counter() - start_time
+    await client.post(f"{NODE_ADDRESSES[HELD_NODE]}/membership/abort", json={**held, "stage": "restore"})
+    if response.get("status") == "Success":
+        logging.error(f"Join of {node_id} succeeded although {HELD_NODE} rejected it")
+    pending = [node for node in NODE_ADDRESSES
+               if (await client.get(f"{NODE_ADDRESSES[node]}/membership")).json()["pending"] is not None]
+    if pending:
+        logging.error(f"Nodes still pending after the aborted join: {pending}")
+    return {"status": "Success", "handoff_seconds": seconds, "topics_moved": response.get("topics_returned", 0)}
+
+async def simulate_churn():
+    """Join and drain nodes under load; measure handoff time, bytes moved and request errors."""
+    results = []
+    async with httpx.AsyncClient(timeout=60) as client:
+        acknowledged = await preload(client)
+        window = {"requests": 0, "errors": 0}
+        stop = asyncio.Event()
+        load = asyncio.create_task(background_load(client, acknowledged, window, stop))
+
+        for operation, node_id in CHURN_SCHEDULE:
+            window["requests"] = window["errors"] = 0
+            logging.info(f"Node {node_id} {operation}s the cluster")
+            if operation == "fail_join":
+                response = await failed_join(client, node_id)
+            else:
+                response = (await client.post(f"{NODE_ADDRESSES[node_id]}/{operation}", json={}, timeout=600)).json()
+            if response.get("status") != "Success":
+                logging.error(f"{operation} of {node_id} failed: {response}")
+            results.append({
+                "operation": f"{operation} {node_id}",
+                "seconds": response.get("handoff_seconds", 0.0),
+                "topics": response.get("topics_moved", 0),
+                "bytes": response.get("bytes_moved", 0),
+                "requests": window["requests"],
+                "errors": window["errors"],
+            })
+
+        stop.set()
+        await load
+
+        # Every acknowledged publish must still be readable from the topic's current owner
+        lost = 0
+        for topic in TOPICS:
+            response = (await client.post(f"{NODE_ADDRESSES[NODE_IDS[0]]}/pull_messages",
+                                          json={"topic": topic, "limit": 1})).json()
+            lost += max(acknowledged[topic] - response.get("high_watermark", 0), 0)
+    return results, lost
 
 # Signal handling for clean shutdown
 def signal_handler(sig, frame):
@@ -63,23 +128,31 @@ def signal_handler(sig, frame):
 def kill_peer_processes():
     current_os = platform.system()
     if current_os == "Linux":
-        subprocess.run("lsof -t -i :5000-5007 | xargs kill", shell=True)
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
     elif current_os == "Windows":
-        for port in range(5000, 5008):
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
             subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
     else:
         print("Unsupported OS for killing processes.")
 
 async def main():
     # Run the network churn test
-    results = await simulate_churn(num_rounds=10)
-    print(f"Network Churn Test Results: {results}")
+    results, lost = await simulate_churn()
+    print(f"Network churn with {NUM_TOPICS} topics x {MESSAGES_PER_TOPIC} messages and {NUM_WORKERS} clients:")
+    for result in results:
+        error_rate = result["errors"] / result["requests"] if result["requests"] else 0.0
+        print(f"{result['operation']:>13}: handoff {result['seconds']:6.2f} s, {result['topics']:4d} topics, "
+              f"{result['bytes'] / 1024:8.1f} KiB moved, {result['requests']:5d} requests, "
+              f"error rate {error_rate:.2%}")
+    print(f"Acknowledged messages lost: {lost}")
 
 # Run the benchmark
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     print("Starting peer nodes...")
-    subprocess.Popen(["bash", "run.sh"])  # Start peer nodes in the background
+    # The spare nodes start outside the cluster and join during the experiment
+    env = dict(os.environ, DHT_MEMBERS=",".join(node_id for node_id in NODE_IDS if node_id not in SPARE_NODES))
+    subprocess.Popen(["bash", "run.sh"], env=env)  # Start peer nodes in the background
     time.sleep(5)  # Wait for nodes to initialize
 
     try:
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a seeded workload against an in-process simulated cluster.")
+    parser.add_argument("--dimensions", type=int, default=10, help="hypercube dimensions (2^d simulated nodes)")
+    parser.add_argument("--topics", type=int, default=1000, help="topics created before the workload")
+    parser.add_argument("--requests", type=int, default=5000, help="requests in the workload")
+    parser.add_argument("--concurrency", type=int, default=64, help="most requests outstanding at once")
+    parser.add_argument("--zipf", type=float, default=0.99, help="Zipf exponent of topic popularity (0 = uniform)")
+    parser.add_argument("--mix", default="publish_message:0.5,pull_messages:0.4,query_topic:0.05,subscribe:0.05",
+                        help="operation ratios")
+    parser.add_argument("--seed", type=int, default=1, help="random seed; the same seed routes the same way")
+    return parser.parse_args()
+
+# The cube size is read when config is imported, so it comes off the command line first
+args = parse_args()
+os.environ["DHT_DIMENSIONS"] = str(args.dimensions)
+
+from config import NODE_ADDRESSES, NODE_IDS, ROUTING_MODE, parse_weighted_list  # noqa: E402
+from simulator import SimulatedCluster  # noqa: E402
+from test_script_benchmark import TopicPicker, PERCENTILES, percentile, request_payload  # noqa: E402
+
+def plan_workload(args):
+    """The whole request sequence, drawn up front: (operation, entry node, payload)."""
+    rng = random.Random(args.seed)
+    topics = [f"sim_topic_{index}" for index in range(args.topics)]
+    picker = TopicPicker(topics, args.zipf)
+    operations, weights = zip(*parse_weighted_list(args.mix).items())
+    setup = [("create_topic", rng.choice(NODE_IDS), {"topic": topic}) for topic in topics]
+    workload = []
+    for _ in range(args.requests):
+        operation = rng.choices(operations, weights)[0]
+        workload.append((operation, rng.choice(NODE_IDS), request_payload(operation, picker.pick(rng))))
+    return setup, workload
+
+async def run_requests(client, requests, concurrency):
+    """Send the requests with at most `concurrency` outstanding; returns (result, seconds) in request order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(operation, node_id, payload):
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await client.post(f"{NODE_ADDRESSES[node_id]}/{operation}", json=payload)
+            return response.json(), time.perf_counter() - start_time
+
+    return await asyncio.gather(*(send(*request) for request in requests))
+
+def report(cluster, workload, results, seconds):
+    print(f"Workload: {len(workload)} requests in {seconds:.2f} s ({len(workload) / seconds:.0f} req/s on one loop)")
+    by_operation = {}
+    for (operation, _, _), (result, latency) in zip(workload, results):
+        entry = by_operation.setdefault(operation, {"latencies": [], "hops": 0, "errors": 0})
+        entry["latencies"].append(latency)
+        entry["hops"] += result.get("hops", 0)
+        entry["errors"] += result.get("status") != "Success"
+    for operation, entry in by_operation.items():
+        latencies = sorted(entry["latencies"])
+        print(f"  {operation:>16}: {len(latencies):6d} requests, {entry['errors']} errors, "
+              f"{entry['hops'] / len(latencies):.2f} hops on average, "
+              + ", ".join(f"{name} {percentile(latencies, fraction) * 1000:.2f} ms" for name, fraction in PERCENTILES[:2]))
+
+    # Requests each node served itself, from the per-node metrics
+    served = sorted(sum(sum(metrics.local.counts) for metrics in node.metrics.endpoints) if node.metrics else 0
+                    for node in cluster.nodes.values())
+    mean = sum(served) / len(served)
+    print(f"Requests served per node: min {served[0]}, median {served[len(served) // 2]}, max {served[-1]} "
+          f"(max / mean {served[-1] / mean:.2f})")
+
+    # Forwarded reads that rode along on an identical read already in flight (DHT_READ_COALESCING)
+    forwarded = coalesced = 0
+    for node in cluster.nodes.values():
+        for counts in node.coalesce_counts.values():
+            forwarded += counts["forwarded"]
+            coalesced += counts["coalesced"]
+    if forwarded:
+        print(f"Coalesced reads: {coalesced} of {forwarded + coalesced} forwarded reads shared a forward in flight")
+
+    # query_topic answers served from ingress topic caches (DHT_TOPIC_CACHE_SIZE)
+    hits = sum(node.topic_cache_counts["hits"] + node.topic_cache_counts["negative_hits"] for node in cluster.nodes.values())
+    misses = sum(node.topic_cache_counts["misses"] for node in cluster.nodes.values())
+    if hits + misses:
+        print(f"Topic cache: {hits} hits, {misses} misses (hit ratio {hits / (hits + misses):.2f})")
+
+    # Routing decisions are deterministic for a seed, so this digest only changes when routing does
+    digest = hashlib.sha256(repr([(result.get("status"), result.get("hops", 0)) for result, _ in results]).encode())
+    print(f"Routing digest (status and hops of every request): {digest.hexdigest()[:16]}")
+
+async def main(args):
+    start_time = time.perf_counter()
+    cluster = SimulatedCluster()
+    await cluster.start()
+    print(f"Started {len(cluster.nodes)} simulated nodes ({ROUTING_MODE} routing) "
+          f"in {time.perf_counter() - start_time:.2f} s")
+    setup, workload = plan_workload(args)
+    try:
+        async with cluster.client(timeout=None) as client:
+            await run_requests(client, setup, args.concurrency)
+            for node in cluster.nodes.values():
+                node.metrics = None  # Count the workload only
+            start_time = time.perf_counter()
+            results = await run_requests(client, workload, args.concurrency)
+            report(cluster, workload, results, time.perf_counter() - start_time)
+    finally:
+        await cluster.stop()
+
+# Run the experiment
+if __name__ == "__main__":
+    asyncio.run(main(args))
@@ -0,0 +1,48 @@
+import asyncio
+import tempfile
+import time
+from storage import MemoryStorage, SegmentLogStorage
+
+NUM_MESSAGES = 100000  # Messages published per backend
+NUM_TOPICS = 10  # Topics the messages are spread over
+CONCURRENCY = 256  # Publishes in flight at once, so group commit can batch them
+PULL_LIMIT = 1000  # Messages per pull when reading the topics back
+MESSAGE = "Hello, Distributed World!"
+
+async def benchmark_backend(storage):
+    topics = [f"storage_test_{i}" for i in range(NUM_TOPICS)]
+
+    async def publish_worker(worker_id):
+        for i in range(worker_id, NUM_MESSAGES, CONCURRENCY):
+            await storage.append(topics[i % NUM_TOPICS], MESSAGE)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(publish_worker(worker_id) for worker_id in range(CONCURRENCY)))
+    publish_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    pulled = 0
+    for topic in topics:
+        offset = 0
+        while True:
+            messages, high_watermark = storage.read(topic, offset, PULL_LIMIT)
+            if not messages:
+                break
+            offset += len(messages)
+            pulled += len(messages)
+    pull_time = time.perf_counter() - start_time
+
+    await storage.close()
+    return {"publish_rate": NUM_MESSAGES / publish_time, "pull_rate": pulled / pull_time}
+
+async def main():
+    results = {"memory": await benchmark_backend(MemoryStorage())}
+    with tempfile.TemporaryDirectory() as data_dir:
+        results["disk"] = await benchmark_backend(SegmentLogStorage(data_dir))
+
+    print(f"Storage backends ({NUM_MESSAGES} messages over {NUM_TOPICS} topics, {CONCURRENCY} concurrent publishers):")
+    for backend, result in results.items():
+        print(f"{backend:>7}: publish {result['publish_rate']:.0f} msgs/s, pull {result['pull_rate']:.0f} msgs/s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from storage import STORAGE_BACKENDS, RetentionPolicy
+
+LAYOUTS = ["memory", "arena"]  # A list of str per segment, and encoded bytes in one arena per segment
+PULL_SIZE = 1000  # Messages per timed pull
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory used by the memory and arena storage layouts.")
+    parser.add_argument("--messages", type=int, default=10_000_000, help="messages stored per layout")
+    parser.add_argument("--topics", type=int, default=1000, help="topics the messages are spread over")
+    parser.add_argument("--layout", choices=LAYOUTS, help="measure one layout in this process (used internally)")
+    return parser.parse_args()
+
+def resident_bytes():
+    """This process's resident set size, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def segment_bytes(segment):
+    """Python object sizes of a segment, its arrays and buffers, and every message str it holds."""
+    total = sys.getsizeof(segment)
+    for name in segment.__slots__:
+        value = getattr(segment, name)
+        total += sys.getsizeof(value)
+        if isinstance(value, list):
+            total += sum(sys.getsizeof(message) for message in value if message is not None)
+    return total
+
+async def measure_layout(layout, num_messages, num_topics):
+    storage = STORAGE_BACKENDS[layout](0)  # No memory budget
+    topics = [f"memory_topic_{index}" for index in range(num_topics)]
+    for topic in topics:
+        storage.create(topic, RetentionPolicy(0, 0, 0))  # Keep everything
+    rss_before = resident_bytes()
+    start_time = time.perf_counter()
+    for index in range(num_messages):
+        await storage.append(topics[index % num_topics], f"msg-{index:08d}")
+    append_seconds = time.perf_counter() - start_time
+    rss_after = resident_bytes()
+    layout_bytes = sum(segment_bytes(segment) for state in storage._topics.values() for segment in state.segments)
+
+    # A pull response as the node builds it: FastAPI encoding a message list, or read_encoded's bytes
+    pulls = 200
+    start_time = time.perf_counter()
+    for index in range(pulls):
+        topic = topics[index % num_topics]
+        if layout == "arena":
+            body, count, _, _ = storage.read_encoded(topic, index, PULL_SIZE)
+            bytes(body)
+        else:
+            messages, _, _ = storage.read(topic, index, PULL_SIZE)
+            json.dumps({"messages": messages}).encode()
+    pull_seconds = (time.perf_counter() - start_time) / pulls
+    return {
+        "payload_bytes": storage.total_bytes,
+        "layout_bytes": layout_bytes,
+        "rss_bytes": rss_after - rss_before if rss_before is not None else None,
+        "append_us": append_seconds / num_messages * 1e6,
+        "pull_ms": pull_seconds * 1000,
+    }
+
+def run_layout(layout, args):
+    """Measure one layout in a fresh interpreter, so its resident memory is not mixed with the other's."""
+    output = subprocess.run([sys.executable, __file__, "--layout", layout, "--messages", str(args.messages),
+                             "--topics", str(args.topics)], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+# Run the experiment
+if __name__ == "__main__":
+    args = parse_args()
+    if args.layout:
+        print(json.dumps(asyncio.run(measure_layout(args.layout, args.messages, args.topics))))
+        sys.exit(0)
+    print(f"Storing {args.messages} small messages over {args.topics} topics per layout...")
+    results = {layout: run_layout(layout, args) for layout in LAYOUTS}
+    for layout, result in results.items():
+        rss = f"{result['rss_bytes'] / 1024 / 1024:.0f} MiB resident" if result["rss_bytes"] is not None else "n/a"
+        print(f"{layout:>7}: {result['layout_bytes'] / 1024 / 1024:.0f} MiB in storage objects "
+              f"({result['layout_bytes'] / args.messages:.1f} bytes per message, "
+              f"{result['payload_bytes'] / args.messages:.0f} of them payload), {rss}, "
+              f"append {result['append_us']:.2f} us, {PULL_SIZE}-message pull {result['pull_ms']:.3f} ms")
+    saved = 1 - results["arena"]["layout_bytes"] / results["memory"]["layout_bytes"]
+    print(f"Arena layout uses {saved:.0%} less memory per message")
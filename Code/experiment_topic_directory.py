@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Size and false-positive rate of the gossiped topic directory.")
+    parser.add_argument("--dimensions", type=int, default=3, help="hypercube dimensions (2^d nodes)")
+    parser.add_argument("--topics", type=int, default=1_000_000, help="topics spread over the nodes")
+    parser.add_argument("--probes", type=int, default=1_000_000, help="lookups of topics that do not exist")
+    return parser.parse_args()
+
+# The cube size is read when config is imported, so it comes off the command line first
+args = parse_args()
+os.environ["DHT_DIMENSIONS"] = str(args.dimensions)
+
+from config import MEMBERS, DIRECTORY_FP_RATE  # noqa: E402
+from directory import build_filter  # noqa: E402
+from node import placement_for  # noqa: E402
+
+def main(args):
+    placement = placement_for(MEMBERS)
+    topics_by_node = {node_id: [] for node_id in MEMBERS}
+    for index in range(args.topics):
+        topic = f"directory_topic_{index}"
+        topics_by_node[placement.owner(topic)].append(topic)
+
+    # Each node builds the filter of the topics it holds, as at the start of its gossip rounds
+    start_time = time.perf_counter()
+    filters = {node_id: build_filter(topics) for node_id, topics in topics_by_node.items()}
+    build_seconds = time.perf_counter() - start_time
+    own_bytes = sorted(bloom.nbytes() for bloom in filters.values())
+    directory_bytes = sum(own_bytes)  # Every node holds every node's filter
+    set_bytes = sum(sys.getsizeof(topic) for topics in topics_by_node.values() for topic in topics)
+    print(f"{args.topics} topics on {len(filters)} nodes, filters built in {build_seconds:.2f} s "
+          f"({build_seconds / len(filters):.2f} s per node)")
+    print(f"Own filter per node: min {own_bytes[0] / 1024:.1f} KiB, max {own_bytes[-1] / 1024:.1f} KiB "
+          f"({filters[MEMBERS[0]].hashes} hashes, sized for twice the node's topics)")
+    print(f"Directory per node (all {len(filters)} filters): {directory_bytes / 1024 / 1024:.2f} MiB, "
+          f"{directory_bytes * 8 / args.topics:.1f} bits per topic "
+          f"(the topic names alone take {set_bytes / 1024 / 1024:.1f} MiB)")
+
+    # Lookups of topics that do not exist, each checked against its owner's filter as query_topic does
+    false_positives = 0
+    start_time = time.perf_counter()
+    for index in range(args.probes):
+        topic = f"missing_topic_{index}"
+        false_positives += topic in filters[placement.owner(topic)]
+    lookup_seconds = time.perf_counter() - start_time
+    print(f"False-positive rate over {args.probes} missing topics: {false_positives / args.probes:.4%} "
+          f"(target {DIRECTORY_FP_RATE:.2%} at full capacity), "
+          f"{lookup_seconds / args.probes * 1e6:.1f} us per lookup")
+    print(f"Answered without a hop: {args.probes - false_positives} of {args.probes} lookups")
+
+# Run the experiment
+if __name__ == "__main__":
+    main(args)
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+import httpx
+from config import NODE_IDS, NODE_ADDRESSES, HEARTBEAT_INTERVAL_MS, SUSPECT_AFTER_MS, DOWN_AFTER_MS
+from client_pool import get_client
+from node import current_node
+from utils import get_neighbors
+
+UP, SUSPECT, DOWN = "up", "suspect", "down"
+
+# Gossip-style failure detection: every node keeps a heartbeat for every node,
+# (incarnation, counter) plus the local time it last went up. Each round a node bumps
+# its own counter and exchanges the whole table with its hypercube neighbors, keeping
+# the larger heartbeat per node, so news crosses the cube in at most d rounds.
+# A restarted node gets a new incarnation, which beats any counter it had before.
+# The table is node.heartbeats; until the rounds start it is empty and every node counts as up.
+
+def status(node_id):
+    """"up", "suspect" or "down" depending on how long the node's heartbeat has been silent."""
+    node = current_node()
+    if node_id == node.peer_id:
+        return UP
+    entry = node.heartbeats.get(node_id)
+    if entry is None:
+        return UP
+    silence = (time.monotonic() - entry[1]) * 1000
+    return UP if silence < SUSPECT_AFTER_MS else SUSPECT if silence < DOWN_AFTER_MS else DOWN
+
+def is_down(node_id):
+    return status(node_id) == DOWN
+
+def mark_down(node_id):
+    """A connection was refused: treat the node as down until a newer heartbeat arrives."""
+    entry = current_node().heartbeats.get(node_id)
+    if entry is not None and status(node_id) != DOWN:
+        logging.warning(f"Marking node {node_id} down after a failed connection")
+        entry[1] = float("-inf")
+
+def heartbeat_view():
+    return {node_id: entry[0] for node_id, entry in current_node().heartbeats.items()}
+
+def merge_view(view):
+    now = time.monotonic()
+    heartbeats = current_node().heartbeats
+    for node_id, heartbeat in view.items():
+        entry = heartbeats.get(node_id)
+        heartbeat = tuple(heartbeat)
+        if entry is not None and heartbeat > entry[0]:
+            if status(node_id) == DOWN:
+                logging.info(f"Node {node_id} is back up")
+            entry[0] = heartbeat
+            entry[1] = now
+
+async def _exchange(node_id, view):
+    try:
+        response = await get_client(NODE_ADDRESSES[node_id]).post(
+            "/heartbeat", json={"source": current_node().peer_id, "view": view}, timeout=HEARTBEAT_INTERVAL_MS / 1000)
+        response.raise_for_status()
+        merge_view(response.json()["view"])
+    except httpx.HTTPError:
+        pass  # Shows up as a silent heartbeat
+
+async def _heartbeat_loop(node):
+    counter = 0
+    while True:
+        counter += 1
+        node.heartbeats[node.peer_id] = [(node.incarnation, counter), time.monotonic()]
+        view = heartbeat_view()
+        await asyncio.gather(*(_exchange(node_id, view) for node_id in get_neighbors(node.peer_id)))
+        await asyncio.sleep(HEARTBEAT_INTERVAL_MS / 1000)
+
+def start_failure_detector():
+    """Start the heartbeat rounds. Called once at app startup; DHT_HEARTBEAT_INTERVAL_MS=0 turns them off."""
+    if HEARTBEAT_INTERVAL_MS <= 0:
+        return
+    node = current_node()
+    now = time.monotonic()
+    node.heartbeats = {node_id: [(0.0, 0), now] for node_id in NODE_IDS}
+    node.heartbeat_task = asyncio.create_task(_heartbeat_loop(node))
+
+async def stop_failure_detector():
+    node = current_node()
+    if node.heartbeat_task is not None:
+        node.heartbeat_task.cancel()
+        await asyncio.gather(node.heartbeat_task, return_exceptions=True)
+        node.heartbeat_task = None
+
+def peer_status():
+    node = current_node()
+    now = time.monotonic()
+    return {node_id: {"status": status(node_id), "heartbeat": entry[0][1],
+                      "silence_ms": round((now - entry[1]) * 1000) if entry[1] > float("-inf") else None}
+            for node_id, entry in node.heartbeats.items() if node_id != node.peer_id}
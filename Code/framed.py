@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import struct
+from config import FRAMED_ADDRESSES, FRAMED_MAX_FRAME_BYTES, FORWARD_CONNECT_TIMEOUT
+from node import current_node, set_current_node
+from tracing import start_span, finish_span
+
+# Internal transport for forwarded requests. Every frame is a fixed header, then a body:
+#   body length (4 bytes) | correlation ID (4 bytes) | kind (1 byte) | body
+# A request body is the JSON line [endpoint, headers], a newline, and the request's
+# JSON body as the client sent it; a response body is the JSON response. Bodies are
+# passed through as bytes, so forwarding nodes never decode them. The response to a
+# request carries the same correlation ID, so many requests share one connection and
+# may complete out of order.
+HEADER = struct.Struct(">IIB")
+REQUEST, RESPONSE, FAILURE = 0, 1, 2
+
+class FramedConnectError(Exception):
+    """The peer could not be reached, so nothing was sent."""
+
+class FramedRequestError(Exception):
+    """The request was sent but no result came back (timeout, lost connection, handler failure)."""
+
+def encode_frame(correlation_id, kind, body):
+    """`body` is JSON-encoded compactly, unless it is bytes that already hold JSON."""
+    payload = body if isinstance(body, (bytes, bytearray)) else json.dumps(body, separators=(",", ":")).encode()
+    return HEADER.pack(len(payload), correlation_id, kind) + payload
+
+def encode_request(correlation_id, endpoint, headers, body):
+    head = json.dumps([endpoint, headers], separators=(",", ":")).encode()  # No raw newline in compact JSON
+    return HEADER.pack(len(head) + 1 + len(body), correlation_id, REQUEST) + head + b"\n" + body
+
+async def read_frame(reader):
+    """Returns (correlation ID, kind, body bytes); raises IncompleteReadError once the peer hangs up."""
+    length, correlation_id, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > FRAMED_MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds DHT_FRAMED_MAX_FRAME_BYTES")
+    return correlation_id, kind, await reader.readexactly(length)
+
+class FramedRequest:
+    """A request read off a frame, with the parts of Starlette's Request the endpoints use."""
+
+    __slots__ = ("headers", "_body")
+
+    def __init__(self, headers, body):
+        self.headers = {name.lower(): value for name, value in headers.items()}
+        self._body = body
+
+    async def body(self):
+        return self._body
+
+class FramedConnection:
+    """One persistent connection to a peer, shared by every request this node sends it.
+
+    Requests are written as they come and matched to their responses by correlation
+    ID. A lost connection fails the requests waiting on it and is reopened by the
+    next request.
+    """
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.writer = None
+        self.reader_task = None  # Reads the responses of the open connection
+        self.pending = {}  # correlation ID -> future of the response body
+        self.next_id = 0
+        self.lock = asyncio.Lock()  # One connection attempt at a time
+
+    async def connect(self):
+        host, port = FRAMED_ADDRESSES[self.node_id]
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), FORWARD_CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise FramedConnectError(f"{host}:{port}: {e!r}") from e
+        self.writer = writer
+        task = self.reader_task = asyncio.create_task(self.read_responses(reader, writer))
+        task.add_done_callback(self._reader_done)
+
+    def _reader_done(self, task):
+        if self.reader_task is task:
+            self.reader_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Framed connection to {self.node_id} failed: {task.exception()!r}")
+
+    async def read_responses(self, reader, writer):
+        error = "connection closed"
+        try:
+            while True:
+                correlation_id, kind, body = await read_frame(reader)
+                future = self.pending.pop(correlation_id, None)
+                if future is not None and not future.done():
+                    if kind == FAILURE:
+                        future.set_exception(FramedRequestError(json.loads(body)))
+                    else:
+                        future.set_result(body)
+        except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+            error = repr(e)
+        finally:
+            # Also on cancellation (close()) or an unexpected error, which the done-callback logs
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            pending, self.pending = self.pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(FramedRequestError(f"Connection to {self.node_id} lost: {error}"))
+
+    async def close(self):
+        """Close the connection and wait for its reader to finish."""
+        task = self.reader_task
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        elif self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, endpoint, headers, body, timeout):
+        if self.writer is None:
+            async with self.lock:
+                if self.writer is None:
+                    await self.connect()
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        correlation_id = self.next_id
+        future = self.pending[correlation_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(encode_request(correlation_id, endpoint, headers, body))
+        try:
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise FramedRequestError(f"Request to {self.node_id} failed: {e!r}") from e
+        finally:
+            self.pending.pop(correlation_id, None)
+
+async def framed_request(node_id, endpoint, headers, body, timeout):
+    """Send a forwarded request (JSON body bytes) to a peer over its framed connection.
+
+    Returns the response body as bytes.
+    """
+    connections = current_node().framed_connections
+    connection = connections.get(node_id)
+    if connection is None:
+        connection = connections[node_id] = FramedConnection(node_id)
+    return await connection.request(endpoint, headers, body, timeout)
+
+async def _handle_request(handlers, writer, correlation_id, payload):
+    head, _, body = payload.partition(b"\n")
+    endpoint, headers = json.loads(head)
+    request = FramedRequest(headers, body)
+    depth = request.headers.get("x-hop-count", "0")
+    span = start_span(request.headers.get("x-trace-id"), endpoint, depth=int(depth) if depth.isdigit() else 0)
+    try:
+        frame = encode_frame(correlation_id, RESPONSE, await handlers[endpoint](request))
+    except Exception as e:
+        logging.error(f"Framed {endpoint} request failed: {e!r}")
+        frame = encode_frame(correlation_id, FAILURE, f"{endpoint} failed: {e!r}")
+    finish_span(span)
+    if not writer.is_closing():
+        writer.write(frame)
+
+async def start_framed_server(handlers):
+    """Accept framed requests for the current node; `handlers` maps endpoint -> async fn(FramedRequest).
+
+    Called at app startup. Each request runs in its own task, so a slow one (e.g. a
+    long poll) does not hold up the others on the connection.
+    """
+    node = current_node()
+
+    async def serve_connection(reader, writer):
+        set_current_node(node)
+        tasks = set()  # Keep the request tasks referenced until they finish
+        try:
+            while True:
+                correlation_id, _, payload = await read_frame(reader)
+                task = asyncio.create_task(_handle_request(handlers, writer, correlation_id, payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    node.framed_server = await asyncio.start_server(serve_connection, "0.0.0.0", FRAMED_ADDRESSES[node.peer_id][1])
+
+async def stop_framed():
+    """Close the framed listener and this node's connections to its peers."""
+    node = current_node()
+    if node.framed_server is not None:
+        node.framed_server.close()
+        node.framed_server = None
+    connections, node.framed_connections = node.framed_connections, {}
+    await asyncio.gather(*(connection.close() for connection in connections.values()))
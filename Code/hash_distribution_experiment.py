@@ -2,14 +2,19 @@ import hashlib
 import random
 import string
 import numpy as np
+from placement import ModuloPlacement, ConsistentHashRing, moved_fraction
 
 
 def hash_topic(topic, num_nodes):
     return int(hashlib.sha256(topic.encode()).hexdigest(), 16) % num_nodes
 
 
+def generate_topics(num_topics):
+    return [''.join(random.choices(string.ascii_letters + string.digits, k=10)) for _ in range(num_topics)]
+
+
 def experiment_hash_distribution(num_topics=10000, num_nodes=8):
-    topics = [''.join(random.choices(string.ascii_letters + string.digits, k=10)) for _ in range(num_topics)]
+    topics = generate_topics(num_topics)
     node_distribution = {node_id: 0 for node_id in range(num_nodes)}
 
     # Hash each topic and assign it to a node
@@ -27,4 +32,36 @@ def experiment_hash_distribution(num_topics=10000, num_nodes=8):
     print(f"Standard deviation in topic distribution: {std_dev:.2f}")
 
 
+def load_imbalance(placement, topics):
+    """Most loaded node's topic count divided by the mean (1.0 is perfectly balanced)."""
+    counts = {node_id: 0 for node_id in placement.node_ids}
+    for topic in topics:
+        counts[placement.owner(topic)] += 1
+    return max(counts.values()) / np.mean(list(counts.values()))
+
+
+def experiment_membership_change(num_topics=100000, num_nodes=8, virtual_nodes=128):
+    """Add one node and compare how many keys move under modulo and ring placement."""
+    topics = generate_topics(num_topics)
+    old_nodes = [f"node{i}" for i in range(num_nodes)]
+    new_nodes = old_nodes + [f"node{num_nodes}"]
+
+    placements = {
+        "modulo": (ModuloPlacement(old_nodes), ModuloPlacement(new_nodes)),
+        "ring": (ConsistentHashRing(old_nodes, virtual_nodes, weights={}),
+                 ConsistentHashRing(new_nodes, virtual_nodes, weights={})),
+    }
+    print(f"Adding one node to {num_nodes} ({num_topics} topics, ideal fraction moved {1 / (num_nodes + 1):.3f}):")
+    for name, (before, after) in placements.items():
+        moved = sum(1 for topic in topics if before.owner(topic) != after.owner(topic))
+        print(f"{name:>7}: fraction of keys moved {moved / num_topics:.3f}, "
+              f"load imbalance (max/mean) before {load_imbalance(before, topics):.3f}, "
+              f"after {load_imbalance(after, topics):.3f}")
+
+    before, after = placements["ring"]
+    moved_ranges = before.moved_ranges(after)
+    print(f"   ring: {len(moved_ranges)} key ranges moved, covering {moved_fraction(moved_ranges):.3f} of the ring")
+
+
 experiment_hash_distribution()
+experiment_membership_change()
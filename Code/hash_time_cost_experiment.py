@@ -2,6 +2,9 @@ import time
 import hashlib
 import random
 import string
+from config import build_node_ids
+from placement import ModuloPlacement, ConsistentHashRing
+from resolver import OwnerResolver
 
 def hash_topic(topic, num_nodes):
     return int(hashlib.sha256(topic.encode()).hexdigest(), 16) % num_nodes
@@ -19,4 +22,40 @@ def experiment_hash_time_cost(num_topics=10000, num_nodes=8):
     average_time = total_time / num_topics
     print(f"Average time per hash computation: {average_time:.10f} seconds")
 
+def time_per_topic(resolve, topics):
+    """Average seconds per topic, timing the whole loop so timer overhead does not dominate."""
+    start_time = time.perf_counter()
+    for topic in topics:
+        resolve(topic)
+    return (time.perf_counter() - start_time) / len(topics)
+
+def experiment_owner_resolution(num_topics=1000000, dimensions=3, distinct_topics=10000):
+    """Compare the old sha256/hex/format owner path with the new resolver at 1M lookups."""
+    num_nodes = 2 ** dimensions
+    node_ids = build_node_ids(dimensions)
+    # Requests repeat topics, so draw 1M lookups from a smaller set of distinct topics
+    distinct = [''.join(random.choices(string.ascii_letters + string.digits, k=10)) for _ in range(distinct_topics)]
+    topics = random.choices(distinct, k=num_topics)
+
+    def old_path(topic):
+        return format(hash_topic(topic, num_nodes), f'0{dimensions}b')
+
+    results = {
+        "old sha256 + format": time_per_topic(old_path, topics),
+        "modulo, blake2b uncached": time_per_topic(ModuloPlacement(node_ids).owner, topics),
+        "ring, blake2b uncached": time_per_topic(ConsistentHashRing(node_ids).owner, topics),
+        "ring, LRU cached": time_per_topic(OwnerResolver(ConsistentHashRing(node_ids)).resolve, topics),
+    }
+
+    resolver = OwnerResolver(ConsistentHashRing(node_ids))
+    start_time = time.perf_counter()
+    resolver.resolve_many(topics)
+    results["ring, LRU cached batch"] = (time.perf_counter() - start_time) / num_topics
+
+    baseline = results["old sha256 + format"]
+    print(f"Owner resolution over {num_topics} lookups ({distinct_topics} distinct topics, {num_nodes} nodes):")
+    for name, seconds in results.items():
+        print(f"{name:>26}: {seconds * 1e9:8.1f} ns per topic ({baseline / seconds:.1f}x)")
+
 experiment_hash_time_cost()
+experiment_owner_resolution()
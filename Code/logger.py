@@ -1,19 +1,106 @@
+import atexit
 import logging
 import os
+import queue
+import random
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_FIELD_CHARS, LOG_SAMPLE_RATES
 
-def setup_logger(peer_id):
-    """Setup logger with a unique log file per node based on peer_id."""
-    log_dir = "../Out/Logs"
+# Records sampled out on the request path and records dropped because the writer fell behind
+_counters = {"sampled_out": 0, "dropped": 0}
+
+def log_fields(endpoint, **fields):
+    """`extra` for a structured record: the endpoint it came from plus key=value fields.
+
+    Fields are rendered by the background writer, capped at LOG_FIELD_CHARS each, so
+    passing a whole message list costs nothing on the request path.
+    """
+    return {"endpoint": endpoint, "fields": fields}
+
+def render_field(value, limit=LOG_FIELD_CHARS):
+    """repr() of a value cut at `limit` characters; lists stop rendering once the limit is hit."""
+    if isinstance(value, (list, tuple)):
+        parts = []
+        length = 2
+        for index, item in enumerate(value):
+            part = render_field(item, limit)
+            length += len(part) + 2
+            if length > limit:
+                parts.append(f"... {len(value) - index} more")
+                break
+            parts.append(part)
+        return "[" + ", ".join(parts) + "]"
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+class StructuredFormatter(logging.Formatter):
+    """The usual log line followed by the record's endpoint and fields as key=value pairs."""
+
+    def format(self, record):
+        line = super().format(record)
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id is not None:
+            line += f" trace_id={trace_id}"
+        endpoint = getattr(record, "endpoint", None)
+        if endpoint is not None:
+            line += f" endpoint={endpoint}"
+        for key, value in getattr(record, "fields", {}).items():
+            line += f" {key}={render_field(value)}"
+        return line
+
+class SamplingFilter(logging.Filter):
+    """Keep a record with the rate configured for its endpoint, else for its level, else always."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "endpoint", None), self.rates.get(record.levelname, 1.0))
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _counters["sampled_out"] += 1
+        return False
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread as they are, without formatting them first.
+
+    A full queue drops the record instead of blocking the event loop.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _counters["dropped"] += 1
+
+def log_stats():
+    return dict(_counters)
+
+def setup_logger(peer_id, log_dir="../Out/Logs"):
+    """Setup logger with a unique, rotating log file per node based on peer_id.
+
+    Handlers only enqueue records; a QueueListener thread formats and writes them.
+    """
     os.makedirs(log_dir, exist_ok=True)
 
     # Generate a unique log file name for each node
     log_filename = f"{log_dir}/node_{peer_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 
-    # Configure logging
-    logging.basicConfig(
-        filename=log_filename,
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-    )
+    file_handler = RotatingFileHandler(log_filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(StructuredFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)  # Flush what is still queued on exit
     return log_filename
@@ -1,12 +1,10 @@
-import asyncio
-import logging
-import os
 import sys
-from datetime import datetime
-from fastapi import FastAPI
 import uvicorn
-from api import topics, messages
 from logger import setup_logger
+from tracing import correlate_logs, setup_trace_export
+from config import NODE_ADDRESSES, HYPERCUBE_DIMENSIONS, KEEPALIVE_EXPIRY
+from node import process_node
+from app import app
 
 # Initialize peer settings
 if len(sys.argv) < 3:
@@ -15,20 +13,20 @@ if len(sys.argv) < 3:
 
 port = int(sys.argv[1])  # Port number for this peer node
 peer_id = sys.argv[2]  # Binary string ID of the peer node
+if peer_id not in NODE_ADDRESSES:
+    print(f"Peer ID must be a {HYPERCUBE_DIMENSIONS}-bit binary string (set DHT_DIMENSIONS to change the cube size)")
+    sys.exit(1)
 
 # Setup logger with peer_id
 log_path = setup_logger(peer_id)
+correlate_logs()  # Node log lines carry the trace ID of the request that wrote them
+setup_trace_export()  # Spans to DHT_TRACE_DIR, if set
 
-# Define the FastAPI app
-app = FastAPI()
-
-# Set peer_id in the FastAPI app for later use
-app.state.peer_id = peer_id
-
-# Include routers
-app.include_router(topics.router)
-app.include_router(messages.router)
+# Build this process's node (recovering topics from disk storage) before serving requests
+process_node(serve=True)
 
 # Run FastAPI app
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Keep idle connections open longer than peers keep them pooled, so a forwarding
+    # node never reuses a connection the server has just closed
+    uvicorn.run(app, host="0.0.0.0", port=port, timeout_keep_alive=int(KEEPALIVE_EXPIRY) + 5)
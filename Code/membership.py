@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import time
+import httpx
+from config import NODE_ADDRESSES, HANDOFF_BATCH_TOPICS, HANDOFF_TIMEOUT, FORWARD_CONNECT_TIMEOUT
+from client_pool import get_stream_client
+from dht import owned_topics, notify_pull_waiters, close_topic_streams
+from node import current_node, placement_for
+from replication import start_replication, stop_replication
+from storage import RetentionPolicy
+from topic_cache import invalidate_topic
+from directory import topic_added, topic_removed
+from utils import resolve_owner, replica_nodes, set_members
+
+# Membership changes run in two phases, driven by the joining or leaving node:
+#   prepare: every node streams the topics it owns but will not own under the new
+#            member list to their new owners; requests keep following the old placement,
+#            and a node that has handed a topic off forwards its requests to the new owner
+#   commit:  every node switches to the new placement
+# Each node tracks the epoch and the member list being prepared in node.membership.
+# A node keeps the storage of the topics it handed off until the change commits. If
+# a prepare fails, the coordinator aborts on every node, again in two phases:
+#   return:  every node streams the topics it received back to their previous owner
+#   restore: every node serves the topics it handed off again (from the copy it kept
+#            if they did not come back), drops the handoff overrides and the pending change
+
+def membership_view():
+    node = current_node()
+    return {"epoch": node.membership["epoch"], "members": sorted(node.members), "pending": node.membership["pending"]}
+
+def encode_line(record):
+    return json.dumps(record).encode() + b"\n"
+
+async def handoff_stream(node, topics, stats):
+    """NDJSON body moving a node's `topics` to a new owner: a header, the messages and an end record per topic.
+
+    Messages are read while writes continue; then the batch is fenced (writes wait)
+    and the messages published meanwhile are sent before the body ends. The body is
+    read by the HTTP client, so the node is passed in rather than looked up.
+    """
+    message_storage = node.message_storage
+    sent = {}
+    for topic in topics:
+        retention = message_storage.retention(topic)
+        _, start_offset, _ = message_storage.read(topic, 0, 0)
+        yield encode_line({"topic": topic, "data": node.local_dht.get(topic), "start_offset": start_offset,
+                           "retention": retention.to_dict() if retention is not None else None})
+        sent[topic] = start_offset
+        async for chunk in topic_records(message_storage, topic, sent, stats):
+            yield chunk
+    for topic in topics:
+        node.handoff_fences[topic] = asyncio.Event()
+    await message_storage.commit()  # Writes that got in before the fence must be readable below
+    for topic in topics:
+        async for chunk in topic_records(message_storage, topic, sent, stats):
+            yield chunk
+        yield encode_line({"topic": topic, "end": True, "high_watermark": sent[topic]})
+
+async def topic_records(message_storage, topic, sent, stats):
+    """Chunks of message records from sent[topic] up to the current high watermark."""
+    while True:
+        messages, start_offset, high_watermark = message_storage.read(topic, sent[topic], 1000)
+        chunk = b""
+        if start_offset > sent[topic]:
+            chunk += encode_line({"topic": topic, "reset": start_offset})  # Retention dropped the gap
+            sent[topic] = start_offset
+        offset = sent[topic]
+        chunk += b"".join(encode_line({"topic": topic, "offset": offset + index, "message": message})
+                          for index, message in enumerate(messages))
+        sent[topic] = offset + len(messages)
+        if chunk:
+            stats["messages"] += len(messages)
+            stats["bytes"] += len(chunk)
+            yield chunk
+        if sent[topic] >= high_watermark:
+            return
+        await asyncio.sleep(0)  # Let other requests run between chunks
+
+async def hand_off(topics, new_owner, stats, keep_copy=True):
+    """Stream topics to their new owner in batches, then let this node forward their requests.
+
+    With `keep_copy` the topics' storage stays here (see node.handed_off) in case the change aborts.
+    """
+    node = current_node()
+    client = get_stream_client(NODE_ADDRESSES[new_owner])
+    for start in range(0, len(topics), HANDOFF_BATCH_TOPICS):
+        batch = topics[start:start + HANDOFF_BATCH_TOPICS]
+        try:
+            response = await client.post("/handoff", content=handoff_stream(node, batch, stats),
+                                         headers={"Content-Type": "application/x-ndjson"},
+                                         timeout=httpx.Timeout(HANDOFF_TIMEOUT, connect=FORWARD_CONNECT_TIMEOUT))
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # Keep the topics here; writes held by the fence go on locally
+            logging.error(f"Handoff of {len(batch)} topics to {new_owner} failed: {e!r}")
+            for topic in batch:
+                fence = node.handoff_fences.pop(topic, None)
+                if fence is not None:
+                    fence.set()
+            stats["failed_topics"] += len(batch)
+            continue
+        stats["topics"] += len(batch)
+        for topic in batch:
+            node.resolver.override(topic, new_owner)
+            node.handoff_fences.pop(topic).set()  # Held writes now re-resolve to the new owner
+            data = node.local_dht.pop(topic, None)
+            if keep_copy:
+                node.handed_off[topic] = data
+            else:
+                node.message_storage.delete(topic)
+            invalidate_topic(topic)  # Cached answers name this node as the owner
+            topic_removed()
+            close_topic_streams(topic)
+            await notify_pull_waiters(topic, closing=True)
+            # Replica copies are not deleted here: the new owner may be one of this node's
+            # replicas, and stale copies elsewhere are dropped when the change commits
+
+async def prepare(epoch, new_members):
+    """Phase one on this node: hand off every owned topic whose owner changes."""
+    node = current_node()
+    membership = node.membership
+    if epoch != membership["epoch"] + 1:
+        return {"status": "Error", "message": f"Expected epoch {membership['epoch'] + 1}, got {epoch}."}
+    if membership["pending"] not in (None, sorted(new_members)):
+        return {"status": "Error", "message": "Another membership change is in progress."}
+    membership["pending"] = sorted(new_members)
+    new_placement = placement_for(new_members)
+    moving = {}
+    for topic in owned_topics():
+        new_owner = new_placement.owner(topic)
+        if new_owner != node.peer_id:
+            moving.setdefault(new_owner, []).append(topic)
+    stats = {"topics": 0, "messages": 0, "bytes": 0, "failed_topics": 0}
+    start_time = time.perf_counter()
+    async with node.membership_lock:
+        await asyncio.gather(*(hand_off(topics, new_owner, stats) for new_owner, topics in moving.items()))
+    stats["seconds"] = time.perf_counter() - start_time
+    logging.info(f"Handed off {stats['topics']} topics ({stats['bytes']} bytes) for epoch {epoch} at node {node.peer_id}")
+    status = "Error" if stats["failed_topics"] else "Success"
+    return {"status": status, "node": node.peer_id, **stats}
+
+async def commit(epoch, new_members):
+    """Phase two on this node: switch to the new placement and replica sets."""
+    node = current_node()
+    membership = node.membership
+    if epoch != membership["epoch"] + 1:
+        return {"status": "Error", "message": f"Expected epoch {membership['epoch'] + 1}, got {epoch}."}
+    membership["epoch"] = epoch
+    membership["pending"] = None
+    set_members(new_members)  # Also drops the handoff overrides, which the placement now agrees with
+    # The change is final: drop the copies kept of handed-off topics, unless this node stays a replica
+    for topic in node.handed_off:
+        if topic not in node.local_dht:
+            node.message_storage.delete(topic)
+    node.handed_off = {}
+    node.handoff_received = {}
+    # Drop replica copies this node no longer holds under the new replica sets
+    for topic in list(node.local_dht):
+        if node.peer_id not in replica_nodes(resolve_owner(topic)):
+            node.local_dht.pop(topic, None)
+            node.message_storage.delete(topic)
+            topic_removed()
+    await stop_replication()
+    if node.peer_id in node.members:
+        start_replication(node.message_storage, owned_topics)  # Starts with a resync of every owned topic
+    logging.info(f"Membership epoch {epoch} at node {node.peer_id}: {sorted(node.members)}")
+    return {"status": "Success", "node": node.peer_id, "epoch": epoch}
+
+async def abort(epoch, new_members, stage):
+    """Undo a prepared change on this node, one stage ("return" or "restore") at a time."""
+    node = current_node()
+    membership = node.membership
+    if epoch != membership["epoch"] + 1 or membership["pending"] != sorted(new_members):
+        return {"status": "Success", "node": node.peer_id, "topics": 0}  # This node never prepared the change
+    async with node.membership_lock:  # Let a prepare still handing off finish first
+        if stage == "return":
+            return await return_received()
+        restored = 0
+        for topic, data in node.handed_off.items():
+            if topic not in node.local_dht:  # It did not come back: serve the copy kept here
+                node.local_dht[topic] = data
+                topic_added(topic)
+                invalidate_topic(topic)
+                restored += 1
+        kept = [topic for topic, complete in node.handoff_received.items() if complete]
+        if kept:
+            logging.error(f"Aborted epoch {epoch} at node {node.peer_id}: could not return {len(kept)} topics")
+        node.handed_off = {}
+        node.handoff_received = {}
+        membership["pending"] = None
+        set_members(sorted(node.members))  # Drops the handoff overrides
+        logging.info(f"Aborted membership epoch {epoch} at node {node.peer_id}")
+        return {"status": "Success", "node": node.peer_id, "topics": restored}
+
+async def return_received():
+    """Stream the topics received in the aborted change back to their owner under the current placement."""
+    node = current_node()
+    placement = placement_for(node.members)
+    returning = {}
+    for topic, complete in list(node.handoff_received.items()):
+        if complete:
+            returning.setdefault(placement.owner(topic), []).append(topic)
+        else:  # The body broke off, so the previous owner still serves the topic
+            del node.handoff_received[topic]
+            node.local_dht.pop(topic, None)
+            node.message_storage.delete(topic)
+            topic_removed()
+    stats = {"topics": 0, "messages": 0, "bytes": 0, "failed_topics": 0}
+    await asyncio.gather(*(hand_off(topics, owner, stats, keep_copy=False) for owner, topics in returning.items()))
+    for topic in list(node.handoff_received):
+        if topic not in node.local_dht:
+            del node.handoff_received[topic]
+    status = "Error" if stats["failed_topics"] else "Success"
+    return {"status": status, "node": node.peer_id, **stats}
+
+async def ingest_handoff(lines):
+    """Apply a handoff body (an async iterator of NDJSON lines) from a topic's previous owner."""
+    node = current_node()
+    message_storage = node.message_storage
+    stats = {"topics": 0, "messages": 0}
+    received = []
+    async for line in lines:
+        record = json.loads(line)
+        topic = record["topic"]
+        if "offset" in record:
+            message_storage.ingest(topic, record["offset"], record["message"])
+            stats["messages"] += 1
+        elif "start_offset" in record:
+            if topic not in node.handed_off:  # Otherwise an aborted change is returning it
+                node.handoff_received.setdefault(topic, False)
+            node.local_dht[topic] = record["data"]
+            topic_added(topic)
+            retention = record["retention"]
+            message_storage.create(topic, RetentionPolicy(**retention) if retention else None)
+            if message_storage.read(topic, 0, 0)[2] < record["start_offset"]:
+                message_storage.reset(topic, record["start_offset"])
+        elif "reset" in record:
+            message_storage.reset(topic, record["reset"])
+        elif record.get("end"):
+            received.append(topic)
+    await message_storage.commit()  # The previous owner deletes its copy once this returns
+    # Serve the topics here from now on, before the placement switches; a body that
+    # broke off never gets this far, so the previous owner stays in charge
+    for topic in received:
+        node.resolver.override(topic, node.peer_id)
+        if topic in node.handed_off:
+            del node.handed_off[topic]  # Back from an aborted change, on top of the copy kept here
+        elif topic in node.handoff_received:
+            node.handoff_received[topic] = True
+    stats["topics"] = len(received)
+    return stats
+
+async def change_membership(new_members):
+    """Coordinate a membership change across every current and new member."""
+    node = current_node()
+    membership = node.membership
+    if membership["pending"] is not None:
+        return {"status": "Error", "message": "A membership change is already in progress."}
+    epoch = membership["epoch"] + 1
+    nodes = sorted(node.members | set(new_members))
+    payload = {"epoch": epoch, "members": sorted(new_members)}
+    start_time = time.perf_counter()
+    prepared = await broadcast(nodes, "membership/prepare", payload)
+    failed = [result for result in prepared if result.get("status") != "Success"]
+    if failed:
+        # Hand every moved topic back, then let every node serve what it owned before
+        returned = await broadcast(nodes, "membership/abort", {**payload, "stage": "return"})
+        restored = await broadcast(nodes, "membership/abort", {**payload, "stage": "restore"})
+        membership["pending"] = None
+        return {"status": "Error", "message": "Handoff failed; membership unchanged.", "results": prepared,
+                "topics_returned": sum(result.get("topics", 0) for result in returned),
+                "topics_restored": sum(result.get("topics", 0) for result in restored)}
+    committed = await broadcast(nodes, "membership/commit", payload)
+    return {
+        "status": "Success" if all(result.get("status") == "Success" for result in committed) else "Error",
+        "epoch": epoch,
+        "members": sorted(new_members),
+        "handoff_seconds": time.perf_counter() - start_time,
+        "topics_moved": sum(result.get("topics", 0) for result in prepared),
+        "messages_moved": sum(result.get("messages", 0) for result in prepared),
+        "bytes_moved": sum(result.get("bytes", 0) for result in prepared),
+    }
+
+async def broadcast(nodes, endpoint, payload):
+    async def send(node_id):
+        try:
+            response = await get_stream_client(NODE_ADDRESSES[node_id]).post(
+                f"/{endpoint}", json=payload,
+                timeout=httpx.Timeout(HANDOFF_TIMEOUT, connect=FORWARD_CONNECT_TIMEOUT))
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logging.error(f"Membership {endpoint} to {node_id} failed: {e!r}")
+            return {"status": "Error", "node": node_id, "message": str(e)}
+    return await asyncio.gather(*(send(node_id) for node_id in nodes))
+
+async def join(seed=None):
+    """Add this node: learn the current members from a seed, then coordinate the change."""
+    node = current_node()
+    if node.peer_id in node.members:
+        return {"status": "Error", "message": f"Node {node.peer_id} is already a member."}
+    seed = seed or min(node.members)
+    try:
+        response = await get_stream_client(NODE_ADDRESSES[seed]).get("/membership")
+        response.raise_for_status()
+        view = response.json()
+    except httpx.HTTPError as e:
+        return {"status": "Error", "message": f"Could not reach seed {seed}: {e!r}"}
+    node.membership["epoch"] = view["epoch"]
+    set_members(view["members"])
+    return await change_membership(view["members"] + [node.peer_id])
+
+async def leave():
+    """Remove this node after handing its topics to the remaining members."""
+    node = current_node()
+    if node.peer_id not in node.members:
+        return {"status": "Error", "message": f"Node {node.peer_id} is not a member."}
+    if len(node.members) == 1:
+        return {"status": "Error", "message": "The last member cannot leave."}
+    return await change_membership([node_id for node_id in node.members if node_id != node.peer_id])
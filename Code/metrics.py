@@ -0,0 +1,159 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from config import LOOP_LAG_INTERVAL_MS
+from node import current_node
+from tracing import current_span
+
+# Upper bounds (seconds) of the latency buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed buckets preallocated as a list; observe() is one bisect and two additions.
+
+    Nodes run one event loop thread, so no locking is needed. The total count is
+    the sum of the buckets, worked out when the metrics are scraped.
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class EndpointMetrics:
+    """Latency of one endpoint, split by whether this node served the request or forwarded it."""
+
+    __slots__ = ("endpoint", "local", "forwarded")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.local = Histogram()
+        self.forwarded = Histogram()
+
+timed_endpoints = []  # Every timed endpoint, in registration order
+
+class NodeMetrics:
+    """One node's request metrics: a pair of histograms per timed endpoint, and forward hop counts."""
+
+    __slots__ = ("endpoints", "hop_counts")
+
+    def __init__(self):
+        self.endpoints = [EndpointMetrics(endpoint) for endpoint in timed_endpoints]
+        self.hop_counts = Histogram(tuple(range(1, 21)))  # Hops taken by forwarded requests that got a response
+
+def node_metrics():
+    """The current node's metrics, created on its first request."""
+    node = current_node()
+    if node.metrics is None:
+        node.metrics = NodeMetrics()
+    return node.metrics
+
+# Event-loop lag is shared by every node on the loop
+loop_lag = Histogram((0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+_max_loop_lag = [0.0]
+_lag_task = None
+
+# Cleared by timed() and set by the forwarding path. Every request runs in its own task,
+# and so its own context, so it is never reset. Tasks spawned by a handler get a copy
+# of the context, so code that gathers forwards marks the request before spawning them.
+_forwarded = ContextVar("forwarded", default=False)
+
+def mark_forwarded():
+    """Time the current request as forwarded."""
+    _forwarded.set(True)
+
+def timed(endpoint):
+    """Decorator recording an endpoint handler's latency into its preallocated histograms.
+
+    Also marks the handler's start and end on the request's trace span.
+    """
+    index = len(timed_endpoints)
+    timed_endpoints.append(endpoint)
+
+    def decorate(handler):
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            metrics = node_metrics().endpoints[index]
+            _forwarded.set(False)
+            span = current_span()
+            start_time = perf_counter()
+            if span is not None:
+                span.handler_start = start_time
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                end_time = perf_counter()
+                (metrics.forwarded if _forwarded.get() else metrics.local).observe(end_time - start_time)
+                if span is not None:
+                    span.handler_end = end_time
+        return wrapper
+    return decorate
+
+async def _measure_loop_lag():
+    interval = LOOP_LAG_INTERVAL_MS / 1000
+    while True:
+        start_time = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start_time - interval, 0.0)
+        loop_lag.observe(lag)
+        _max_loop_lag[0] = max(_max_loop_lag[0], lag)
+
+def start_loop_lag_monitor():
+    """Sample event-loop lag: how late a timer of LOOP_LAG_INTERVAL_MS fires. Called at app startup."""
+    global _lag_task
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_measure_loop_lag())
+
+async def stop_loop_lag_monitor():
+    global _lag_task
+    if _lag_task is not None:
+        task, _lag_task = _lag_task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}" if labels else ""
+
+def render_histogram(name, help_text, series):
+    """Prometheus text for a histogram; `series` is a list of (labels dict, Histogram)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return lines
+
+def render_metric(name, metric_type, help_text, samples):
+    """Prometheus text for a gauge or counter; `samples` is a list of (labels dict, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+def core_metrics():
+    """Request latency, hop and event-loop lag metrics as Prometheus text lines."""
+    node = node_metrics()
+    request_series = []
+    for metrics in node.endpoints:
+        request_series.append(({"endpoint": metrics.endpoint, "route": "local"}, metrics.local))
+        request_series.append(({"endpoint": metrics.endpoint, "route": "forwarded"}, metrics.forwarded))
+    return (
+        render_histogram("dht_request_seconds", "Request latency by endpoint, served locally or forwarded.",
+                         request_series)
+        + render_histogram("dht_forward_hops", "Hops taken by forwarded requests.", [({}, node.hop_counts)])
+        + render_histogram("dht_event_loop_lag_seconds", "How late the event loop ran a periodic timer.",
+                           [({}, loop_lag)])
+        + render_metric("dht_event_loop_lag_max_seconds", "gauge", "Largest event-loop lag seen.",
+                        [({}, _max_loop_lag[0])])
+    )
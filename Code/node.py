@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from config import NODE_ADDRESSES, MEMBERS, STORAGE_BACKEND, STORAGE_DIR_PATTERN, peer_id
+from placement import create_placement
+from resolver import OwnerResolver
+from storage import create_storage
+from topology import compute_replicas, compute_next_hop, compute_shortest_hops
+
+# Placements only depend on the member list, so nodes that agree on it share one
+_placements = {}
+
+def placement_for(member_ids):
+    key = tuple(sorted(member_ids))
+    placement = _placements.get(key)
+    if placement is None:
+        placement = _placements[key] = create_placement(list(key))
+    return placement
+
+class Node:
+    """Everything one DHT node keeps between requests.
+
+    A node process runs a single Node (see main.py); simulator.py runs many in one
+    event loop. Code that handles a request finds its node with current_node().
+    Cluster-wide settings (cube size, routing mode, replication factor) stay in config.py.
+    Without a `storage_backend` the node has no message storage, for processes that
+    only forward requests.
+    """
+
+    def __init__(self, node_id, member_ids=MEMBERS, storage_backend=STORAGE_BACKEND):
+        self.peer_id = node_id
+        self.address = NODE_ADDRESSES[node_id]
+
+        # Topics and messages (dht.py)
+        self.local_dht = {}  # Each peer has its own subset of topics
+        self.message_storage = (create_storage(storage_backend, STORAGE_DIR_PATTERN.format(peer_id=node_id))
+                                if storage_backend is not None else None)
+        self.subscriptions = {}  # Store subscriptions for each topic
+        self.pull_waiters = {}  # topic -> [asyncio.Condition, waiting pulls], only while long polls are parked
+        self.in_flight = {}  # Target node -> forwarded requests awaiting a response, for least-loaded reads
+        self.handoff_fences = {}  # topic -> asyncio.Event, set once the topic's final messages reached its new owner
+        self.read_flights = {}  # (endpoint, topic, cursor...) -> task forwarding that read (coalescing.py)
+        self.coalesce_counts = {}  # endpoint -> {"forwarded": n, "coalesced": n}
+        # Topic metadata cache (topic_cache.py): answers cached here, and nodes caching this node's answers
+        self.topic_cache = OrderedDict()  # topic -> (expiry, query_topic response), LRU order
+        self.topic_watchers = OrderedDict()  # topic -> IDs of nodes caching it
+        self.pending_invalidations = {}  # node ID -> topics about to be invalidated there
+        self.topic_cache_counts = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0,
+                                   "invalidations_sent": 0, "invalidations_received": 0, "invalidation_failures": 0}
+        # Topics recovered from durable storage are still owned by this node after a restart
+        for topic in self.message_storage.topics() if self.message_storage is not None else ():
+            self.local_dht.setdefault(topic, None)
+
+        # Placement and routing (utils.py); routes are worked out the first time a target is used
+        self.members = set(member_ids)  # The nodes topics are placed on
+        self.resolver = OwnerResolver(placement_for(member_ids))
+        self.replicas = {}  # owner -> replica set
+        self.routes = {}  # target -> e-cube next hop
+        self.shortest_hops = {}  # target -> every neighbor on a shortest path
+
+        # Streams (streams.py), replication (replication.py) and membership (membership.py)
+        self.subscribers = {}  # topic -> open stream subscribers
+        self.stream_counters = {"dropped_frames": 0, "slow_disconnects": 0}
+        self.replicators = {}  # One replicator per replica of this node's topics
+        self.membership = {"epoch": 0, "pending": None}  # pending: member list being prepared
+        self.membership_lock = asyncio.Lock()  # One membership phase at a time on this node
+        self.handed_off = {}  # topic -> its local_dht data, for topics handed off in the pending change
+        self.handoff_received = {}  # topic -> whether it arrived complete, for topics received in the pending change
+
+        # Topic directory (directory.py): Bloom filters of every node's topics, gossiped
+        self.directory = {}  # node ID -> DirectoryEntry, this node's own included
+        self.directory_filter = None  # This node's filter, built when the gossip rounds start
+        self.directory_round = 0
+        self.directory_changed = False  # Topics were added since the entry was last published
+        self.directory_rebuild = False  # Topics were removed, so the filter is rebuilt
+        self.directory_known = {}  # neighbor -> the entry versions it has
+        self.directory_announced = {}  # node ID -> {topic: (epoch, first version including it)} announced creates
+        self.directory_announcements = set()  # Announcement requests in flight
+        self.directory_task = None
+        self.directory_counts = {"checks": 0, "definite_misses": 0, "false_positives": 0}
+
+        # Failure detection (failure_detector.py); empty until the heartbeat rounds start
+        self.incarnation = time.time()
+        self.heartbeats = {}
+        self.heartbeat_task = None
+
+        # Connection pools (client_pool.py) and request metrics (metrics.py, created on first use)
+        self.clients = {}
+        self.stream_clients = {}
+        self.framed_connections = {}  # Peer -> FramedConnection (framed.py)
+        self.framed_server = None
+        self.metrics = None
+
+    def set_members(self, member_ids):
+        """Switch placement and replica sets to a new member list."""
+        self.members = set(member_ids)
+        self.resolver.set_placement(placement_for(member_ids))
+        self.replicas.clear()
+        self.topic_cache.clear()  # Cached answers name the old owners
+
+    def replica_nodes(self, owner):
+        replicas = self.replicas.get(owner)
+        if replicas is None:
+            replicas = self.replicas[owner] = compute_replicas(owner, self.members)
+        return replicas
+
+    def next_hop(self, target_node):
+        hop = self.routes.get(target_node)
+        if hop is None:
+            hop = self.routes[target_node] = compute_next_hop(self.peer_id, target_node)
+        return hop
+
+    def route_hops(self, target_node):
+        hops = self.shortest_hops.get(target_node)
+        if hops is None:
+            hops = self.shortest_hops[target_node] = compute_shortest_hops(self.peer_id, target_node)
+        return hops
+
+# The node handling the current request. Unset outside a simulated cluster, where the
+# process runs the node given on its command line (or the first node, for client scripts).
+_current_node = ContextVar("node", default=None)
+_process_node = None
+
+def current_node():
+    node = _current_node.get()
+    return node if node is not None else process_node()
+
+def process_node(serve=False):
+    """This process's own node, built on first use from the command line arguments.
+
+    Only the serving process (main.py, `serve`) opens message storage. A client script
+    forwards under the first node's ID, and opening storage there would recover the
+    disk logs that node is writing to.
+    """
+    global _process_node
+    if _process_node is None:
+        _process_node = Node(peer_id, storage_backend=STORAGE_BACKEND if serve else None)
+    return _process_node
+
+def set_current_node(node):
+    """Make `node` the current node for this task and the tasks it starts."""
+    return _current_node.set(node)
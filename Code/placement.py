@@ -0,0 +1,90 @@
+import bisect
+from hashlib import blake2b
+from config import PLACEMENT_STRATEGY, VIRTUAL_NODES, NODE_WEIGHTS
+
+RING_SIZE = 2 ** 64  # Ring positions are 64-bit integers
+
+def ring_hash(key):
+    """Position of a key on the ring: an 8-byte BLAKE2b digest read as an integer.
+
+    A small raw digest avoids building a 64-character hex string and a 256-bit integer.
+    """
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class ModuloPlacement:
+    """Places a topic on node `hash % N`; changing N remaps almost every topic."""
+
+    def __init__(self, node_ids):
+        self.node_ids = sorted(node_ids)
+
+    def owner(self, topic):
+        return self.node_ids[ring_hash(topic) % len(self.node_ids)]
+
+class ConsistentHashRing:
+    """Consistent-hash ring with virtual nodes and weighted capacity.
+
+    Each node is placed on the ring `virtual_nodes * weight` times. A topic belongs to
+    the first virtual node at or after its position, so adding or removing a node only
+    moves the key ranges next to that node's points.
+    """
+
+    def __init__(self, node_ids, virtual_nodes=VIRTUAL_NODES, weights=None):
+        weights = NODE_WEIGHTS if weights is None else weights
+        self.node_ids = sorted(node_ids)
+        points = []
+        for node_id in self.node_ids:
+            count = max(1, round(virtual_nodes * weights.get(node_id, 1.0)))
+            points.extend((ring_hash(f"{node_id}#{replica}"), node_id) for replica in range(count))
+        points.sort()
+        # Parallel sorted arrays: bisect over positions, index into owners
+        self._positions = [position for position, _ in points]
+        self._owners = [node_id for _, node_id in points]
+
+    def owner(self, topic):
+        return self.owner_at(ring_hash(topic))
+
+    def owner_at(self, position):
+        index = bisect.bisect_left(self._positions, position)
+        return self._owners[index if index < len(self._owners) else 0]
+
+    def ranges(self):
+        """Key ranges as (start, end, owner): positions start < p <= end belong to owner.
+
+        The first range wraps around the end of the ring (its start is the last point).
+        """
+        return [(self._positions[i - 1], self._positions[i], self._owners[i])
+                for i in range(len(self._positions))]
+
+    def moved_ranges(self, new_ring):
+        """Key ranges whose owner differs in `new_ring`, as (start, end, old_owner, new_owner).
+
+        Ranges are half-open (start, end]; adjacent ranges with the same move are merged.
+        """
+        boundaries = sorted(set(self._positions) | set(new_ring._positions))
+        moved = []
+        for i, end in enumerate(boundaries):
+            start = boundaries[i - 1]
+            old_owner, new_owner = self.owner_at(end), new_ring.owner_at(end)
+            if old_owner == new_owner:
+                continue
+            if moved and moved[-1][1] == start and moved[-1][2:] == (old_owner, new_owner):
+                moved[-1] = (moved[-1][0], end, old_owner, new_owner)
+            else:
+                moved.append((start, end, old_owner, new_owner))
+        return moved
+
+def moved_fraction(moved_ranges):
+    """Fraction of the ring covered by the given moved ranges."""
+    # A range whose start equals its end spans the whole ring
+    return sum((end - start) % RING_SIZE or RING_SIZE for start, end, _, _ in moved_ranges) / RING_SIZE
+
+PLACEMENT_STRATEGIES = {
+    "modulo": ModuloPlacement,
+    "ring": ConsistentHashRing,
+}
+
+def create_placement(node_ids, strategy=PLACEMENT_STRATEGY):
+    """Build the configured placement engine for the given nodes."""
+    if strategy not in PLACEMENT_STRATEGIES:
+        raise ValueError(f"Unknown placement strategy '{strategy}'")
+    return PLACEMENT_STRATEGIES[strategy](node_ids)
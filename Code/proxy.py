@@ -0,0 +1,108 @@
+from urllib.parse import quote, unquote
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from pydantic import ValidationError
+from metrics import node_metrics
+from node import current_node
+from tracing import current_span
+from utils import resolve_owner
+
+# Passthrough routing for topic requests. A request is parsed only by the node it first
+# reaches (the ingress, which validates it and finds its topic) and by the node that
+# serves it. Forwarding nodes route on the X-DHT-Topic and X-DHT-Wait-Ms headers the
+# ingress adds, pass the request body on as the client sent it, and return the
+# response body as the serving node encoded it, so neither is decoded on the way.
+# The headers are only read on requests from another node (those carry X-Hop-Count),
+# and the serving node rejects a request whose body names another topic than its header.
+#
+# The serving node stamps the hop count (from X-Hop-Count, see tracing.py) on its
+# response, since the nodes in between no longer touch it.
+
+TOPIC_HEADER = "x-dht-topic"
+WAIT_HEADER = "x-dht-wait-ms"
+HOP_HEADER = "x-hop-count"  # Set on every forwarded request (see tracing.trace_headers)
+
+def route_headers(topic, wait_ms=0):
+    """Headers that let the next hop route a forwarded request without reading its body."""
+    headers = {TOPIC_HEADER: quote(topic, safe="")}
+    if wait_ms:
+        headers[WAIT_HEADER] = str(wait_ms)
+    return headers
+
+def parse(model, body):
+    """Validate a JSON body into `model`, failing with FastAPI's usual 422."""
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])}
+                                      for error in e.errors(include_url=False, include_context=False)], body=body)
+
+class RoutedRequest:
+    """A topic request as the routing layer sees it: raw body, topic, long-poll wait, parsed model if any."""
+
+    __slots__ = ("model", "body", "topic", "wait_ms", "parsed")
+
+    def __init__(self, model, body, topic, wait_ms, parsed=None):
+        self.model = model
+        self.body = body
+        self.topic = topic
+        self.wait_ms = wait_ms
+        self.parsed = parsed  # None for a forwarded request until this node serves it
+
+    def data(self):
+        if self.parsed is None:
+            self.parsed = parse(self.model, self.body)
+            if self.parsed.topic != self.topic:  # Routed here for another topic than the one it acts on
+                raise HTTPException(status_code=400, detail="X-DHT-Topic does not match the request topic.")
+        return self.parsed
+
+    async def serve(self, handle_local):
+        """Serve the request here with `handle_local(parsed request)`."""
+        return count_hops(await handle_local(self.data()))
+
+async def routed_request(request, model):
+    """Read a request's routing fields: from the headers if another node forwarded it, else from its body."""
+    body = await request.body()
+    topic = request.headers.get(TOPIC_HEADER)
+    if topic is not None and HOP_HEADER in request.headers:
+        wait_ms = request.headers.get(WAIT_HEADER, "0")
+        if not wait_ms.isdigit():
+            raise HTTPException(status_code=400, detail="X-DHT-Wait-Ms must be a whole number of milliseconds.")
+        return RoutedRequest(model, body, unquote(topic), int(wait_ms))
+    parsed = parse(model, body)
+    return RoutedRequest(model, body, parsed.topic, getattr(parsed, "wait_ms", 0), parsed)
+
+def count_hops(result):
+    """Stamp the forwards a request took on the response of the node serving it.
+
+    A response that already counts its hops (the request moved on, e.g. after a
+    handoff) is left as it is.
+    """
+    span = current_span()
+    if span is None or not span.depth:
+        return result
+    node_metrics().hop_counts.observe(span.depth)
+    if isinstance(result, dict):
+        result.setdefault("hops", span.depth)
+    elif isinstance(result, Response) and result.body.endswith(b"}"):
+        result = Response(content=result.body[:-1] + b',"hops":%d}' % span.depth, media_type=result.media_type)
+    return result
+
+def passthrough(result):
+    """A forwarded response body goes back to the client as it is; errors made here are dicts."""
+    if isinstance(result, (bytes, bytearray)):
+        return Response(content=result, media_type="application/json")
+    return result
+
+async def route(request, endpoint, model, handle_local, forward):
+    """Serve a topic request here if this node owns the topic, otherwise pass it on unparsed.
+
+    `handle_local(parsed request)` serves it; `forward(target_node, endpoint, body, topic=...)`
+    sends the raw body towards the owner and returns the raw response body (or an error dict).
+    """
+    routed = await routed_request(request, model)
+    target_node = resolve_owner(routed.topic)
+    if target_node == current_node().peer_id:
+        return await routed.serve(handle_local)
+    return passthrough(await forward(target_node, endpoint, routed.body, topic=routed.topic))
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from collections import deque
+import httpx
+from config import (
+    NODE_ADDRESSES,
+    FORWARD_TIMEOUT,
+    REPLICATION_FACTOR,
+    REPLICATION_MODE,
+    REPLICATION_BATCH,
+    REPLICATION_QUEUE_SIZE,
+    REPLICATION_RETRY_MS,
+)
+from client_pool import get_client
+from node import current_node
+from utils import replica_nodes
+
+class Replicator:
+    """Ships this node's topic ops to one replica, in order, over POST /replicate.
+
+    Ops queue up while the replica is slow or unreachable; past REPLICATION_QUEUE_SIZE
+    the queue is dropped and the replica is resynced from storage instead. A replica
+    that reports it is missing messages is caught up from storage before the next batch.
+    """
+
+    def __init__(self, node_id, storage, owned_topics):
+        self.source = current_node().peer_id
+        self.node_id = node_id
+        self.storage = storage
+        self.owned_topics = owned_topics  # Callable listing the topics this node owns
+        self.pending = deque()  # (op, future or None) in publish order
+        self.wakeup = asyncio.Event()
+        self.needs_resync = True  # Bring the replica up to date with whatever this node already holds
+        self.task = None
+        self.stats = {"shipped_ops": 0, "catch_up_ops": 0, "send_failures": 0, "resyncs": 0}
+
+    def submit(self, op, wait):
+        """Queue an op; returns a future resolved when the replica has it if `wait` is set."""
+        if len(self.pending) >= REPLICATION_QUEUE_SIZE:
+            logging.warning(f"Replication queue for {self.node_id} overflowed; resyncing from storage")
+            while self.pending:
+                _, future = self.pending.popleft()
+                if future is not None and not future.done():
+                    future.set_result(False)
+            self.needs_resync = True
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self.pending.append((op, future))
+        self.wakeup.set()
+        return future
+
+    async def run(self):
+        while True:
+            if self.needs_resync:
+                self.needs_resync = False
+                self.stats["resyncs"] += 1
+                await self.ship(self.sync_ops())
+                continue
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            batch = [self.pending.popleft() for _ in range(min(len(self.pending), REPLICATION_BATCH))]
+            await self.ship([op for op, _ in batch])
+            self.stats["shipped_ops"] += len(batch)
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(True)
+
+    def sync_ops(self):
+        """One "sync" op per owned topic: the replica creates it and reports if it is behind."""
+        ops = []
+        for topic in self.owned_topics():
+            retention = self.storage.retention(topic)
+            ops.append({"op": "sync", "topic": topic, "high_watermark": self.storage.read(topic, 0, 0)[2],
+                        "retention": retention.to_dict() if retention is not None else None})
+        return ops
+
+    async def ship(self, ops):
+        """Send ops, then catch the replica up on every topic it reports being behind on."""
+        for start in range(0, len(ops), REPLICATION_BATCH):
+            behind = await self.post(ops[start:start + REPLICATION_BATCH])
+            for topic, high_watermark in behind.items():
+                await self.catch_up(topic, high_watermark)
+
+    async def catch_up(self, topic, offset):
+        while True:
+            messages, start_offset, _ = self.storage.read(topic, offset, REPLICATION_BATCH)
+            ops = []
+            if start_offset > offset:
+                # Retention already dropped what the replica is missing; skip it ahead
+                ops.append({"op": "reset", "topic": topic, "offset": start_offset})
+                offset = start_offset
+            ops.extend({"op": "append", "topic": topic, "offset": offset + index, "message": message}
+                       for index, message in enumerate(messages))
+            if not ops:
+                return
+            offset += len(messages)
+            self.stats["catch_up_ops"] += len(ops)
+            behind = await self.post(ops)
+            if topic in behind:
+                offset = behind[topic]  # The replica lost state mid catch-up; continue from where it is
+
+    async def post(self, ops):
+        """Send ops until the replica accepts them; returns {topic: high_watermark} it is behind on."""
+        delay = REPLICATION_RETRY_MS / 1000
+        failed = False
+        while True:
+            try:
+                response = await get_client(NODE_ADDRESSES[self.node_id]).post(
+                    "/replicate", json={"source": self.source, "ops": ops})
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as e:
+                self.stats["send_failures"] += 1
+                if not failed:
+                    logging.warning(f"Replication to {self.node_id} failed, retrying: {e!r}")
+                    failed = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, FORWARD_TIMEOUT)
+        if failed:
+            # The replica may have restarted without its data; check every topic once it is back
+            logging.info(f"Replication to {self.node_id} resumed")
+            self.needs_resync = True
+        return response.json().get("behind", {})
+
+def start_replication(storage, owned_topics):
+    """Start a replicator for each replica of this node's topics.
+
+    Called at app startup and after every membership change.
+    """
+    node = current_node()
+    replicas = replica_nodes(node.peer_id)[1:]
+    if len(replicas) < REPLICATION_FACTOR - 1:
+        logging.warning(f"Only {len(replicas) + 1} of {REPLICATION_FACTOR} copies available for the topics of "
+                        f"{node.peer_id}: too few neighbors are members")
+    for node_id in replicas:
+        replicator = node.replicators[node_id] = Replicator(node_id, storage, owned_topics)
+        replicator.task = asyncio.create_task(replicator.run())
+
+async def stop_replication():
+    node = current_node()
+    replicators = list(node.replicators.values())
+    node.replicators.clear()
+    for replicator in replicators:
+        replicator.task.cancel()
+    await asyncio.gather(*(replicator.task for replicator in replicators), return_exceptions=True)
+
+async def replicate(op):
+    """Ship an op on one of this node's topics to its replicas.
+
+    In "async" mode this returns at once. In "quorum" mode it waits until a majority of
+    the copies that exist (the owner's included) have the op, and returns False if that
+    takes longer than FORWARD_TIMEOUT. With fewer members than REPLICATION_FACTOR
+    copies, the majority is of the copies there are, so writes still go through.
+    """
+    replicators = current_node().replicators
+    if not replicators:
+        return True
+    copies = len(replicators) + 1
+    needed = copies // 2 if REPLICATION_MODE == "quorum" else 0
+    futures = [replicator.submit(op, needed > 0) for replicator in replicators.values()]
+    if not needed:
+        return True
+    acked = 0
+    try:
+        for future in asyncio.as_completed(futures, timeout=FORWARD_TIMEOUT):
+            if await future:
+                acked += 1
+                if acked >= needed:
+                    return True
+    except asyncio.TimeoutError:
+        pass
+    return False
+
+def replication_stats():
+    return {node_id: {"pending_ops": len(replicator.pending), **replicator.stats}
+            for node_id, replicator in current_node().replicators.items()}
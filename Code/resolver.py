@@ -0,0 +1,47 @@
+from functools import lru_cache
+from config import OWNER_CACHE_SIZE
+
+class OwnerResolver:
+    """Resolves topics to owner node IDs through a bounded LRU cache.
+
+    The cache is keyed by topic and holds the owner ID string, so repeated requests
+    for a hot topic skip hashing and the placement lookup entirely.
+    """
+
+    def __init__(self, placement, cache_size=OWNER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.set_placement(placement)
+
+    def set_placement(self, placement):
+        """Switch to a new placement (e.g. after a membership change) and drop cached owners and overrides."""
+        self.placement = placement
+        self.overrides = {}
+        self._cached = lru_cache(maxsize=self.cache_size)(placement.owner)
+        self.resolve = self._cached
+
+    def override(self, topic, owner):
+        """Pin a topic to an owner regardless of the placement, e.g. once it is handed off.
+
+        Lookups only pay for the override check while at least one override exists.
+        """
+        self.overrides[topic] = owner
+        self.resolve = self._resolve_with_overrides
+
+    def _resolve_with_overrides(self, topic):
+        owner = self.overrides.get(topic)
+        return owner if owner is not None else self._cached(topic)
+
+    def resolve_many(self, topics):
+        """Resolve a batch of topics, returning owner IDs in the same order."""
+        resolve = self.resolve
+        return [resolve(topic) for topic in topics]
+
+    def group_by_owner(self, topics):
+        """Group a batch of topics by owner ID: {owner: [topic, ...]}."""
+        groups = {}
+        for topic, owner in zip(topics, self.resolve_many(topics)):
+            groups.setdefault(owner, []).append(topic)
+        return groups
+
+    def cache_info(self):
+        return self._cached.cache_info()
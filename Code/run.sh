@@ -1,15 +1,28 @@
 #!/bin/bash
 
+# Hypercube dimension: first argument, else DHT_DIMENSIONS, else 3 (8 nodes)
+DIMENSIONS=${1:-${DHT_DIMENSIONS:-3}}
+export DHT_DIMENSIONS=$DIMENSIONS
+
 # Define the number of nodes
-NUM_NODES=8
+NUM_NODES=$((1 << DIMENSIONS))
 
 # Base port number for nodes
-BASE_PORT=5000
+BASE_PORT=${DHT_BASE_PORT:-5000}
+export DHT_BASE_PORT=$BASE_PORT
+
+# Convert a node index to a DIMENSIONS-bit binary ID
+to_binary() {
+    local id=""
+    for ((bit=DIMENSIONS-1; bit>=0; bit--)); do
+        id+=$(( ($1 >> bit) & 1 ))
+    done
+    echo "$id"
+}
 
 # Run each node in the background
 for ((i=0; i<NUM_NODES; i++)); do
-    # Convert the index to binary format (3 bits for 8 nodes)
-    BINARY_ID=$(printf "%03d" $(bc <<< "obase=2;$i"))
+    BINARY_ID=$(to_binary $i)
     PORT=$((BASE_PORT + i))
 
     # Start the FastAPI server for each node
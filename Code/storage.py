@@ -0,0 +1,772 @@
+import asyncio
+import bisect
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from array import array
+from collections import OrderedDict
+from hashlib import blake2b
+from config import (
+    STORAGE_BACKEND,
+    STORAGE_DIR,
+    SEGMENT_BYTES,
+    INDEX_INTERVAL,
+    FSYNC_INTERVAL_MS,
+    RETENTION_MAX_MESSAGES,
+    RETENTION_MAX_BYTES,
+    MESSAGE_TTL_SECONDS,
+    MEMORY_BUDGET_BYTES,
+    MEMORY_SEGMENT_MESSAGES,
+)
+
+class RetentionPolicy:
+    """Per-topic retention limits; 0 disables a limit."""
+
+    __slots__ = ("max_messages", "max_bytes", "ttl_seconds")
+
+    def __init__(self, max_messages=None, max_bytes=None, ttl_seconds=None):
+        self.max_messages = RETENTION_MAX_MESSAGES if max_messages is None else max_messages
+        self.max_bytes = RETENTION_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl_seconds = MESSAGE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+    def to_dict(self):
+        return {"max_messages": self.max_messages, "max_bytes": self.max_bytes, "ttl_seconds": self.ttl_seconds}
+
+def payload_size(message):
+    """Bytes a message occupies once UTF-8 encoded (no encoding needed for ASCII)."""
+    return len(message) if message.isascii() else len(message.encode())
+
+class _MemorySegment:
+    """A run of consecutive messages with their sizes and publish times."""
+
+    __slots__ = ("base_offset", "messages", "sizes", "timestamps")
+
+    def __init__(self, base_offset):
+        self.base_offset = base_offset
+        self.messages = []  # Entries before the topic's start offset are cleared to None
+        self.sizes = array('I')
+        self.timestamps = array('d')
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def append(self, message, size, now):
+        self.messages.append(message)
+        self.sizes.append(size)
+        self.timestamps.append(now)
+
+    def release(self, index):
+        """Free a message retention dropped."""
+        self.messages[index] = None
+
+    def read(self, start, end):
+        return self.messages[start:end]
+
+class _ArenaSegment:
+    """A run of consecutive messages stored JSON-encoded, back to back, in one bytearray.
+
+    Each message is kept as its JSON string literal plus a trailing comma, so any
+    run of messages is one slice of the arena: `[` + slice minus its last comma + `]`
+    is that run as a JSON array, ready to send. Per-message metadata lives in
+    parallel arrays: about 23 bytes per message beyond its payload, where a str in a
+    list costs over 60.
+    """
+
+    __slots__ = ("base_offset", "arena", "ends", "sizes", "timestamps")
+
+    def __init__(self, base_offset):
+        self.base_offset = base_offset
+        self.arena = bytearray()
+        self.ends = array('Q')  # End of each message's encoding in the arena, comma included
+        self.sizes = array('I')
+        self.timestamps = array('d')
+
+    def __len__(self):
+        return len(self.ends)
+
+    def append(self, message, size, now):
+        self.arena += json.dumps(message).encode()  # ASCII-only, so the JSON can go out as is
+        self.arena += b","
+        self.ends.append(len(self.arena))
+        self.sizes.append(size)
+        self.timestamps.append(now)
+
+    def release(self, index):
+        pass  # Arena bytes are freed with the whole segment
+
+    def span(self, start, end):
+        """Arena positions of messages [start, end), last comma included."""
+        return (self.ends[start - 1] if start else 0), self.ends[end - 1]
+
+    def read(self, start, end):
+        if start >= end:
+            return []
+        first, last = self.span(start, end)
+        return json.loads(b"[" + self.arena[first:last - 1] + b"]")
+
+class _MemoryTopic:
+    __slots__ = ("retention", "segments", "base_offsets", "start_offset", "end_offset", "bytes")
+
+    def __init__(self, retention):
+        self.retention = retention
+        self.segments = []
+        self.base_offsets = []  # Parallel to segments, for bisect
+        self.start_offset = 0  # Oldest retained offset; everything before it was dropped
+        self.end_offset = 0  # High watermark
+        self.bytes = 0  # Payload bytes currently held
+
+class MemoryStorage:
+    """Keeps each topic's messages in RAM as fixed-size segments with retention.
+
+    Retention is enforced incrementally on publish: the published topic is trimmed
+    to its count, byte and TTL limits, the least recently used topic is checked for
+    expired messages, and while the node is over its memory budget the oldest
+    segment of the least recently used topic is evicted.
+    """
+
+    segment_class = _MemorySegment
+
+    def __init__(self, memory_budget=MEMORY_BUDGET_BYTES):
+        self.memory_budget = memory_budget
+        self.total_bytes = 0
+        self._topics = OrderedDict()  # Least recently used topic first
+
+    def topics(self):
+        return list(self._topics)
+
+    def create(self, topic, retention=None):
+        if topic not in self._topics:
+            self._topics[topic] = _MemoryTopic(retention or RetentionPolicy())
+        elif retention is not None:
+            self._topics[topic].retention = retention
+        return self._topics[topic]
+
+    def delete(self, topic):
+        state = self._topics.pop(topic, None)
+        if state is not None:
+            self.total_bytes -= state.bytes
+
+    async def append(self, topic, message):
+        return self._append(topic, message)
+
+    def _append(self, topic, message):
+        state = self.create(topic)
+        self._topics.move_to_end(topic)
+        now = time.time()
+        if not state.segments or len(state.segments[-1]) >= MEMORY_SEGMENT_MESSAGES:
+            state.segments.append(self.segment_class(state.end_offset))
+            state.base_offsets.append(state.end_offset)
+        size = payload_size(message)
+        state.segments[-1].append(message, size, now)
+        offset = state.end_offset
+        state.end_offset += 1
+        state.bytes += size
+        self.total_bytes += size
+
+        self._enforce_retention(state, now)
+        coldest = next(iter(self._topics.values()))
+        if coldest is not state:
+            self._expire(coldest, now)
+        self._enforce_budget()
+        return offset
+
+    def ingest(self, topic, offset, message):
+        """Store a replicated message at the offset the owner gave it.
+
+        Offsets already held are ignored. Returns False, storing nothing, if `offset`
+        is past the high watermark: the replica has to catch up first.
+        """
+        state = self.create(topic)
+        if offset > state.end_offset:
+            return False
+        if offset == state.end_offset:
+            self._append(topic, message)
+        return True
+
+    def reset(self, topic, offset):
+        """Drop every message of a topic and continue it at `offset`."""
+        state = self.create(topic)
+        self.total_bytes -= state.bytes
+        state.segments.clear()
+        state.base_offsets.clear()
+        state.start_offset = state.end_offset = offset
+        state.bytes = 0
+
+    def retention(self, topic):
+        state = self._topics.get(topic)
+        return state.retention if state is not None else None
+
+    async def commit(self):
+        pass
+
+    def _drop_head(self, state):
+        """Drop the oldest retained message of a topic."""
+        segment = state.segments[0]
+        index = state.start_offset - segment.base_offset
+        size = segment.sizes[index]
+        segment.release(index)
+        state.bytes -= size
+        self.total_bytes -= size
+        state.start_offset += 1
+        if index + 1 == len(segment):
+            del state.segments[0]
+            del state.base_offsets[0]
+
+    def _drop_oldest_segment(self, state):
+        segment = state.segments.pop(0)
+        del state.base_offsets[0]
+        index = state.start_offset - segment.base_offset
+        size = sum(segment.sizes[index:])
+        state.bytes -= size
+        self.total_bytes -= size
+        state.start_offset = segment.base_offset + len(segment)
+
+    def _expire(self, state, now):
+        ttl_seconds = state.retention.ttl_seconds
+        if ttl_seconds:
+            cutoff = now - ttl_seconds
+            while state.segments and state.segments[0].timestamps[state.start_offset - state.base_offsets[0]] < cutoff:
+                self._drop_head(state)
+
+    def _enforce_retention(self, state, now):
+        retention = state.retention
+        if retention.max_messages:
+            while state.end_offset - state.start_offset > retention.max_messages:
+                self._drop_head(state)
+        if retention.max_bytes:
+            while state.bytes > retention.max_bytes:
+                self._drop_head(state)
+        self._expire(state, now)
+
+    def _enforce_budget(self):
+        if not self.memory_budget:
+            return
+        while self.total_bytes > self.memory_budget:
+            topic, state = next(iter(self._topics.items()))
+            if state.segments:
+                self._drop_oldest_segment(state)
+            if not state.segments:
+                # Nothing left to evict here; stop it shadowing topics that still hold data
+                self._topics.move_to_end(topic)
+
+    def read(self, topic, from_offset, limit):
+        """Returns (messages, start_offset, high_watermark) for up to `limit` messages.
+
+        Reading starts at `from_offset`, or at the oldest retained offset if retention
+        has already dropped the messages before it.
+        """
+        state = self._topics.get(topic)
+        if state is None:
+            return [], 0, 0
+        self._topics.move_to_end(topic)
+        self._expire(state, time.time())
+        offset = max(from_offset, state.start_offset)
+        end = min(state.end_offset, offset + limit)
+        messages = []
+        if offset < end:
+            slot = bisect.bisect_right(state.base_offsets, offset) - 1
+            for segment in state.segments[slot:]:
+                if offset >= end:
+                    break
+                chunk = segment.read(offset - segment.base_offset, min(end - segment.base_offset, len(segment)))
+                messages.extend(chunk)
+                offset += len(chunk)
+        return messages, state.start_offset, state.end_offset
+
+    def read_encoded(self, topic, from_offset, limit):
+        """Like read(), but the messages come back as one JSON array (bytes) plus their count."""
+        messages, start_offset, high_watermark = self.read(topic, from_offset, limit)
+        return json.dumps(messages).encode(), len(messages), start_offset, high_watermark
+
+    def stats(self):
+        """Per-topic accounting of retained messages and payload bytes."""
+        return {
+            "total_bytes": self.total_bytes,
+            "memory_budget": self.memory_budget,
+            "topics": {topic: {"messages": state.end_offset - state.start_offset,
+                               "bytes": state.bytes,
+                               "start_offset": state.start_offset,
+                               "high_watermark": state.end_offset}
+                       for topic, state in self._topics.items()},
+        }
+
+    async def close(self):
+        pass
+
+class ArenaStorage(MemoryStorage):
+    """MemoryStorage with each segment's messages encoded once into a bytearray arena.
+
+    Retention and the memory budget work as in MemoryStorage; a message retention
+    drops stays in its arena until the rest of its segment goes too. read_encoded()
+    copies the requested range straight out of the arenas.
+    """
+
+    segment_class = _ArenaSegment
+
+    def read_encoded(self, topic, from_offset, limit):
+        state = self._topics.get(topic)
+        if state is None:
+            return b"[]", 0, 0, 0
+        self._topics.move_to_end(topic)
+        self._expire(state, time.time())
+        offset = max(from_offset, state.start_offset)
+        end = min(state.end_offset, offset + limit)
+        count = max(end - offset, 0)
+        if not count:
+            return b"[]", 0, state.start_offset, state.end_offset
+        encoded = bytearray(b"[")
+        slot = bisect.bisect_right(state.base_offsets, offset) - 1
+        for segment in state.segments[slot:]:
+            if offset >= end:
+                break
+            start = offset - segment.base_offset
+            stop = min(end - segment.base_offset, len(segment))
+            first, last = segment.span(start, stop)
+            with memoryview(segment.arena) as arena:
+                encoded += arena[first:last]
+            offset += stop - start
+        encoded[-1] = ord("]")  # In place of the last message's comma
+        return encoded, count, state.start_offset, state.end_offset
+
+# On-disk record framing: 4-byte big-endian payload length, then the UTF-8 payload
+RECORD_HEADER = struct.Struct(">I")
+# Sparse index entries: (offset relative to the segment base, byte position in the segment)
+INDEX_ENTRY = struct.Struct(">QQ")
+
+class _Segment:
+    """One append-only segment file plus its sparse offset index."""
+
+    def __init__(self, directory, base_offset):
+        self.base_offset = base_offset
+        self.log_path = os.path.join(directory, f"{base_offset:020d}.log")
+        self.index_path = os.path.join(directory, f"{base_offset:020d}.index")
+        self.count = 0  # Records written, including ones not yet committed
+        self.size = 0  # Bytes written, including ones not yet committed
+        self.committed_count = 0  # Records flushed to the OS and visible to readers
+        self.committed_size = 0
+        self.index_offsets = array('Q')
+        self.index_positions = array('Q')
+        self.sealed = False  # No more appends; files close once the last writes are committed
+        self.last_append_time = time.time()  # Used for TTL retention of whole segments
+        self._log_file = None
+        self._index_file = None
+        self._map = None
+
+    def recover(self):
+        """Load the sparse index and scan the tail after its last entry to find the end.
+
+        A torn record at the end of the file (crash mid-write) is truncated away.
+        """
+        file_size = os.path.getsize(self.log_path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as index_file:
+                data = index_file.read()
+            for relative_offset, position in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]):
+                if position >= file_size:
+                    break
+                self.index_offsets.append(relative_offset)
+                self.index_positions.append(position)
+        count = self.index_offsets[-1] if self.index_offsets else 0
+        position = self.index_positions[-1] if self.index_positions else 0
+        with open(self.log_path, "rb") as log_file:
+            log_file.seek(position)
+            while True:
+                header = log_file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                (length,) = RECORD_HEADER.unpack(header)
+                if len(log_file.read(length)) < length:
+                    break
+                position += RECORD_HEADER.size + length
+                count += 1
+        if position < file_size:
+            logging.warning(f"Truncating torn tail of {self.log_path} at byte {position}")
+            with open(self.log_path, "r+b") as log_file:
+                log_file.truncate(position)
+        self.count = self.committed_count = count
+        self.size = self.committed_size = position
+        self.last_append_time = os.path.getmtime(self.log_path)
+        self._rewrite_index()
+
+    def _rewrite_index(self):
+        with open(self.index_path, "wb") as index_file:
+            for relative_offset, position in zip(self.index_offsets, self.index_positions):
+                index_file.write(INDEX_ENTRY.pack(relative_offset, position))
+
+    def append(self, payload):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, "ab")
+            self._index_file = open(self.index_path, "ab")
+        if self.count % INDEX_INTERVAL == 0:
+            self.index_offsets.append(self.count)
+            self.index_positions.append(self.size)
+            self._index_file.write(INDEX_ENTRY.pack(self.count, self.size))
+        self._log_file.write(RECORD_HEADER.pack(len(payload)))
+        self._log_file.write(payload)
+        self.last_append_time = time.time()
+        self.count += 1
+        self.size += RECORD_HEADER.size + len(payload)
+
+    def flush(self):
+        """Hand buffered writes to the OS; returns file descriptors that need an fsync.
+
+        They are duplicates, owned by the caller: sealing or removing the segment while
+        the fsync is queued closes only this segment's own descriptors.
+        """
+        if self._log_file is None:
+            return []
+        self._log_file.flush()
+        self._index_file.flush()
+        self.committed_count = self.count
+        self.committed_size = self.size
+        return [os.dup(self._log_file.fileno()), os.dup(self._index_file.fileno())]
+
+    def seal(self):
+        """Stop writing to this segment; it stays readable through mmap."""
+        self.sealed = True
+        if self.committed_count == self.count:
+            self.close_files()
+
+    def close_files(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._index_file.close()
+            self._log_file = self._index_file = None
+
+    def _mapped(self):
+        # The active segment grows, so remap when committed data is past the mapped length
+        if self._map is None or len(self._map) < self.committed_size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.log_path, "rb") as log_file:
+                self._map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self, from_offset, limit):
+        """Read up to `limit` committed records starting at absolute offset `from_offset`."""
+        relative_offset = from_offset - self.base_offset
+        end = min(self.committed_count, relative_offset + limit)
+        if relative_offset >= end:
+            return []
+        view = self._mapped()
+        # Jump to the closest indexed record at or before the target, then scan forward
+        slot = bisect.bisect_right(self.index_offsets, relative_offset) - 1
+        current, position = self.index_offsets[slot], self.index_positions[slot]
+        messages = []
+        while current < end:
+            (length,) = RECORD_HEADER.unpack_from(view, position)
+            position += RECORD_HEADER.size
+            if current >= relative_offset:
+                messages.append(view[position:position + length].decode())
+            position += length
+            current += 1
+        return messages
+
+    def close(self):
+        self.close_files()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def remove(self):
+        self.close()
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def _fsync_and_close(descriptors):
+    """fsync the descriptors _Segment.flush duplicated, then close them (runs in the executor)."""
+    try:
+        for fd in descriptors:
+            os.fsync(fd)
+    finally:
+        for fd in descriptors:
+            os.close(fd)
+
+class _TopicLog:
+    """A topic's ordered list of segments; only the last one is written to.
+
+    Retention drops whole sealed segments, so limits are enforced at segment granularity.
+    """
+
+    RETENTION_FILE = "RETENTION"
+
+    def __init__(self, directory, retention=None):
+        self.directory = directory
+        retention_path = os.path.join(directory, self.RETENTION_FILE)
+        if retention is None and os.path.exists(retention_path):
+            with open(retention_path) as retention_file:
+                retention = RetentionPolicy(**json.load(retention_file))
+        self.set_retention(retention or RetentionPolicy())
+        self.segments = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".log"):
+                segment = _Segment(directory, int(name[:-4]))
+                segment.recover()
+                if self.segments:
+                    self.segments[-1].seal()
+                self.segments.append(segment)
+        self.base_offsets = [segment.base_offset for segment in self.segments]
+        self.bytes = sum(segment.size for segment in self.segments)
+
+    def set_retention(self, retention):
+        self.retention = retention
+        with open(os.path.join(self.directory, self.RETENTION_FILE), "w") as retention_file:
+            json.dump(retention.to_dict(), retention_file)
+
+    @property
+    def start_offset(self):
+        return self.segments[0].base_offset if self.segments else 0
+
+    @property
+    def high_watermark(self):
+        if not self.segments:
+            return 0
+        return self.segments[-1].base_offset + self.segments[-1].count
+
+    @property
+    def committed_watermark(self):
+        if not self.segments:
+            return 0
+        return self.segments[-1].base_offset + self.segments[-1].committed_count
+
+    def append(self, payload):
+        active = self.segments[-1] if self.segments else None
+        if active is None or active.size >= SEGMENT_BYTES:
+            if active is not None:
+                active.seal()
+            active = _Segment(self.directory, self.high_watermark)
+            self.segments.append(active)
+            self.base_offsets.append(active.base_offset)
+        offset = self.high_watermark
+        size_before = active.size
+        active.append(payload)
+        self.bytes += active.size - size_before
+        self.enforce_retention(time.time())
+        return offset
+
+    def reset(self, offset):
+        """Remove every segment and continue the log at `offset` with an empty segment."""
+        for segment in self.segments:
+            segment.remove()
+        active = _Segment(self.directory, offset)
+        open(active.log_path, "ab").close()  # An empty file keeps the offset across restarts
+        self.segments = [active]
+        self.base_offsets = [offset]
+        self.bytes = 0
+
+    def enforce_retention(self, now):
+        """Drop the oldest sealed segments while the rest still satisfies the limits."""
+        retention = self.retention
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            if oldest.committed_count != oldest.count:
+                break  # Still waiting for its group commit
+            over_count = retention.max_messages and self.high_watermark - self.segments[1].base_offset >= retention.max_messages
+            over_bytes = retention.max_bytes and self.bytes - oldest.size >= retention.max_bytes
+            expired = retention.ttl_seconds and oldest.last_append_time < now - retention.ttl_seconds
+            if not (over_count or over_bytes or expired):
+                break
+            self.bytes -= oldest.size
+            oldest.remove()
+            del self.segments[0]
+            del self.base_offsets[0]
+
+    def read(self, from_offset, limit):
+        messages = []
+        slot = max(bisect.bisect_right(self.base_offsets, from_offset) - 1, 0)
+        for segment in self.segments[slot:]:
+            if len(messages) >= limit:
+                break
+            messages.extend(segment.read(from_offset + len(messages), limit - len(messages)))
+        return messages
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+class SegmentLogStorage:
+    """Durable per-topic logs: append-only segment files, sparse indexes and mmap reads.
+
+    Publishes are acknowledged after a group commit: writes are buffered, and one
+    fsync every FSYNC_INTERVAL_MS covers every append made since the previous one.
+    Readers only see committed messages.
+    """
+
+    TOPIC_NAME_FILE = "TOPIC"
+
+    def __init__(self, root=STORAGE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._logs = {}
+        for name in sorted(os.listdir(root)):
+            name_path = os.path.join(root, name, self.TOPIC_NAME_FILE)
+            if os.path.exists(name_path):
+                with open(name_path, encoding="utf-8") as name_file:
+                    self._logs[name_file.read()] = _TopicLog(os.path.join(root, name))
+        self._dirty = set()  # Segments with writes waiting for the next group commit
+        self._pending_commit = None  # Future resolved when the current batch is durable
+        self._commit_timer = None  # Starts the next group commit
+        self._commit_task = None  # The group commit running now, kept referenced until it finishes
+
+    def _directory(self, topic):
+        # Topic names are arbitrary strings, so directories are named by digest
+        return os.path.join(self.root, blake2b(topic.encode(), digest_size=16).hexdigest())
+
+    def topics(self):
+        return list(self._logs)
+
+    def create(self, topic, retention=None):
+        if topic in self._logs:
+            if retention is not None:
+                self._logs[topic].set_retention(retention)
+            return self._logs[topic]
+        directory = self._directory(topic)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.TOPIC_NAME_FILE), "w", encoding="utf-8") as name_file:
+            name_file.write(topic)
+        log = self._logs[topic] = _TopicLog(directory, retention)
+        return log
+
+    def delete(self, topic):
+        log = self._logs.pop(topic, None)
+        if log is not None:
+            for segment in log.segments:
+                self._dirty.discard(segment)
+            log.close()
+            shutil.rmtree(log.directory, ignore_errors=True)
+
+    async def append(self, topic, message):
+        offset = self._append(topic, message)
+        await self._group_commit()
+        return offset
+
+    def _append(self, topic, message):
+        log = self.create(topic)
+        offset = log.append(message.encode())
+        self._dirty.add(log.segments[-1])
+        return offset
+
+    def ingest(self, topic, offset, message):
+        """Store a replicated message at the owner's offset; see MemoryStorage.ingest.
+
+        The write is buffered until the next commit().
+        """
+        log = self.create(topic)
+        if offset > log.high_watermark:
+            return False
+        if offset == log.high_watermark:
+            self._append(topic, message)
+        return True
+
+    def reset(self, topic, offset):
+        """Drop every message of a topic and continue it at `offset`."""
+        log = self.create(topic)
+        for segment in log.segments:
+            self._dirty.discard(segment)
+        log.reset(offset)
+
+    def retention(self, topic):
+        log = self._logs.get(topic)
+        return log.retention if log is not None else None
+
+    async def commit(self):
+        """Wait until every buffered write is durable."""
+        if self._dirty or self._pending_commit is not None:
+            await self._group_commit()
+
+    async def _group_commit(self):
+        if self._pending_commit is None:
+            loop = asyncio.get_running_loop()
+            self._pending_commit = loop.create_future()
+            self._commit_timer = loop.call_later(FSYNC_INTERVAL_MS / 1000, self._start_commit)
+        await asyncio.shield(self._pending_commit)
+
+    def _start_commit(self):
+        self._commit_timer = None
+        task = self._commit_task = asyncio.create_task(self._commit())
+        task.add_done_callback(self._commit_done)
+
+    def _commit_done(self, task):
+        if self._commit_task is task:
+            self._commit_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Group commit failed: {task.exception()!r}")
+
+    async def _commit(self):
+        """Flush and fsync every dirty segment, then acknowledge the whole batch."""
+        batch, self._pending_commit = self._pending_commit, None
+        dirty, self._dirty = self._dirty, set()
+        descriptors = []
+        try:
+            try:
+                for segment in dirty:
+                    descriptors.extend(segment.flush())
+            except Exception:
+                for fd in descriptors:  # Release the duplicates made before the failing flush
+                    os.close(fd)
+                raise
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _fsync_and_close, descriptors)
+        except Exception as e:
+            logging.error(f"Group commit of {len(dirty)} segments failed: {e!r}")
+            if batch is not None and not batch.done():
+                batch.set_exception(e)
+            return
+        for segment in dirty:
+            if segment.sealed:
+                segment.close_files()
+        if batch is not None and not batch.done():
+            batch.set_result(None)
+
+    def read(self, topic, from_offset, limit):
+        """Returns (messages, start_offset, high_watermark), reading committed messages only."""
+        log = self._logs.get(topic)
+        if log is None:
+            return [], 0, 0
+        start_offset = log.start_offset
+        high_watermark = log.committed_watermark
+        offset = max(from_offset, start_offset)
+        return log.read(offset, min(limit, max(high_watermark - offset, 0))), start_offset, high_watermark
+
+    def read_encoded(self, topic, from_offset, limit):
+        """Like read(), but the messages come back as one JSON array (bytes) plus their count."""
+        messages, start_offset, high_watermark = self.read(topic, from_offset, limit)
+        return json.dumps(messages).encode(), len(messages), start_offset, high_watermark
+
+    def stats(self):
+        """Per-topic accounting of retained messages and on-disk bytes."""
+        topics = {topic: {"messages": log.high_watermark - log.start_offset,
+                          "bytes": log.bytes,
+                          "start_offset": log.start_offset,
+                          "high_watermark": log.high_watermark}
+                  for topic, log in self._logs.items()}
+        return {"total_bytes": sum(entry["bytes"] for entry in topics.values()), "topics": topics}
+
+    async def close(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if self._commit_task is not None:
+            await asyncio.gather(self._commit_task, return_exceptions=True)
+        if self._pending_commit is not None:
+            await self._commit()
+        for log in self._logs.values():
+            log.close()
+        self._logs.clear()
+
+STORAGE_BACKENDS = {
+    "memory": MemoryStorage,
+    "arena": ArenaStorage,
+    "disk": SegmentLogStorage,
+}
+
+def create_storage(backend=STORAGE_BACKEND, root=STORAGE_DIR):
+    """Build the configured message storage engine; the disk engine keeps its logs under `root`."""
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'")
+    return STORAGE_BACKENDS[backend](root) if backend == "disk" else STORAGE_BACKENDS[backend]()
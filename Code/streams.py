@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+from config import STREAM_QUEUE_SIZE, STREAM_SLOW_POLICY, STREAM_BLOCK_TIMEOUT_MS
+from node import current_node
+from logger import log_fields
+
+# Active stream subscribers per topic live on the owner node (node.subscribers)
+
+SLOW_POLICIES = ("drop", "disconnect", "block")
+
+def encode_frame(offset, message):
+    """Encode one message as a Server-Sent Events frame; the event id is the offset."""
+    data = json.dumps({"offset": offset, "message": message})
+    return f"id: {offset}\ndata: {data}\n\n".encode()
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+class Subscriber:
+    """One open stream: a bounded queue of (offset, frame) entries waiting to be sent.
+
+    Frames are shared between subscribers, so fan-out only enqueues a reference.
+    """
+
+    __slots__ = ("topic", "queue", "policy", "closed", "lagging")
+
+    def __init__(self, topic, queue_size=STREAM_QUEUE_SIZE, policy=STREAM_SLOW_POLICY):
+        if policy not in SLOW_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy '{policy}'")
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.policy = policy
+        self.closed = False
+        self.lagging = False  # Frames were dropped; catch up from storage once the queue drains
+
+    def close(self):
+        """Stop the stream: discard what is queued and wake the sender with None."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+def add_subscriber(topic, queue_size=STREAM_QUEUE_SIZE, policy=STREAM_SLOW_POLICY):
+    subscriber = Subscriber(topic, queue_size, policy)
+    current_node().subscribers.setdefault(topic, set()).add(subscriber)
+    return subscriber
+
+def remove_subscriber(subscriber):
+    all_subscribers = current_node().subscribers
+    subscribers = all_subscribers.get(subscriber.topic)
+    if subscribers is not None:
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del all_subscribers[subscriber.topic]
+
+def subscriber_count(topic):
+    return len(current_node().subscribers.get(topic, ()))
+
+async def fan_out(topic, offset, message):
+    """Hand a published message to every open stream on the topic.
+
+    The frame is encoded once. A full queue is handled by the subscriber's policy:
+    "drop" skips the frame (the stream catches up from storage once its queue drains),
+    "disconnect" closes the stream, and "block" makes the publisher wait up to
+    STREAM_BLOCK_TIMEOUT_MS before disconnecting the subscriber.
+    """
+    node = current_node()
+    subscribers = node.subscribers.get(topic)
+    if not subscribers:
+        return
+    entry = (offset, encode_frame(offset, message))
+    blocked = []
+    for subscriber in tuple(subscribers):  # A disconnect removes the subscriber mid-loop
+        try:
+            subscriber.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            if subscriber.policy == "drop":
+                subscriber.lagging = True
+                node.stream_counters["dropped_frames"] += 1
+            elif subscriber.policy == "block":
+                blocked.append(subscriber)
+            else:
+                _disconnect_slow(subscriber)
+    if blocked:
+        await asyncio.gather(*(_put_blocking(subscriber, entry) for subscriber in blocked))
+
+async def _put_blocking(subscriber, entry):
+    try:
+        await asyncio.wait_for(subscriber.queue.put(entry), STREAM_BLOCK_TIMEOUT_MS / 1000)
+    except asyncio.TimeoutError:
+        _disconnect_slow(subscriber)
+
+def _disconnect_slow(subscriber):
+    current_node().stream_counters["slow_disconnects"] += 1
+    logging.warning("Disconnected slow stream subscriber", extra=log_fields("stream", topic=subscriber.topic))
+    remove_subscriber(subscriber)
+    subscriber.close()
+
+def close_topic_streams(topic):
+    """End every stream on a topic, e.g. when the topic is deleted."""
+    for subscriber in list(current_node().subscribers.pop(topic, ())):
+        subscriber.close()
+
+def close_streams():
+    """End every open stream so the server can shut down."""
+    for topic in list(current_node().subscribers):
+        close_topic_streams(topic)
+
+def stream_stats():
+    node = current_node()
+    return {
+        "active_streams": sum(len(subscribers) for subscribers in node.subscribers.values()),
+        "streamed_topics": len(node.subscribers),
+        **node.stream_counters,
+    }
@@ -1,16 +1,6 @@
 import random
 import string
-
-NODE_ADDRESSES = {
-    "000": "http://127.0.0.1:5000",
-    "001": "http://127.0.0.1:5001",
-    "010": "http://127.0.0.1:5002",
-    "011": "http://127.0.0.1:5003",
-    "100": "http://127.0.0.1:5004",
-    "101": "http://127.0.0.1:5005",
-    "110": "http://127.0.0.1:5006",
-    "111": "http://127.0.0.1:5007",
-}
+from config import NODE_ADDRESSES
 
 NUM_TOPICS = 10000  # Total topics to generate
 NODE_COUNT = len(NODE_ADDRESSES)
@@ -1,118 +1,198 @@
+import argparse
 import asyncio
 import httpx
+import json
 import time
 import subprocess
 import os
 import platform
 import random
-import string
-import matplotlib.pyplot as plt
 import signal
 import sys
+from bisect import bisect_left
+from datetime import datetime
+import matplotlib.pyplot as plt
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT, parse_weighted_list
 
-# Define the plotting directory
+# Define the plotting and result directories
 PLOTTING_DIR = "../Out/Images"
-if not os.path.exists(PLOTTING_DIR):
-    os.makedirs(PLOTTING_DIR)
-
-# Node addresses
-NODE_ADDRESSES = {
-    "000": "http://127.0.0.1:5000",
-    "001": "http://127.0.0.1:5001",
-    "010": "http://127.0.0.1:5002",
-    "011": "http://127.0.0.1:5003",
-    "100": "http://127.0.0.1:5004",
-    "101": "http://127.0.0.1:5005",
-    "110": "http://127.0.0.1:5006",
-    "111": "http://127.0.0.1:5007",
-}
-
-# Benchmarking settings
-MAX_TOPICS = 1000  # Run tests up to 15 topics
-STEP_SIZE = 100    # Increment by 3 topics each time
-
-# Generate a unique topic name
-def generate_topic_name(peer_id):
-    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=10))
-    return f"test_topic_{peer_id}_{random_string}"
-
-async def perform_operations(peer_url, topic_name):
-    async with httpx.AsyncClient() as client:
-        # Step 1: Create Topic
-        await client.post(f"{peer_url}/create_topic", json={"topic": topic_name})
-
-        # Step 2: Publish Message
-        message = "Hello, Distributed World!"
-        await client.post(f"{peer_url}/publish_message", json={"topic": topic_name, "message": message})
-
-        # Step 3: Subscribe (on selected node only)
-        await client.post(f"{peer_url}/subscribe", json={"topic": topic_name})
-
-        # Step 4: Pull Messages (on selected node only)
-        await client.post(f"{peer_url}/pull_messages", json={"topic": topic_name})
-
-        # Step 5: Query Topic (on selected node only)
-        await client.post(f"{peer_url}/query_topic", json={"topic": topic_name})
-
-        # Step 6: Delete Topic (on selected node only)
-        await client.post(f"{peer_url}/delete_topic", json={"topic": topic_name})
-
-async def main():
-    results_latency = []
-    results_throughput = []
-
-    for num_topics in range(1, MAX_TOPICS + 1, STEP_SIZE):
-        print(f"Testing with {num_topics} topics...")
-        total_time = 0
-        successful_requests = 0
-
-        # Run all operations for `num_topics` unique topics
-        for _ in range(num_topics):
-            # Randomly select one node for all operations of this topic
-            selected_peer_id = random.choice(list(NODE_ADDRESSES.keys()))
-            peer_url = NODE_ADDRESSES[selected_peer_id]
-            topic_name = generate_topic_name(selected_peer_id)
-
-            # Perform the sequence of operations on the selected node
-            start_time = time.time()
-            await perform_operations(peer_url, topic_name)
-            elapsed_time = time.time() - start_time
-
-            total_time += elapsed_time
-            successful_requests += 1
-
-        # Calculate and record metrics for this run
-        avg_latency = total_time / successful_requests if successful_requests else 0
-        throughput = successful_requests / total_time if total_time > 0 else 0
-        results_latency.append(avg_latency)
-        results_throughput.append(throughput)
-
-    # Plot results
-    plot_results(results_latency, results_throughput)
-
-def plot_results(results_latency, results_throughput):
-    topic_counts = range(STEP_SIZE, MAX_TOPICS + 1, STEP_SIZE)
-
-    # Latency plot
+RESULTS_DIR = "../Out/Results"
+os.makedirs(PLOTTING_DIR, exist_ok=True)
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+MESSAGE = "Hello, Distributed World!"
+PERCENTILES = [("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999)]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the DHT pub/sub cluster.")
+    parser.add_argument("--rates", default="200,400,800",
+                        help="comma-separated target request rates (requests/sec); one run per rate")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per rate")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each run")
+    parser.add_argument("--concurrency", type=int, default=64, help="most requests outstanding at once")
+    parser.add_argument("--topics", type=int, default=1000, help="topics created before the runs")
+    parser.add_argument("--zipf", type=float, default=0.99, help="Zipf exponent of topic popularity (0 = uniform)")
+    parser.add_argument("--mix", default="publish_message:0.5,pull_messages:0.4,query_topic:0.05,subscribe:0.05",
+                        help="operation ratios")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson",
+                        help="inter-arrival times: exponential or fixed")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, so runs see the same request sequence")
+    parser.add_argument("--output", help="result JSON path (default: ../Out/Results/benchmark_<time>.json)")
+    parser.add_argument("--compare", help="earlier result JSON to compare percentiles against")
+    return parser.parse_args()
+
+class TopicPicker:
+    """Draws topics by Zipf rank: topic k is picked with weight 1 / k^s."""
+
+    def __init__(self, topics, exponent):
+        self.topics = topics
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, len(topics) + 1):
+            total += 1 / rank ** exponent
+            self.cumulative.append(total)
+
+    def pick(self, rng):
+        return self.topics[bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+
+def request_payload(operation, topic):
+    if operation == "publish_message":
+        return {"topic": topic, "message": MESSAGE}
+    if operation == "pull_messages":
+        return {"topic": topic, "limit": 10}
+    return {"topic": topic}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+async def run_load(client, args, rate, picker, rng):
+    """Send requests on a fixed open-loop schedule for warmup + duration seconds.
+
+    Arrival times are drawn up front and never wait for responses. Latency is
+    measured from each request's scheduled time, so time spent queued behind the
+    concurrency limit or a slow generator counts too (no coordinated omission).
+    """
+    operations, weights = zip(*parse_weighted_list(args.mix).items())
+    peer_urls = list(NODE_ADDRESSES.values())
+    semaphore = asyncio.Semaphore(args.concurrency)
+    samples = {operation: [] for operation in operations}
+    errors = {operation: 0 for operation in operations}
+    max_schedule_lag = 0.0
+    last_completion = [0.0]
+    tasks = []
+
+    async def fire(scheduled, operation, url, payload, measured):
+        async with semaphore:
+            try:
+                response = await client.post(f"{url}/{operation}", json=payload)
+                ok = response.status_code == 200 and response.json().get("status") == "Success"
+            except (httpx.HTTPError, ValueError):
+                ok = False
+        if measured:
+            completed_at = time.perf_counter()
+            samples[operation].append(completed_at - scheduled)
+            errors[operation] += 0 if ok else 1
+            last_completion[0] = max(last_completion[0], completed_at)
+
+    start_time = time.perf_counter()
+    measure_from = start_time + args.warmup
+    end_time = measure_from + args.duration
+    scheduled = start_time
+    while scheduled < end_time:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            max_schedule_lag = max(max_schedule_lag, -delay)
+        operation = rng.choices(operations, weights)[0]
+        payload = request_payload(operation, picker.pick(rng))
+        tasks.append(asyncio.create_task(fire(scheduled, operation, rng.choice(peer_urls), payload,
+                                              scheduled >= measure_from)))
+        scheduled += rng.expovariate(rate) if args.arrivals == "poisson" else 1 / rate
+    await asyncio.gather(*tasks)
+
+    result = {"target_rate": rate, "max_schedule_lag_ms": max_schedule_lag * 1000, "operations": {}}
+    completed = 0
+    for operation in operations:
+        latencies = sorted(samples[operation])
+        completed += len(latencies)
+        result["operations"][operation] = {
+            "requests": len(latencies),
+            "errors": errors[operation],
+            **{name: percentile(latencies, fraction) * 1000 for name, fraction in PERCENTILES},
+        }
+    every_latency = sorted(latency for operation in operations for latency in samples[operation])
+    # Responses per second from the start of the measured window until the last one arrived
+    result["achieved_rate"] = completed / max(last_completion[0] - measure_from, args.duration)
+    result["error_rate"] = sum(errors.values()) / completed if completed else 0.0
+    result["overall"] = {name: percentile(every_latency, fraction) * 1000 for name, fraction in PERCENTILES}
+    return result
+
+async def main(args):
+    rng = random.Random(args.seed)
+    topics = [f"bench_topic_{index}" for index in range(args.topics)]
+    picker = TopicPicker(topics, args.zipf)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        peer_urls = list(NODE_ADDRESSES.values())
+        for start in range(0, len(topics), args.concurrency):
+            await asyncio.gather(*(client.post(f"{rng.choice(peer_urls)}/create_topic", json={"topic": topic})
+                                   for topic in topics[start:start + args.concurrency]))
+        runs = []
+        for rate in [float(rate) for rate in args.rates.split(",")]:
+            print(f"Offered load {rate:.0f} req/s for {args.duration:.0f}s...")
+            run = await run_load(client, args, rate, picker, rng)
+            print_run(run)
+            runs.append(run)
+    return runs
+
+def print_run(run):
+    print(f"  achieved {run['achieved_rate']:.0f} req/s, error rate {run['error_rate']:.2%}, "
+          f"generator lag up to {run['max_schedule_lag_ms']:.1f} ms")
+    for operation, stats in list(run["operations"].items()) + [("overall", run["overall"])]:
+        print(f"  {operation:>16}: " + ", ".join(f"{name} {stats[name]:8.2f} ms" for name, _ in PERCENTILES))
+
+def compare(runs, baseline_path):
+    """Print the change in overall percentiles against an earlier result file, rate by rate."""
+    with open(baseline_path) as baseline_file:
+        baseline = {run["target_rate"]: run for run in json.load(baseline_file)["runs"]}
+    print(f"Compared with {baseline_path}:")
+    for run in runs:
+        before = baseline.get(run["target_rate"])
+        if before is None:
+            continue
+        changes = ", ".join(f"{name} {before['overall'][name]:.2f} -> {run['overall'][name]:.2f} ms"
+                            for name, _ in PERCENTILES)
+        print(f"  {run['target_rate']:.0f} req/s: {changes}")
+
+def plot_results(runs, label):
+    offered = [run["target_rate"] for run in runs]
+
+    # Latency percentiles against offered load
     plt.figure(figsize=(10, 6))
-    plt.plot(topic_counts, results_latency, label='Latency')
-    plt.title('Average Latency vs Number of Topics')
-    plt.xlabel('Number of Topics')
-    plt.ylabel('Latency (seconds)')
+    for name, _ in PERCENTILES:
+        plt.plot(offered, [run["overall"][name] for run in runs], marker="o", label=name)
+    plt.title('Latency vs Offered Load (open loop)')
+    plt.xlabel('Offered load (requests/second)')
+    plt.ylabel('Latency (ms)')
+    plt.yscale('log')
     plt.legend()
     plt.tight_layout()
-    plt.savefig(f"{PLOTTING_DIR}/latency_vs_num_topics.png")
+    plt.savefig(f"{PLOTTING_DIR}/latency_vs_offered_load_{label}.png")
     plt.close()
 
-    # Throughput plot
+    # Achieved against offered throughput
     plt.figure(figsize=(10, 6))
-    plt.plot(topic_counts, results_throughput, label='Throughput')
-    plt.title('Throughput vs Number of Topics')
-    plt.xlabel('Number of Topics')
+    plt.plot(offered, [run["achieved_rate"] for run in runs], marker="o", label='Achieved')
+    plt.plot(offered, offered, linestyle="--", label='Offered')
+    plt.title('Throughput vs Offered Load')
+    plt.xlabel('Offered load (requests/second)')
     plt.ylabel('Throughput (requests/second)')
     plt.legend()
     plt.tight_layout()
-    plt.savefig(f"{PLOTTING_DIR}/throughput_vs_num_topics.png")
+    plt.savefig(f"{PLOTTING_DIR}/throughput_vs_offered_load_{label}.png")
     plt.close()
 
 # Signal handling for clean shutdown
@@ -124,22 +204,31 @@ def signal_handler(sig, frame):
 def kill_peer_processes():
     current_os = platform.system()
     if current_os == "Linux":
-        subprocess.run("lsof -t -i :5000-5007 | xargs kill", shell=True)
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
     elif current_os == "Windows":
-        for port in range(5000, 5008):
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
             subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
     else:
         print("Unsupported OS for killing processes.")
 
 # Run the benchmark
 if __name__ == "__main__":
+    args = parse_args()
     signal.signal(signal.SIGINT, signal_handler)
     print("Starting peer nodes...")
     subprocess.Popen(["bash", "run.sh"])  # Start peer nodes in the background
     time.sleep(5)  # Wait for nodes to initialize
 
     try:
-        asyncio.run(main())
+        label = datetime.now().strftime('%Y%m%d_%H%M%S')
+        runs = asyncio.run(main(args))
+        output = args.output or f"{RESULTS_DIR}/benchmark_{label}.json"
+        with open(output, "w") as output_file:
+            json.dump({"config": vars(args), "nodes": NUM_NODES, "runs": runs}, output_file, indent=2)
+        print(f"Results written to {output}")
+        if args.compare:
+            compare(runs, args.compare)
+        plot_results(runs, label)
     except Exception as e:
         print(f"An error occurred: {e}")
 
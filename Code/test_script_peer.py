@@ -4,18 +4,7 @@ import time
 import subprocess
 import os
 import platform
-
-# Assuming NODE_ADDRESSES matches the port each peer is running on
-NODE_ADDRESSES = {
-    "000": "http://127.0.0.1:5000",
-    "001": "http://127.0.0.1:5001",
-    "010": "http://127.0.0.1:5002",
-    "011": "http://127.0.0.1:5003",
-    "100": "http://127.0.0.1:5004",
-    "101": "http://127.0.0.1:5005",
-    "110": "http://127.0.0.1:5006",
-    "111": "http://127.0.0.1:5007",
-}
+from config import NODE_ADDRESSES, NUM_NODES, BASE_PORT
 
 # Base topic name
 BASE_TOPIC_NAME = "test_topic"
@@ -89,10 +78,10 @@ def kill_peer_processes():
     current_os = platform.system()
     if current_os == "Linux":
         # Use lsof to find and kill the peer processes
-        subprocess.run("lsof -t -i :5000-5007 | xargs kill", shell=True)
+        subprocess.run(f"lsof -t -i :{BASE_PORT}-{BASE_PORT + NUM_NODES - 1} | xargs kill", shell=True)
     elif current_os == "Windows":
         # For Windows, we will use taskkill; here we find process IDs
-        for port in range(5000, 5008):
+        for port in range(BASE_PORT, BASE_PORT + NUM_NODES):
             subprocess.run(f"for /f \"tokens=5\" %i in ('netstat -ano ^| findstr :{port}') do taskkill /PID %i /F", shell=True)
     else:
         print("Unsupported OS for killing processes.")
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import random
+import tempfile
+
+# Small segments and a short commit window, so segments roll while group commits are in flight
+os.environ.setdefault("DHT_SEGMENT_BYTES", "8192")
+os.environ.setdefault("DHT_FSYNC_INTERVAL_MS", "1")
+
+from storage import SegmentLogStorage  # noqa: E402
+
+NUM_WRITERS = 16
+PUBLISHES_PER_WRITER = 400
+TOPIC = "segment_roll_topic"
+
+async def publish_concurrently(root):
+    """Publish from concurrent writers to one topic; returns the failures and what a reopened log holds."""
+    storage = SegmentLogStorage(root)
+    storage.create(TOPIC)
+    failures = []
+
+    async def writer(writer_id):
+        for index in range(PUBLISHES_PER_WRITER):
+            await asyncio.sleep(random.uniform(0, 0.002))  # Out of step, so appends land while an fsync runs
+            try:
+                await storage.append(TOPIC, f"writer-{writer_id}-message-{index:04d}")
+            except OSError as e:
+                failures.append(e)
+
+    await asyncio.gather(*(writer(writer_id) for writer_id in range(NUM_WRITERS)))
+    segments = len(storage._logs[TOPIC].segments)
+    await storage.close()
+    reopened = SegmentLogStorage(root)  # Recovers the segments from disk
+    messages, _, high_watermark = reopened.read(TOPIC, 0, NUM_WRITERS * PUBLISHES_PER_WRITER)
+    await reopened.close()
+    return failures, segments, messages, high_watermark
+
+def test_segment_roll_under_concurrent_publishes():
+    with tempfile.TemporaryDirectory() as root:
+        failures, segments, messages, high_watermark = asyncio.run(publish_concurrently(root))
+    total = NUM_WRITERS * PUBLISHES_PER_WRITER
+    assert segments > 1, "the log never rolled to a new segment"
+    assert not failures, f"{len(failures)} of {total} publishes failed, e.g. {failures[0]!r}"
+    assert high_watermark == total and len(messages) == total
+    assert sorted(messages) == sorted(f"writer-{writer_id}-message-{index:04d}"
+                                      for writer_id in range(NUM_WRITERS) for index in range(PUBLISHES_PER_WRITER))
+
+# Run the test
+if __name__ == "__main__":
+    test_segment_roll_under_concurrent_publishes()
+    print(f"{NUM_WRITERS * PUBLISHES_PER_WRITER} publishes over rolling segments: all acknowledged and recovered")
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+import httpx
+from config import NODE_ADDRESSES, TOPIC_CACHE_SIZE, TOPIC_CACHE_TTL_MS, TOPIC_CACHE_NEGATIVE_TTL_MS
+from client_pool import get_client
+from node import current_node
+
+# Ingress nodes cache the answers to the query_topic requests they forward, found or not
+# found, in node.topic_cache (an OrderedDict in LRU order: topic -> (expiry, response)).
+# The forwarded request names the caching node, and the node that answers it remembers
+# that node in node.topic_watchers. When that node then creates or deletes the topic,
+# it tells its watchers to drop their entries. The TTLs bound staleness when an
+# invalidation is lost or a watch was evicted.
+
+NOT_FOUND = "Topic not found."
+
+_sending = set()  # Invalidation tasks in flight, kept referenced until they finish
+
+def cached_topic(topic):
+    """The cached query_topic response for a topic, or None on a miss."""
+    node = current_node()
+    counts = node.topic_cache_counts
+    entry = node.topic_cache.get(topic)
+    if entry is not None:
+        expires_at, response = entry
+        if time.monotonic() < expires_at:
+            node.topic_cache.move_to_end(topic)
+            counts["hits" if response["status"] == "Success" else "negative_hits"] += 1
+            return {**response, "hops": 0, "cached": True}
+        del node.topic_cache[topic]
+    counts["misses"] += 1
+    return None
+
+def cache_topic(topic, response):
+    """Keep a forwarded query_topic response; errors other than "not found" (e.g. node down) are not kept."""
+    if response.get("status") == "Success":
+        ttl_ms = TOPIC_CACHE_TTL_MS
+    elif response.get("message") == NOT_FOUND:
+        ttl_ms = TOPIC_CACHE_NEGATIVE_TTL_MS
+    else:
+        return
+    cache = current_node().topic_cache
+    cache[topic] = (time.monotonic() + ttl_ms / 1000, response)
+    cache.move_to_end(topic)
+    if len(cache) > TOPIC_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def watch_topic(topic, node_id):
+    """Remember that `node_id` caches this node's answer about `topic`."""
+    watchers = current_node().topic_watchers
+    nodes = watchers.get(topic)
+    if nodes is None:
+        nodes = watchers[topic] = set()
+        if len(watchers) > TOPIC_CACHE_SIZE:
+            watchers.popitem(last=False)  # That node's entry now expires by TTL alone
+    nodes.add(node_id)
+
+def invalidate_topic(topic):
+    """The topic was created or deleted here: drop cached answers about it, here and on its watchers.
+
+    The watchers are told in the background; topics invalidated in the same event loop
+    turn go to a watcher in one request.
+    """
+    node = current_node()
+    node.topic_cache.pop(topic, None)
+    watchers = node.topic_watchers.pop(topic, None)
+    if not watchers:
+        return
+    counts = node.topic_cache_counts
+    counts["invalidations"] += 1
+    counts["invalidations_sent"] += len(watchers)
+    for node_id in watchers:
+        pending = node.pending_invalidations.get(node_id)
+        if pending is None:
+            pending = node.pending_invalidations[node_id] = set()
+            task = asyncio.create_task(_send_invalidations(node, node_id))
+            _sending.add(task)
+            task.add_done_callback(_sending.discard)
+        pending.add(topic)
+
+async def _send_invalidations(node, node_id):
+    await asyncio.sleep(0)  # Let invalidations from the same burst join the request
+    topics = sorted(node.pending_invalidations.pop(node_id))
+    try:
+        response = await get_client(NODE_ADDRESSES[node_id]).post("/invalidate_topics", json={"topics": topics})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        node.topic_cache_counts["invalidation_failures"] += 1
+        logging.warning(f"Invalidating {len(topics)} cached topics at {node_id} failed: {e!r}")
+
+def drop_cached_topics(topics):
+    """Apply an invalidation from the node that answered about these topics."""
+    node = current_node()
+    for topic in topics:
+        node.topic_cache.pop(topic, None)
+    node.topic_cache_counts["invalidations_received"] += len(topics)
+
+def topic_cache_stats():
+    node = current_node()
+    counts = node.topic_cache_counts
+    lookups = counts["hits"] + counts["negative_hits"] + counts["misses"]
+    return {
+        "entries": len(node.topic_cache),
+        "watched_topics": len(node.topic_watchers),
+        "hit_ratio": (counts["hits"] + counts["negative_hits"]) / lookups if lookups else 0.0,
+        **counts,
+    }
@@ -0,0 +1,38 @@
+from config import NODE_IDS, REPLICATION_FACTOR
+
+# Hypercube neighbor calculation
+def compute_neighbors(peer_id):
+    """Calculates the neighbors of a given peer in the hypercube topology."""
+    index = int(peer_id, 2)
+    width = len(peer_id)
+    # Neighbor i differs from the peer in the ith character of its ID
+    return [format(index ^ (1 << (width - 1 - i)), f'0{width}b') for i in range(width)]
+
+# Precomputed topology lookup tables, shared by every node in the process
+NEIGHBORS = {node_id: compute_neighbors(node_id) for node_id in NODE_IDS}
+
+def get_neighbors(peer_id):
+    """Returns the neighbors of a peer from the precomputed topology (do not mutate)."""
+    neighbors = NEIGHBORS.get(peer_id)
+    return neighbors if neighbors is not None else compute_neighbors(peer_id)
+
+def compute_replicas(node_id, member_ids):
+    """The owner first, then its first REPLICATION_FACTOR - 1 neighbors that are members."""
+    return [node_id] + [neighbor for neighbor in get_neighbors(node_id) if neighbor in member_ids][:REPLICATION_FACTOR - 1]
+
+def hop_distance(source_node, target_node):
+    """Hypercube hops between two nodes (the Hamming distance of their IDs)."""
+    return bin(int(source_node, 2) ^ int(target_node, 2)).count("1")
+
+# E-cube routing: fix the first differing bit by moving to that neighbor
+def compute_next_hop(peer_id, target_node):
+    """Returns the neighbor that brings a request one bit closer to the target node."""
+    diff = int(peer_id, 2) ^ int(target_node, 2)
+    if not diff:
+        return peer_id
+    return get_neighbors(peer_id)[len(peer_id) - diff.bit_length()]
+
+def compute_shortest_hops(peer_id, target_node):
+    """Every neighbor on a shortest path to the target (one per differing bit), e-cube hop first."""
+    neighbors = get_neighbors(peer_id)
+    return [neighbors[i] for i, (bit, target_bit) in enumerate(zip(peer_id, target_node)) if bit != target_bit]
@@ -0,0 +1,165 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueListener
+from config import TRACE_DIR, LOG_QUEUE_SIZE
+from logger import NonBlockingQueueHandler
+from node import current_node
+
+# Span of the request being handled, set by TraceMiddleware for each HTTP request
+_current_span = ContextVar("span", default=None)
+_trace_logger = logging.getLogger("dht.trace")
+_trace_logger.propagate = False  # Spans go to the trace file only, never to the node log
+
+class Span:
+    """Timing of one request on this node: queueing, handler time and downstream wait.
+
+    queue: from the request reaching the app to the handler starting (body read, validation)
+    handler: the handler itself, downstream wait included
+    downstream: time spent waiting on forwarded requests
+    """
+
+    __slots__ = ("trace_id", "node", "endpoint", "breakdown", "depth", "started_at", "received", "handler_start",
+                 "handler_end", "downstream", "hops", "status")
+
+    def __init__(self, trace_id, endpoint, breakdown, depth=0):
+        self.trace_id = trace_id
+        self.node = current_node().peer_id
+        self.endpoint = endpoint
+        self.breakdown = breakdown  # Return the per-hop timing header
+        self.depth = depth  # Forwards the request took to reach this node (0 at ingress)
+        self.started_at = time.time()
+        self.received = time.perf_counter()
+        self.handler_start = None
+        self.handler_end = None
+        self.downstream = 0.0
+        self.hops = []  # Timing headers returned by downstream nodes
+        self.status = None
+
+    def timings_ms(self):
+        handler_start = self.handler_start or self.received
+        handler_end = self.handler_end or handler_start
+        return (round((handler_start - self.received) * 1000, 3), round((handler_end - handler_start) * 1000, 3),
+                round(self.downstream * 1000, 3))
+
+    def timing_header(self):
+        """Compact breakdown of this hop and every hop after it, e.g. "000 q=0.1 h=4.2 d=3.9;101 q=0.1 h=0.4 d=0"."""
+        queue_ms, handler_ms, downstream_ms = self.timings_ms()
+        return ";".join([f"{self.node} q={queue_ms:g} h={handler_ms:g} d={downstream_ms:g}"] + self.hops)
+
+    def to_record(self):
+        queue_ms, handler_ms, downstream_ms = self.timings_ms()
+        return {"trace_id": self.trace_id, "node": self.node, "endpoint": self.endpoint, "time": self.started_at,
+                "status": self.status, "queue_ms": queue_ms, "handler_ms": handler_ms,
+                "downstream_ms": downstream_ms, "downstream_hops": self.hops}
+
+def current_span():
+    return _current_span.get()
+
+def start_span(trace_id, endpoint, breakdown=False, depth=0):
+    """Open the span of a request arriving at this node; a missing trace ID starts a new trace."""
+    span = Span(trace_id or uuid.uuid4().hex[:16], endpoint, breakdown, depth)
+    _current_span.set(span)
+    return span
+
+def finish_span(span):
+    """Export the span if its handler ran and TRACE_DIR is set."""
+    if span.handler_start is not None and _trace_logger.handlers:
+        _trace_logger.info(span)  # Rendered to JSON by the writer thread
+
+def correlate_logs():
+    """Stamp every log record made while handling a request with its trace ID."""
+    make_record = logging.getLogRecordFactory()
+
+    def make_record_with_trace(*args, **kwargs):
+        record = make_record(*args, **kwargs)
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span is not None else None
+        return record
+
+    logging.setLogRecordFactory(make_record_with_trace)
+
+def trace_headers():
+    """Headers that carry the current trace to the next hop, and count the hop."""
+    span = _current_span.get()
+    if span is None:
+        return None
+    headers = {"X-Trace-Id": span.trace_id, "X-Hop-Count": str(span.depth + 1)}
+    if span.breakdown:
+        headers["X-Trace-Breakdown"] = "1"
+    return headers
+
+def record_downstream(started, response=None):
+    """Add a forwarded request's wait, and the timing header it came back with, to the current span."""
+    span = _current_span.get()
+    if span is None:
+        return
+    span.downstream += time.perf_counter() - started
+    if response is not None:
+        timing = response.headers.get("x-trace-timing")
+        if timing:
+            span.hops.append(timing)
+
+class TraceMiddleware:
+    """ASGI middleware that opens a span per request, starting a trace at ingress.
+
+    A request without X-Trace-Id gets a new one; X-Hop-Count says how many forwards
+    it took to get here. Every response carries X-Trace-Id, and the per-hop timing
+    breakdown in X-Trace-Timing when the request sent X-Trace-Breakdown: 1. Spans
+    of timed endpoints are exported if TRACE_DIR is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace_id = None
+        breakdown = False
+        depth = 0
+        for name, value in scope["headers"]:
+            if name == b"x-trace-id":
+                trace_id = value.decode()
+            elif name == b"x-trace-breakdown":
+                breakdown = value == b"1"
+            elif name == b"x-hop-count" and value.isdigit():
+                depth = int(value)
+        span = start_span(trace_id, scope["path"].lstrip("/"), breakdown, depth)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-trace-id", span.trace_id.encode()))
+                if span.breakdown:
+                    headers.append((b"x-trace-timing", span.timing_header().encode()))
+                message = {**message, "headers": headers}
+                finish_span(span)
+            await send(message)
+
+        await self.app(scope, receive, send_with_trace)
+
+class SpanFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg.to_record()) if isinstance(record.msg, Span) else super().format(record)
+
+def setup_trace_export(trace_dir=TRACE_DIR):
+    """Write finished spans as JSON lines under `trace_dir` from a background thread; no-op without one."""
+    if not trace_dir:
+        return None
+    os.makedirs(trace_dir, exist_ok=True)
+    file_handler = logging.FileHandler(os.path.join(trace_dir, f"node_{current_node().peer_id}.jsonl"))
+    file_handler.setFormatter(SpanFormatter())
+    span_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _trace_logger.setLevel(logging.INFO)
+    _trace_logger.addHandler(NonBlockingQueueHandler(span_queue))
+    listener = QueueListener(span_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)  # Flush the spans still queued on exit
+    return listener
@@ -1,31 +1,48 @@
-import hashlib
 import httpx  # Make sure to have httpx installed for making HTTP requests
 import logging
-from config import NUM_NODES, HYPERCUBE_DIMENSIONS
+from client_pool import get_client
+from node import current_node
+from topology import (  # noqa: F401 (re-exported for the scripts that import them from here)
+    NEIGHBORS,
+    compute_neighbors,
+    get_neighbors,
+    compute_replicas,
+    hop_distance,
+    compute_next_hop,
+    compute_shortest_hops,
+)
+
+def resolve_owner(topic):
+    """Returns the ID of the node that owns a topic (cached)."""
+    return current_node().resolver.resolve(topic)
 
 # Helper function to calculate hash of a topic for DHT
 def hash_topic(topic):
-    """Calculates the hash of a topic for consistent node assignment in the DHT."""
-    return int(hashlib.sha256(topic.encode()).hexdigest(), 16) % NUM_NODES
+    """Returns the index of the node that owns a topic under the configured placement."""
+    return int(resolve_owner(topic), 2)
+
+def set_members(member_ids):
+    """Switch placement, replica sets and routing to a new member list (see membership.py)."""
+    current_node().set_members(member_ids)
+
+def replica_nodes(owner):
+    """Returns the nodes holding copies of the owner's topics, owner first (do not mutate)."""
+    return current_node().replica_nodes(owner)
 
-# Hypercube neighbor calculation
-def get_neighbors(peer_id):
-    """Calculates the neighbors of a given peer in the hypercube topology."""
-    neighbors = []
-    for i in range(HYPERCUBE_DIMENSIONS):
-        neighbor_id = list(peer_id)  # Convert peer_id to a list for mutability
-        neighbor_id[i] = '1' if neighbor_id[i] == '0' else '0'  # Flip the ith bit
-        neighbors.append(''.join(neighbor_id))  # Join back into a string
-    return neighbors
+def next_hop(source_node, target_node):
+    """Returns the e-cube next hop, using the cached routes of the current node."""
+    node = current_node()
+    if source_node == node.peer_id:
+        return node.next_hop(target_node)
+    return compute_next_hop(source_node, target_node)
 
 # Function to forward requests to the target node
 async def forward_request(node_address, path, payload):
     """Forward a request to another node."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"http://{node_address}{path}", json=payload)
-            response.raise_for_status()
-            return response.json()
+        response = await get_client(f"http://{node_address}").post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         logging.error(f"Failed to forward request to {node_address}: {e}")
         return {"status": "Error", "message": "Failed to forward request."}